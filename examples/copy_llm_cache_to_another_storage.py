@@ -11,7 +11,9 @@ from dotenv import load_dotenv
 
 from lightrag.kg.postgres_impl import PostgreSQLDB, PGKVStorage
 from lightrag.kg.json_kv_impl import JsonKVStorage
+from lightrag.kg.shared_storage import initialize_share_data
 from lightrag.namespace import NameSpace
+from lightrag.utils import parse_cache_key
 
 load_dotenv()
 ROOT_DIR = os.environ.get("ROOT_DIR")
@@ -71,6 +73,7 @@ async def copy_from_postgres_to_json():
 
 async def copy_from_json_to_postgres():
     await postgres_db.initdb()
+    initialize_share_data()
 
     from_llm_response_cache = JsonKVStorage(
         namespace=NameSpace.KV_STORE_LLM_RESPONSE_CACHE,
@@ -85,13 +88,16 @@ async def copy_from_json_to_postgres():
         db=postgres_db,
     )
 
-    for mode in await from_llm_response_cache.all_keys():
-        print(f"Copying {mode}")
-        caches = await from_llm_response_cache.get_by_id(mode)
-        for k, v in caches.items():
-            item = {mode: {k: v}}
-            print(f"\tCopying {item}")
-            await to_llm_response_cache.upsert(item)
+    await from_llm_response_cache.initialize()
+    for cache_key, v in (await from_llm_response_cache.get_all()).items():
+        parsed_key = parse_cache_key(cache_key)
+        if parsed_key is None:
+            print(f"\tSkipping {cache_key}: not a flat cache key")
+            continue
+        mode, k = parsed_key
+        item = {mode: {k: v}}
+        print(f"\tCopying {item}")
+        await to_llm_response_cache.upsert(item)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+"""
+Recall and latency of the approximate Faiss index types against the flat index.
+
+Synthetic clustered vectors are inserted into one FaissVectorDBStorage per index
+type; every storage answers the same queries, and recall@k is measured against
+the results of the flat index.
+
+    python examples/faiss_ann_benchmark.py --vectors 200000 --dim 768
+"""
+
+import argparse
+import asyncio
+import logging
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from lightrag.kg.faiss_impl import ANN_INDEX_TYPES, FaissVectorDBStorage
+from lightrag.kg.shared_storage import initialize_share_data
+from lightrag.utils import EmbeddingFunc, logger
+
+
+def make_vectors(args) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dim)).astype(np.float32)
+    labels = rng.integers(args.clusters, size=args.vectors + args.queries)
+    vectors = centers[labels] + 0.5 * rng.standard_normal(
+        (len(labels), args.dim)
+    ).astype(np.float32)
+    return vectors[: args.vectors], vectors[args.vectors :]
+
+
+async def run(index_type: str, args, vectors, queries) -> tuple[list, float, float]:
+    """Return the result ids of every query, the build time and the query time"""
+    texts = {f"v{i}": vector for i, vector in enumerate(vectors)}
+
+    async def embed(batch):
+        return np.array([texts[text] for text in batch])
+
+    working_dir = tempfile.mkdtemp()
+    storage = FaissVectorDBStorage(
+        namespace="benchmark",
+        global_config={
+            "working_dir": working_dir,
+            "embedding_batch_num": 10000,
+            "vector_db_storage_cls_kwargs": {
+                "cosine_better_than_threshold": -1.0,
+                "index_type": index_type,
+                "nprobe": args.nprobe,
+                "ef_search": args.ef_search,
+                "pq_m": args.pq_m,
+                "ann_min_vectors": 0,
+            },
+        },
+        embedding_func=EmbeddingFunc(
+            embedding_dim=args.dim, max_token_size=8192, func=embed
+        ),
+    )
+    try:
+        await storage.initialize()
+        for start in range(0, len(vectors), 10000):
+            await storage.upsert(
+                {
+                    f"v{i}": {"content": f"v{i}"}
+                    for i in range(start, min(start + 10000, len(vectors)))
+                }
+            )
+        start = time.perf_counter()
+        await storage.index_done_callback()
+        # The approximate index is trained in the background, wait for it
+        while storage._ann_build_task is not None:
+            await asyncio.sleep(0.05)
+        build_time = time.perf_counter() - start
+
+        results = []
+        start = time.perf_counter()
+        for query in queries:
+            matches = await storage.query("", args.top_k, query_embedding=query)
+            results.append([match["id"] for match in matches])
+        query_time = (time.perf_counter() - start) / len(queries)
+        return results, build_time, query_time
+    finally:
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+
+async def main(args):
+    logger.setLevel(logging.WARNING)
+    initialize_share_data(1)
+    vectors, queries = make_vectors(args)
+
+    flat_results, _, flat_time = await run("Flat", args, vectors, queries)
+    print(
+        f"{'index':<10}{'recall@' + str(args.top_k):>12}{'build s':>10}{'query ms':>10}"
+    )
+    print(f"{'Flat':<10}{1.0:>12.3f}{0.0:>10.2f}{flat_time * 1000:>10.2f}")
+    for index_type in args.index_types:
+        results, build_time, query_time = await run(index_type, args, vectors, queries)
+        recall = np.mean(
+            [
+                len(set(result) & set(expected)) / len(expected)
+                for result, expected in zip(results, flat_results)
+            ]
+        )
+        print(
+            f"{index_type:<10}{recall:>12.3f}{build_time:>10.2f}{query_time * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--pq-m", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--index-types",
+        nargs="+",
+        default=list(ANN_INDEX_TYPES),
+        choices=ANN_INDEX_TYPES,
+    )
+    asyncio.run(main(parser.parse_args()))
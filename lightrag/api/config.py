@@ -299,6 +299,9 @@ def parse_args() -> argparse.Namespace:
     )
     args.enable_llm_cache = get_env_value("ENABLE_LLM_CACHE", True, bool)
 
+    # Export the duration of query stages as Prometheus metrics at /metrics
+    args.query_metrics = get_env_value("QUERY_METRICS", False, bool)
+
     # Inject LLM temperature configuration
     args.temperature = get_env_value("TEMPERATURE", 0.2, float)
 
@@ -10,7 +10,7 @@ import logging.config
 import uvicorn
 import pipmaster as pm
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from pathlib import Path
 import configparser
 from ascii_colors import ASCIIColors
@@ -31,7 +31,12 @@ import sys
 from lightrag import LightRAG, __version__ as core_version
 from lightrag.api import __api_version__
 from lightrag.types import GPTKeywordExtractionFormat
-from lightrag.utils import EmbeddingFunc
+from lightrag.utils import (
+    AdaptiveConcurrencyLimiter,
+    EmbeddingFunc,
+    PriorityLLMScheduler,
+    parse_lane_limits,
+)
 from lightrag.api.routers.document_routes import (
     DocumentManager,
     create_document_routes,
@@ -296,6 +301,22 @@ def create_app(args):
         ),
     )
 
+    # One LLM scheduler for all LightRAG instances, so queries of any user are
+    # served before the indexing requests and the MAX_ASYNC limit is global
+    llm_limiter = None
+    if os.getenv("ADAPTIVE_CONCURRENCY", "false").lower() == "true":
+        llm_limiter = AdaptiveConcurrencyLimiter(
+            args.max_async,
+            max_limit=int(
+                args.max_async * float(os.getenv("ADAPTIVE_CONCURRENCY_MAX_FACTOR", 4))
+            ),
+        )
+    llm_scheduler = PriorityLLMScheduler(
+        llm_limiter.max_limit if llm_limiter else args.max_async,
+        parse_lane_limits(os.getenv("LLM_LANE_MAX_ASYNC")),
+        limiter=llm_limiter,
+    )
+
     # Create a factory function for creating new LightRAG instances
     def create_rag_instance():
         if args.llm_binding in ["lollms", "ollama", "openai"]:
@@ -308,6 +329,7 @@ def create_app(args):
                 else openai_alike_model_complete,
                 llm_model_name=args.llm_model,
                 llm_model_max_async=args.max_async,
+                llm_scheduler=llm_scheduler,
                 llm_model_max_token_size=args.max_tokens,
                 chunk_token_size=int(args.chunk_size),
                 chunk_overlap_token_size=int(args.chunk_overlap_size),
@@ -350,6 +372,7 @@ def create_app(args):
                 },
                 llm_model_name=args.llm_model,
                 llm_model_max_async=args.max_async,
+                llm_scheduler=llm_scheduler,
                 llm_model_max_token_size=args.max_tokens,
                 embedding_func=embedding_func,
                 kv_storage=args.kv_storage,
@@ -384,7 +407,9 @@ def create_app(args):
     
     # Add routes
     app.include_router(create_document_routes(default_rag, doc_manager, api_key))
-    app.include_router(create_query_routes(default_rag, api_key, args.top_k))
+    app.include_router(
+        create_query_routes(default_rag, api_key, args.top_k, args.query_metrics)
+    )
     app.include_router(create_graph_routes(default_rag, api_key))
 
     # Add Ollama API routes
@@ -497,6 +522,8 @@ def create_app(args):
                 },
                 "auth_mode": auth_mode,
                 "pipeline_busy": pipeline_status.get("busy", False),
+                "llm_queue": llm_scheduler.stats(),
+                "llm_concurrency": llm_limiter.stats() if llm_limiter else None,
                 "core_version": core_version,
                 "api_version": __api_version__,
                 "webui_title": webui_title,
@@ -506,6 +533,28 @@ def create_app(args):
             logger.error(f"Error getting health status: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
+    if args.query_metrics:
+
+        @app.get("/metrics", dependencies=[Depends(combined_auth)])
+        async def get_metrics():
+            """Query stage durations in the Prometheus text format"""
+            from prometheus_client import (
+                CONTENT_TYPE_LATEST,
+                CollectorRegistry,
+                generate_latest,
+                multiprocess,
+            )
+
+            if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+                # Gunicorn workers write their samples to this directory,
+                # aggregate them so that every scrape covers all workers
+                registry = CollectorRegistry()
+                multiprocess.MultiProcessCollector(registry)
+                content = generate_latest(registry)
+            else:
+                content = generate_latest()
+            return Response(content=content, media_type=CONTENT_TYPE_LATEST)
+
     # Custom StaticFiles class to prevent caching of HTML files
     class NoCacheStaticFiles(StaticFiles):
         async def get_response(self, path: str, scope):
@@ -4,11 +4,18 @@ This module contains all query-related routes for the LightRAG API.
 
 import json
 import logging
+import time
+from contextlib import nullcontext
 from typing import Any, Dict, List, Literal, Optional
-from lightrag.utils import logger
+from lightrag.utils import logger, query_trace
 from fastapi import APIRouter, Depends, HTTPException, Request
 from lightrag.base import QueryParam
-from ..utils_api import get_combined_auth_dependency, extract_user_id
+from ..utils_api import (
+    get_combined_auth_dependency,
+    extract_user_id,
+    get_query_stage_histogram,
+    observe_query_trace,
+)
 from pydantic import BaseModel, Field, field_validator
 from ..user_rag_manager import get_manager
 
@@ -89,6 +96,11 @@ class QueryRequest(BaseModel):
         description="Number of complete conversation turns (user-assistant pairs) to consider in the response context.",
     )
 
+    trace: Optional[bool] = Field(
+        default=None,
+        description="If True, returns the duration of each retrieval stage with the response. Always on with only_need_context.",
+    )
+
     @field_validator("query", mode="after")
     @classmethod
     def query_strip_after(cls, query: str) -> str:
@@ -125,29 +137,149 @@ class QueryRequest(BaseModel):
     def to_query_params(self, is_stream: bool) -> "QueryParam":
         """Converts a QueryRequest instance into a QueryParam instance."""
         # Use Pydantic's `.model_dump(exclude_none=True)` to remove None values automatically
-        request_data = self.model_dump(exclude_none=True, exclude={"query"})
+        request_data = self.model_dump(exclude_none=True, exclude={"query", "trace"})
 
         # Ensure `mode` and `stream` are set explicitly
         param = QueryParam(**request_data)
         param.stream = is_stream
         return param
 
+    def wants_trace(self) -> bool:
+        """Whether the stage durations are returned with the response"""
+        return bool(self.trace or self.only_need_context)
+
 
 class QueryResponse(BaseModel):
     response: str = Field(
         description="The generated response",
     )
 
+    trace: Optional[List[Dict[str, Any]]] = Field(
+        default=None,
+        description="Retrieval stages of the query with their start and duration in seconds, when requested.",
+    )
+
+
+class ContextRequest(BaseModel):
+    query: str = Field(
+        min_length=1,
+        description="The query text, searched as is unless keywords are given",
+    )
+
+    mode: Literal["local", "global", "hybrid", "naive", "mix"] = Field(
+        default="hybrid",
+        description="Retrieval mode",
+    )
+
+    top_k: Optional[int] = Field(
+        ge=1,
+        default=None,
+        description="Number of top items to retrieve. Represents entities in 'local' mode and relationships in 'global' mode.",
+    )
+
+    max_token_for_text_unit: Optional[int] = Field(
+        gt=1,
+        default=None,
+        description="Maximum number of tokens allowed for each retrieved text chunk.",
+    )
+
+    max_token_for_global_context: Optional[int] = Field(
+        gt=1,
+        default=None,
+        description="Maximum number of tokens allocated for relationship descriptions in global retrieval.",
+    )
+
+    max_token_for_local_context: Optional[int] = Field(
+        gt=1,
+        default=None,
+        description="Maximum number of tokens allocated for entity descriptions in local retrieval.",
+    )
+
+    hl_keywords: Optional[List[str]] = Field(
+        default=None,
+        description="High-level keywords to search relationships with instead of the query.",
+    )
+
+    ll_keywords: Optional[List[str]] = Field(
+        default=None,
+        description="Low-level keywords to search entities with instead of the query.",
+    )
+
+    trace: Optional[bool] = Field(
+        default=None,
+        description="If True, returns the duration of each retrieval stage with the response.",
+    )
+
+    @field_validator("query", mode="after")
+    @classmethod
+    def query_strip_after(cls, query: str) -> str:
+        return query.strip()
+
+    @field_validator("hl_keywords", "ll_keywords", mode="after")
+    @classmethod
+    def keywords_strip_after(cls, keywords: List[str] | None) -> List[str] | None:
+        if keywords is None:
+            return None
+        return [keyword.strip() for keyword in keywords if keyword.strip()]
 
-def create_query_routes(rag, api_key: Optional[str] = None, top_k: int = 60):
+    def to_query_params(self) -> "QueryParam":
+        """Converts a ContextRequest instance into a QueryParam instance."""
+        request_data = self.model_dump(exclude_none=True, exclude={"query", "trace"})
+        return QueryParam(**request_data)
+
+    def wants_trace(self) -> bool:
+        return bool(self.trace)
+
+
+class ContextResponse(BaseModel):
+    entities: List[Dict[str, Any]] = Field(
+        description="Retrieved entities with their type, description, degree rank and source file",
+    )
+
+    relationships: List[Dict[str, Any]] = Field(
+        description="Retrieved relationships with their description, keywords, weight and source file",
+    )
+
+    chunks: List[Dict[str, Any]] = Field(
+        description="Retrieved text chunks with their id, content and source file",
+    )
+
+    trace: Optional[List[Dict[str, Any]]] = Field(
+        default=None,
+        description="Retrieval stages with their start and duration in seconds, when requested.",
+    )
+
+
+def create_query_routes(
+    rag,
+    api_key: Optional[str] = None,
+    top_k: int = 60,
+    query_metrics: bool = False,
+):
     combined_auth = get_combined_auth_dependency(api_key)
+    if query_metrics:
+        # Fail at startup rather than on the first query if it can't be installed
+        get_query_stage_histogram()
+
+    def finish_trace(
+        query_request: QueryRequest | ContextRequest, spans: list, start: float
+    ):
+        """Add the total duration to the spans of a query and export them"""
+        spans.append(
+            {"stage": "total", "start": 0.0, "seconds": time.perf_counter() - start}
+        )
+        if query_metrics:
+            observe_query_trace(spans, query_request.mode)
     
     # Import the RAG manager and user ID extractor
     from lightrag.api.user_rag_manager import get_manager
     from lightrag.api.utils_api import extract_user_id
 
     @router.post(
-        "/query", response_model=QueryResponse, dependencies=[Depends(combined_auth)]
+        "/query",
+        response_model=QueryResponse,
+        response_model_exclude_none=True,
+        dependencies=[Depends(combined_auth)],
     )
     async def query_text(request_obj: Request, query_request: QueryRequest):
         """
@@ -180,17 +312,73 @@ def create_query_routes(rag, api_key: Optional[str] = None, top_k: int = 60):
                 logger.info(f"Processing query for user: {user_id}")
                 
             param = query_request.to_query_params(False)
-            response = await user_rag.aquery(query_request.query, param=param)
+            start = time.perf_counter()
+            tracing = query_metrics or query_request.wants_trace()
+            with query_trace() if tracing else nullcontext() as spans:
+                response = await user_rag.aquery(query_request.query, param=param)
+            if tracing:
+                finish_trace(query_request, spans, start)
+            trace = spans if query_request.wants_trace() else None
 
             # If response is a string (e.g. cache hit), return directly
             if isinstance(response, str):
-                return QueryResponse(response=response)
+                return QueryResponse(response=response, trace=trace)
 
             if isinstance(response, dict):
                 result = json.dumps(response, indent=2)
-                return QueryResponse(response=result)
+                return QueryResponse(response=result, trace=trace)
             else:
-                return QueryResponse(response=str(response))
+                return QueryResponse(response=str(response), trace=trace)
+        except Exception as e:
+            trace_exception(e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.post(
+        "/query/context",
+        response_model=ContextResponse,
+        response_model_exclude_none=True,
+        dependencies=[Depends(combined_auth)],
+    )
+    async def query_context(request_obj: Request, context_request: ContextRequest):
+        """
+        Retrieve the context of a query without any LLM call.
+
+        The query text, or the given hl_keywords / ll_keywords, is matched
+        against the vector storages directly: there is no keyword extraction,
+        response generation or LLM cache lookup on this path.
+
+        Parameters:
+            request_obj (Request): The FastAPI request object
+            context_request (ContextRequest): The query and retrieval parameters.
+        Returns:
+            ContextResponse: The retrieved entity, relationship and chunk records.
+
+        Raises:
+            HTTPException: Raised when an error occurs during the request handling process,
+                       with status code 500 and detail containing the exception message.
+        """
+        try:
+            user_id = None
+            try:
+                user_id = extract_user_id(request_obj)
+            except HTTPException:
+                logger.warning("No valid user ID provided, using system-wide storage")
+
+            user_rag = rag
+            if user_id:
+                user_rag = await get_manager().get_instance(user_id)
+
+            param = context_request.to_query_params()
+            start = time.perf_counter()
+            tracing = query_metrics or context_request.wants_trace()
+            with query_trace() if tracing else nullcontext() as spans:
+                records = await user_rag.aretrieve(context_request.query, param=param)
+            if tracing:
+                finish_trace(context_request, spans, start)
+
+            return ContextResponse(
+                **records, trace=spans if context_request.wants_trace() else None
+            )
         except Exception as e:
             trace_exception(e)
             raise HTTPException(status_code=500, detail=str(e))
@@ -222,7 +410,10 @@ def create_query_routes(rag, api_key: Optional[str] = None, top_k: int = 60):
                 logger.info(f"Processing streaming query for user: {user_id}")
                 
             param = query_request.to_query_params(True)
-            response = await user_rag.aquery(query_request.query, param=param)
+            start = time.perf_counter()
+            tracing = query_metrics or query_request.wants_trace()
+            with query_trace() if tracing else nullcontext() as spans:
+                response = await user_rag.aquery(query_request.query, param=param)
 
             from fastapi.responses import StreamingResponse
 
@@ -239,6 +430,11 @@ def create_query_routes(rag, api_key: Optional[str] = None, top_k: int = 60):
                     except Exception as e:
                         logging.error(f"Streaming error: {str(e)}")
                         yield f"{json.dumps({'error': str(e)})}\n"
+                # The LLM spans of a stream are recorded once it is consumed
+                if tracing:
+                    finish_trace(query_request, spans, start)
+                if query_request.wants_trace():
+                    yield f"{json.dumps({'trace': spans})}\n"
 
             return StreamingResponse(
                 stream_generator(),
@@ -42,6 +42,28 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 
+def prepare_metrics_dir():
+    """Clear the Prometheus multiprocess directory before the workers start
+
+    Without PROMETHEUS_MULTIPROC_DIR every worker keeps its own metrics and
+    /metrics only returns those of the worker serving the scrape.
+    """
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not metrics_dir:
+        print(
+            "Warning: QUERY_METRICS with several workers needs PROMETHEUS_MULTIPROC_DIR, "
+            "otherwise /metrics only reports the worker serving the scrape"
+        )
+        return
+
+    os.makedirs(metrics_dir, exist_ok=True)
+    # Samples of a previous run would be added to the new ones
+    for file_name in os.listdir(metrics_dir):
+        if file_name.endswith(".db"):
+            os.remove(os.path.join(metrics_dir, file_name))
+    print(f"Prometheus multiprocess directory: {metrics_dir}")
+
+
 def main():
     # Check .env file
     if not check_env_file():
@@ -207,6 +229,8 @@ def main():
         # Set a flag to indicate we're in the main process
         os.environ["LIGHTRAG_MAIN_PROCESS"] = "1"
         initialize_share_data(workers_count)
+        if global_args.query_metrics:
+            prepare_metrics_dir()
     else:
         initialize_share_data(1)
 
@@ -4,8 +4,10 @@ Utility functions for the LightRAG API.
 
 import os
 import argparse
-from typing import Optional, List, Tuple
+from collections import defaultdict
+from typing import Any, Dict, Optional, List, Tuple
 import sys
+import pipmaster as pm
 from ascii_colors import ASCIIColors
 from lightrag.api import __api_version__ as api_version
 from lightrag import __version__ as core_version
@@ -215,6 +217,42 @@ def extract_user_id(request: Request) -> str:
     return user_id
 
 
+_query_stage_seconds = None
+
+
+def get_query_stage_histogram():
+    """
+    Get the Prometheus histogram of query stage durations, creating it on first use.
+    prometheus-client is installed on demand like the other optional dependencies.
+    """
+    global _query_stage_seconds
+    if _query_stage_seconds is None:
+        if not pm.is_installed("prometheus-client"):
+            pm.install("prometheus-client")
+        from prometheus_client import Histogram
+
+        _query_stage_seconds = Histogram(
+            "lightrag_query_stage_seconds",
+            "Time spent in each stage of a query",
+            ["mode", "stage"],
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+        )
+    return _query_stage_seconds
+
+
+def observe_query_trace(spans: List[Dict[str, Any]], mode: str) -> None:
+    """
+    Add the spans recorded by lightrag.utils.query_trace for one query to the
+    stage histogram, summing the spans of stages that ran several times.
+    """
+    stage_seconds = defaultdict(float)
+    for span in spans:
+        stage_seconds[span["stage"]] += span["seconds"]
+    histogram = get_query_stage_histogram()
+    for stage, seconds in stage_seconds.items():
+        histogram.labels(mode=mode, stage=stage).observe(seconds)
+
+
 def display_splash_screen(args: argparse.Namespace) -> None:
     """
     Display a colorful splash screen showing LightRAG server configuration
@@ -255,6 +293,8 @@ def display_splash_screen(args: argparse.Namespace) -> None:
     ASCIIColors.yellow(f"{args.verbose}")
     ASCIIColors.white("    ├─ History Turns: ", end="")
     ASCIIColors.yellow(f"{args.history_turns}")
+    ASCIIColors.white("    ├─ Query Metrics: ", end="")
+    ASCIIColors.yellow("Enabled" if args.query_metrics else "Disabled")
     ASCIIColors.white("    ├─ API Key: ", end="")
     ASCIIColors.yellow("Set" if args.key else "Not Set")
     ASCIIColors.white("    └─ JWT Auth: ", end="")
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+import asyncio
 from enum import Enum
 import os
 from dotenv import load_dotenv
 from dataclasses import dataclass, field
+import numpy as np
 from typing import (
     Any,
     Literal,
@@ -76,6 +78,21 @@ class QueryParam:
     ll_keywords: list[str] = field(default_factory=list)
     """List of low-level keywords to refine retrieval focus."""
 
+    per_keyword_search: bool = (
+        os.getenv("PER_KEYWORD_SEARCH", "false").lower() == "true"
+    )
+    """If True, entities and relationships are searched for each keyword separately (plus all keywords together) and the result lists are fused by reciprocal rank, instead of one search for all keywords joined."""
+
+    speculative_retrieval: bool = (
+        os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+    )
+    """Mix mode only. If True, knowledge graph retrieval starts from the raw query while the keywords are extracted. Once both are done, the keyword results are retrieved and ranked in front of the raw query results. This saves the keyword LLM round trip only as far as it overlaps the raw query retrieval; the keyword retrieval itself still runs after it."""
+
+    speculative_keyword_timeout: float = float(
+        os.getenv("SPECULATIVE_KEYWORD_TIMEOUT", "30")
+    )
+    """Seconds to wait for keyword extraction after the raw query retrieval with speculative_retrieval. When it expires the extraction is cancelled and the answer is built from the raw query context alone (and not cached): a faster but less focused answer, and no keywords are cached for the next query."""
+
     conversation_history: list[dict[str, str]] = field(default_factory=list)
     """Stores past conversation history to maintain context.
     Format: [{"role": "user/assistant", "content": "message"}].
@@ -146,9 +163,61 @@ class BaseVectorStorage(StorageNameSpace, ABC):
 
     @abstractmethod
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
     ) -> list[dict[str, Any]]:
-        """Query the vector storage and retrieve top_k results."""
+        """Query the vector storage and retrieve top_k results.
+
+        If query_embedding is given, it is used as the vector of query instead
+        of calling the embedding function.
+        """
+
+    async def _embed_query(
+        self, query: str, query_embedding: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Return the vector of query, embedding it only if no precomputed vector is given"""
+        if query_embedding is not None:
+            return np.asarray(query_embedding)
+        embedding = await self.embedding_func([query])
+        return embedding[0]
+
+    async def query_batch(
+        self,
+        queries: list[str],
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embeddings: np.ndarray | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        """Query the vector storage with several queries at once.
+
+        Returns one result list per query, as query would. If query_embeddings
+        is given, its rows are used as the vectors of the queries.
+
+        The default implementation embeds all queries in one call and runs them
+        concurrently; storages that can search many vectors at once override it.
+        """
+        embeddings = await self._embed_queries(queries, query_embeddings)
+        return list(
+            await asyncio.gather(
+                *[
+                    self.query(query, top_k, ids, query_embedding=embedding)
+                    for query, embedding in zip(queries, embeddings)
+                ]
+            )
+        )
+
+    async def _embed_queries(
+        self, queries: list[str], query_embeddings: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Return the vectors of queries as a 2-D array, embedding them in one call if not given"""
+        if query_embeddings is not None:
+            return np.asarray(query_embeddings)
+        if not queries:
+            return np.empty((0, self.embedding_func.embedding_dim))
+        return np.asarray(await self.embedding_func(queries))
 
     @abstractmethod
     async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
@@ -392,6 +461,117 @@ class BaseGraphStorage(StorageNameSpace, ABC):
             edge_data: A dictionary of edge properties
         """
 
+    async def get_nodes_batch(self, node_ids: list[str]) -> dict[str, dict]:
+        """Get multiple nodes at once, returning only node properties.
+
+        The default implementation issues one get_node call per node;
+        storages backed by a database should override it with a single query.
+
+        Args:
+            node_ids: List of node IDs to retrieve
+
+        Returns:
+            A dictionary mapping each found node ID to its properties,
+            nodes that don't exist are left out
+        """
+        nodes = await asyncio.gather(*[self.get_node(n) for n in node_ids])
+        return {
+            node_id: node for node_id, node in zip(node_ids, nodes) if node is not None
+        }
+
+    async def node_degrees_batch(self, node_ids: list[str]) -> dict[str, int]:
+        """Get the degrees of multiple nodes at once.
+
+        Args:
+            node_ids: List of node IDs
+
+        Returns:
+            A dictionary mapping each node ID to its degree (0 for missing nodes)
+        """
+        degrees = await asyncio.gather(*[self.node_degree(n) for n in node_ids])
+        return dict(zip(node_ids, degrees))
+
+    async def get_edges_batch(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        """Get the properties of multiple edges at once.
+
+        Args:
+            edge_pairs: List of (source_id, target_id) tuples
+
+        Returns:
+            A dictionary mapping each found (source_id, target_id) pair, as given,
+            to its edge properties, edges that don't exist are left out
+        """
+        edges = await asyncio.gather(
+            *[self.get_edge(src, tgt) for src, tgt in edge_pairs]
+        )
+        return {pair: edge for pair, edge in zip(edge_pairs, edges) if edge is not None}
+
+    async def edge_degrees_batch(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], int]:
+        """Get the degrees of multiple edges at once.
+
+        The degree of an edge is the sum of the degrees of its two nodes.
+
+        Args:
+            edge_pairs: List of (source_id, target_id) tuples
+
+        Returns:
+            A dictionary mapping each (source_id, target_id) pair to its degree
+        """
+        node_degrees = await self.node_degrees_batch(
+            list({node_id for pair in edge_pairs for node_id in pair})
+        )
+        return {
+            (src, tgt): node_degrees.get(src, 0) + node_degrees.get(tgt, 0)
+            for src, tgt in edge_pairs
+        }
+
+    async def get_nodes_edges_batch(
+        self, node_ids: list[str]
+    ) -> dict[str, list[tuple[str, str]]]:
+        """Get the edges connected to multiple nodes at once.
+
+        Args:
+            node_ids: List of node IDs to get edges for
+
+        Returns:
+            A dictionary mapping each node ID to a list of (node_id, neighbor_id)
+            tuples, the list is empty for nodes without edges or missing nodes
+        """
+        edges = await asyncio.gather(*[self.get_node_edges(n) for n in node_ids])
+        return {
+            node_id: list(node_edges) if node_edges else []
+            for node_id, node_edges in zip(node_ids, edges)
+        }
+
+    async def upsert_nodes_batch(self, nodes: dict[str, dict[str, str]]) -> None:
+        """Insert or update multiple nodes at once.
+
+        Same persistence notes as upsert_node apply.
+
+        Args:
+            nodes: A dictionary mapping node IDs to node properties
+        """
+        for node_id, node_data in nodes.items():
+            await self.upsert_node(node_id, node_data)
+
+    async def upsert_edges_batch(
+        self, edges: dict[tuple[str, str], dict[str, str]]
+    ) -> None:
+        """Insert or update multiple edges at once.
+
+        Same persistence notes as upsert_edge apply. Both nodes of every edge
+        must exist before the call.
+
+        Args:
+            edges: A dictionary mapping (source_id, target_id) tuples to edge properties
+        """
+        for (src, tgt), edge_data in edges.items():
+            await self.upsert_edge(src, tgt, edge_data)
+
     @abstractmethod
     async def delete_node(self, node_id: str) -> None:
         """Delete a node from the graph.
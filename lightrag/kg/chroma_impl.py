@@ -158,15 +158,17 @@ class ChromaVectorDBStorage(BaseVectorStorage):
             raise
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
     ) -> list[dict[str, Any]]:
         try:
-            embedding = await self.embedding_func([query])
+            embedding = await self._embed_query(query, query_embedding)
 
             results = self._collection.query(
-                query_embeddings=embedding.tolist()
-                if not isinstance(embedding, list)
-                else embedding,
+                query_embeddings=[embedding.tolist()],
                 n_results=top_k * 2,  # Request more results to allow for filtering
                 include=["metadatas", "distances", "documents"],
             )
@@ -191,6 +193,43 @@ class ChromaVectorDBStorage(BaseVectorStorage):
             logger.error(f"Error during ChromaDB query: {str(e)}")
             raise
 
+    async def query_batch(
+        self,
+        queries: list[str],
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embeddings: np.ndarray | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        try:
+            embeddings = await self._embed_queries(queries, query_embeddings)
+            if not len(embeddings):
+                return []
+
+            # One collection query for all vectors, filtered like query
+            results = self._collection.query(
+                query_embeddings=embeddings.tolist(),
+                n_results=top_k * 2,
+                include=["metadatas", "distances", "documents"],
+            )
+            return [
+                [
+                    {
+                        "id": results["ids"][q][i],
+                        "distance": 1 - results["distances"][q][i],
+                        "content": results["documents"][q][i],
+                        **results["metadatas"][q][i],
+                    }
+                    for i in range(len(results["ids"][q]))
+                    if (1 - results["distances"][q][i])
+                    >= self.cosine_better_than_threshold
+                ][:top_k]
+                for q in range(len(embeddings))
+            ]
+
+        except Exception as e:
+            logger.error(f"Error during ChromaDB batch query: {str(e)}")
+            raise
+
     async def index_done_callback(self) -> None:
         # ChromaDB handles persistence automatically
         pass
@@ -1,6 +1,7 @@
 import os
 import time
 import asyncio
+from collections.abc import Iterator, MutableMapping
 from typing import Any, final
 import json
 import numpy as np
@@ -25,6 +26,237 @@ FAISS_PACKAGE = "faiss-gpu" if USE_GPU else "faiss-cpu"
 if not pm.is_installed(FAISS_PACKAGE):
     pm.install(FAISS_PACKAGE)
 
+# Approximate index types, built next to the flat index once there are enough vectors
+ANN_INDEX_TYPES = ("IVFFlat", "HNSWFlat", "IVFPQ", "OPQ")
+# Rebuild an approximate index that can't remove vectors (HNSW) once this share
+# of its vectors was removed, or once filtering them nears ANN_MAX_CANDIDATES
+ANN_REBUILD_RATIO = 0.1
+# Fall back to the flat index when filtering removed vectors needs more candidates
+ANN_MAX_CANDIDATES = 2048
+# Candidates per result fetched from PQ indexes before exact re-ranking
+PQ_RERANK_FACTOR = 4
+
+
+def _ann_index_ids(ann_index) -> np.ndarray:
+    """Ids of the vectors of an approximate index"""
+    if isinstance(ann_index, faiss.IndexIDMap):
+        return faiss.vector_to_array(ann_index.id_map)
+    ivf = faiss.extract_index_ivf(ann_index)
+    invlists = ivf.invlists
+    ids = []
+    for list_no in range(ivf.nlist):
+        list_ids = invlists.get_ids(list_no)
+        ids.append(faiss.rev_swig_ptr(list_ids, invlists.list_size(list_no)).copy())
+        invlists.release_ids(list_no, list_ids)
+    return np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+
+
+def _encode_strings(values: list[bytes]) -> tuple[np.ndarray, np.ndarray]:
+    """Concatenate encoded strings into (offsets, uint8 blob) columns"""
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in values], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(values), dtype=np.uint8)
+
+
+def _select_strings(
+    offsets: np.ndarray, blob: np.ndarray, keep: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Keep the strings of an (offsets, blob) column selected by a boolean mask"""
+    lengths = np.diff(offsets)
+    kept_offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+    np.cumsum(lengths[keep], out=kept_offsets[1:])
+    return kept_offsets, blob[np.repeat(keep, lengths)]
+
+
+def _write_columns(file_name: str, columns: dict[str, np.ndarray]) -> None:
+    """
+    Write 1-D arrays as a JSON header, prefixed by its length, followed by their
+    raw bytes. The file is replaced atomically, processes mapping the old one
+    keep reading it until they reload.
+    """
+    header, offset = {}, 0
+    for name, array in columns.items():
+        header[name] = [array.dtype.str, len(array), offset]
+        offset += array.nbytes
+    header_bytes = json.dumps(header).encode("utf-8")
+    tmp_file_name = f"{file_name}.tmp"
+    with open(tmp_file_name, "wb") as f:
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for array in columns.values():
+            np.ascontiguousarray(array).tofile(f)
+    os.replace(tmp_file_name, file_name)
+
+
+def _read_columns(file_name: str) -> dict[str, np.ndarray]:
+    """Memory-map the arrays of a file written by _write_columns"""
+    with open(file_name, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    columns = {}
+    for name, (dtype, length, offset) in header.items():
+        if length:
+            columns[name] = np.memmap(
+                file_name,
+                dtype=dtype,
+                mode="r",
+                offset=8 + header_size + offset,
+                shape=(length,),
+            )
+        else:
+            columns[name] = np.empty(0, dtype=dtype)
+    return columns
+
+
+class _MetaTable(MutableMapping):
+    """
+    Mapping of Faiss id -> metadata backed by the columns of the metadata file.
+
+    Loaded records stay encoded in the memory-mapped file and are decoded one at
+    a time on access, so startup doesn't parse every record and only the pages
+    read are resident. Records set since the load are kept as dicts and removed
+    ones as a set of Faiss ids, until columns() folds them into the next save.
+
+    Columns, sorted by Faiss id:
+    - fids: int64 Faiss ids
+    - created_at: float64 __created_at__
+    - ids_offsets, ids: utf-8 __id__ strings
+    - meta_offsets, meta: JSON objects of the other metadata fields
+    """
+
+    def __init__(self, columns: dict[str, np.ndarray] | None = None):
+        if columns is None:
+            columns = {
+                "fids": np.empty(0, dtype=np.int64),
+                "created_at": np.empty(0, dtype=np.float64),
+                "ids_offsets": np.zeros(1, dtype=np.int64),
+                "ids": np.empty(0, dtype=np.uint8),
+                "meta_offsets": np.zeros(1, dtype=np.int64),
+                "meta": np.empty(0, dtype=np.uint8),
+            }
+        self._columns = columns
+        self._fids = columns["fids"]
+        self._added: dict[int, dict[str, Any]] = {}
+        self._removed: set[int] = set()
+
+    def _row(self, fid: int) -> int | None:
+        row = int(np.searchsorted(self._fids, fid))
+        if (
+            row < len(self._fids)
+            and self._fids[row] == fid
+            and fid not in self._removed
+        ):
+            return row
+        return None
+
+    def _string(self, name: str, row: int) -> bytes:
+        offsets = self._columns[f"{name}_offsets"]
+        return self._columns[name][offsets[row] : offsets[row + 1]].tobytes()
+
+    def __getitem__(self, fid: int) -> dict[str, Any]:
+        if fid in self._added:
+            return self._added[fid]
+        row = self._row(fid)
+        if row is None:
+            raise KeyError(fid)
+        meta = json.loads(self._string("meta", row))
+        meta["__id__"] = self._string("ids", row).decode("utf-8")
+        meta["__created_at__"] = float(self._columns["created_at"][row])
+        return meta
+
+    def __setitem__(self, fid: int, meta: dict[str, Any]) -> None:
+        if self._row(fid) is not None:
+            self._removed.add(fid)
+        self._added[fid] = meta
+
+    def __delitem__(self, fid: int) -> None:
+        if fid in self._added:
+            del self._added[fid]
+        elif self._row(fid) is not None:
+            self._removed.add(fid)
+        else:
+            raise KeyError(fid)
+
+    def __contains__(self, fid: object) -> bool:
+        return fid in self._added or self._row(fid) is not None
+
+    def __iter__(self) -> Iterator[int]:
+        for fid in self._fids.tolist():
+            if fid not in self._removed:
+                yield fid
+        yield from list(self._added)
+
+    def __len__(self) -> int:
+        return len(self._fids) - len(self._removed) + len(self._added)
+
+    def custom_ids(self) -> Iterator[tuple[int, str]]:
+        """Yield (Faiss id, custom id) pairs without decoding the other metadata"""
+        for row, fid in enumerate(self._fids.tolist()):
+            if fid not in self._removed:
+                yield fid, self._string("ids", row).decode("utf-8")
+        for fid, meta in list(self._added.items()):
+            yield fid, meta["__id__"]
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """
+        Return the columns of the current records. Loaded records that were not
+        changed are copied as raw bytes, only the added ones are encoded.
+        """
+        added_fids = sorted(self._added)
+        keep = ~np.isin(self._fids, np.array(list(self._removed), dtype=np.int64))
+        if added_fids and keep.any() and added_fids[0] < self._fids[keep][-1]:
+            # New ids always come after the loaded ones, unless the table was
+            # filled out of order: encode everything then
+            table = _MetaTable()
+            for fid in sorted(self):
+                table[fid] = self[fid]
+            return table.columns()
+
+        added = [self._added[fid] for fid in added_fids]
+        id_offsets, ids = _encode_strings(
+            [meta["__id__"].encode("utf-8") for meta in added]
+        )
+        meta_offsets, meta_blob = _encode_strings(
+            [
+                json.dumps(
+                    {
+                        k: v
+                        for k, v in meta.items()
+                        if k not in ("__id__", "__created_at__")
+                    },
+                    ensure_ascii=False,
+                ).encode("utf-8")
+                for meta in added
+            ]
+        )
+        kept_id_offsets, kept_ids = _select_strings(
+            self._columns["ids_offsets"], self._columns["ids"], keep
+        )
+        kept_meta_offsets, kept_meta = _select_strings(
+            self._columns["meta_offsets"], self._columns["meta"], keep
+        )
+        return {
+            "fids": np.concatenate(
+                [self._fids[keep], np.array(added_fids, dtype=np.int64)]
+            ),
+            "created_at": np.concatenate(
+                [
+                    self._columns["created_at"][keep],
+                    np.array(
+                        [meta["__created_at__"] for meta in added], dtype=np.float64
+                    ),
+                ]
+            ),
+            "ids_offsets": np.concatenate(
+                [kept_id_offsets, kept_id_offsets[-1] + id_offsets[1:]]
+            ),
+            "ids": np.concatenate([kept_ids, ids]),
+            "meta_offsets": np.concatenate(
+                [kept_meta_offsets, kept_meta_offsets[-1] + meta_offsets[1:]]
+            ),
+            "meta": np.concatenate([kept_meta, meta_blob]),
+        }
+
 
 @final
 @dataclass
@@ -32,6 +264,24 @@ class FaissVectorDBStorage(BaseVectorStorage):
     """
     A Faiss-based Vector DB Storage for LightRAG.
     Uses cosine similarity by storing normalized vectors in a Faiss index with inner product search.
+
+    The flat index holds all vectors and answers queries exactly. With index_type
+    set in vector_db_storage_cls_kwargs (or FAISS_INDEX_TYPE) to IVFFlat, HNSWFlat,
+    IVFPQ or OPQ, an approximate index is also trained in a worker thread when
+    index_done_callback finds ann_min_vectors vectors, and serves queries once
+    ready. Its candidates are re-ranked against the flat vectors, so distances
+    stay exact. Later upserts are added to it, and removed vectors are filtered
+    out of its results until enough of them trigger a rebuild.
+
+    Other vector_db_storage_cls_kwargs:
+    - nlist: IVF lists (default 4 * sqrt(vectors) at build time)
+    - nprobe: IVF lists searched per query (default 16, or FAISS_NPROBE)
+    - hnsw_m, ef_construction, ef_search: HNSW graph degree and search depths
+      (default 32, 40, 64; ef_search also from FAISS_EF_SEARCH)
+    - pq_m, pq_nbits: PQ sub-quantizers, which must divide the dimension, and
+      bits per code (default 16, 8)
+    - ann_min_vectors: vectors needed before building (default 10000, or
+      FAISS_ANN_MIN_VECTORS)
     """
 
     def __post_init__(self):
@@ -48,22 +298,76 @@ class FaissVectorDBStorage(BaseVectorStorage):
         self._faiss_index_file = os.path.join(
             self.global_config["working_dir"], f"faiss_index_{self.namespace}.index"
         )
-        self._meta_file = self._faiss_index_file + ".meta.json"
+        self._meta_file = self._faiss_index_file + ".meta.bin"
+        # Metadata saved as JSON by older versions, converted on the next save
+        self._legacy_meta_file = self._faiss_index_file + ".meta.json"
+
+        self._index_type = kwargs.get(
+            "index_type", os.getenv("FAISS_INDEX_TYPE", "Flat")
+        )
+        if self._index_type != "Flat" and self._index_type not in ANN_INDEX_TYPES:
+            raise ValueError(
+                f"Unsupported Faiss index_type {self._index_type}, use Flat or one of {ANN_INDEX_TYPES}"
+            )
+        self._ann_index_file = os.path.join(
+            self.global_config["working_dir"],
+            f"faiss_index_{self.namespace}.{self._index_type.lower()}.index",
+        )
+        self._nlist = kwargs.get("nlist")
+        self._nprobe = int(kwargs.get("nprobe", os.getenv("FAISS_NPROBE", 16)))
+        self._hnsw_m = int(kwargs.get("hnsw_m", 32))
+        self._ef_construction = int(kwargs.get("ef_construction", 40))
+        self._ef_search = int(kwargs.get("ef_search", os.getenv("FAISS_EF_SEARCH", 64)))
+        self._pq_m = int(kwargs.get("pq_m", 16))
+        self._pq_nbits = int(kwargs.get("pq_nbits", 8))
+        self._ann_min_vectors = int(
+            kwargs.get("ann_min_vectors", os.getenv("FAISS_ANN_MIN_VECTORS", 10000))
+        )
+        self._ann_build_task = None
+        # Bumped on reset so a build started before a reload or drop is discarded
+        self._ann_generation = 0
 
         self._max_batch_size = self.global_config["embedding_batch_num"]
         # Embedding dimension (e.g. 768) must match your embedding function
         self._dim = self.embedding_func.embedding_dim
 
         # Create an empty Faiss index for inner product (useful for normalized vectors = cosine similarity).
-        # If you have a large number of vectors, you might want IVF or other indexes.
-        # For demonstration, we use a simple IndexFlatIP.
-        self._index = faiss.IndexFlatIP(self._dim)
+        self._index = self._new_index()
         # Keep a local store for metadata, IDs, etc.
         # Maps <int faiss_id> → metadata (including your original ID).
-        self._id_to_meta = {}
+        self._id_to_meta = _MetaTable()
+        # Reverse map <custom id> → <int faiss_id>, kept in sync with _id_to_meta
+        # once built by the first lookup
+        self._custom_id_to_fid = None
+        # Faiss ids are never reused, so a removed id can't alias a new vector
+        self._next_fid = 0
+        # Approximate index, None until trained. IVF types remove vectors in
+        # place; HNSW can't, so the ids removed from it are filtered from its results.
+        self._ann_index = None
+        self._ann_removed = set()
+        self._ann_built_size = 0
+        self._ann_dirty = False
 
         self._load_faiss_index()
 
+    def _new_index(self):
+        """
+        Create an empty index. IndexIDMap2 lets vectors keep their Faiss id across
+        removals, so deletes are remove_ids calls instead of index rebuilds.
+        """
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self._dim))
+
+    def _reset(self):
+        self._index = self._new_index()
+        self._id_to_meta = _MetaTable()
+        self._custom_id_to_fid = None
+        self._next_fid = 0
+        self._ann_index = None
+        self._ann_removed = set()
+        self._ann_built_size = 0
+        self._ann_dirty = False
+        self._ann_generation += 1
+
     async def initialize(self):
         """Initialize storage data"""
         # Get the update flag for cross-process update notification
@@ -81,8 +385,7 @@ class FaissVectorDBStorage(BaseVectorStorage):
                     f"Process {os.getpid()} FAISS reloading {self.namespace} due to update by another process"
                 )
                 # Reload data
-                self._index = faiss.IndexFlatIP(self._dim)
-                self._id_to_meta = {}
+                self._reset()
                 self._load_faiss_index()
                 self.storage_updated.value = False
         return self._index
@@ -156,62 +459,87 @@ class FaissVectorDBStorage(BaseVectorStorage):
 
         # Step 2: Add new vectors
         index = await self._get_index()
-        start_idx = index.ntotal
-        index.add(embeddings)
-
-        # Step 3: Store metadata + vector for each new ID
-        for i, meta in enumerate(list_data):
-            fid = start_idx + i
-            # Store the raw vector so we can rebuild if something is removed
-            meta["__vector__"] = embeddings[i].tolist()
-            self._id_to_meta.update({fid: meta})
+        fids = np.arange(
+            self._next_fid, self._next_fid + len(list_data), dtype=np.int64
+        )
+        index.add_with_ids(embeddings, fids)
+        self._next_fid += len(list_data)
+        if self._ann_index is not None:
+            self._ann_index.add_with_ids(embeddings, fids)
+            self._ann_dirty = True
+
+        # Step 3: Store metadata for each new ID, the vector lives only in the index
+        for fid, meta in zip(fids.tolist(), list_data):
+            self._id_to_meta[fid] = meta
+            if self._custom_id_to_fid is not None:
+                self._custom_id_to_fid[meta["__id__"]] = fid
 
         logger.info(f"Upserted {len(list_data)} vectors into Faiss index.")
         return [m["__id__"] for m in list_data]
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
     ) -> list[dict[str, Any]]:
         """
         Search by a textual query; returns top_k results with their metadata + similarity distance.
         """
-        embedding = await self.embedding_func([query])
-        # embedding is shape (1, dim)
-        embedding = np.array(embedding, dtype=np.float32)
-        faiss.normalize_L2(embedding)  # we do in-place normalization
-
         logger.info(
             f"Query: {query}, top_k: {top_k}, threshold: {self.cosine_better_than_threshold}"
         )
+        query_embeddings = None
+        if query_embedding is not None:
+            query_embeddings = np.asarray(query_embedding).reshape(1, -1)
+        results = await self.query_batch([query], top_k, ids, query_embeddings)
+        return results[0]
+
+    async def query_batch(
+        self,
+        queries: list[str],
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embeddings: np.ndarray | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        """
+        Search several queries with a single index.search over a (n_queries, dim) array.
+        """
+        embeddings = await self._embed_queries(queries, query_embeddings)
+        if not len(embeddings):
+            return []
+        embeddings = np.array(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)  # we do in-place normalization
 
         # Perform the similarity search
-        index = await self._get_index()
-        distances, indices = index.search(embedding, top_k)
-
-        distances = distances[0]
-        indices = indices[0]
-
-        results = []
-        for dist, idx in zip(distances, indices):
-            if idx == -1:
-                # Faiss returns -1 if no neighbor
-                continue
-
-            # Cosine similarity threshold
-            if dist < self.cosine_better_than_threshold:
-                continue
-
-            meta = self._id_to_meta.get(idx, {})
-            results.append(
-                {
-                    **meta,
-                    "id": meta.get("__id__"),
-                    "distance": float(dist),
-                    "created_at": meta.get("__created_at__"),
-                }
-            )
+        await self._get_index()
+        all_distances, all_indices = self._search(embeddings, top_k)
+
+        batch_results = []
+        for distances, indices in zip(all_distances, all_indices):
+            results = []
+            for dist, idx in zip(distances, indices):
+                if idx == -1:
+                    # Faiss returns -1 if no neighbor
+                    continue
+
+                # Cosine similarity threshold
+                if dist < self.cosine_better_than_threshold:
+                    continue
+
+                meta = self._id_to_meta.get(idx, {})
+                results.append(
+                    {
+                        **meta,
+                        "id": meta.get("__id__"),
+                        "distance": float(dist),
+                        "created_at": meta.get("__created_at__"),
+                    }
+                )
+            batch_results.append(results)
 
-        return results
+        return batch_results
 
     @property
     def client_storage(self):
@@ -277,35 +605,185 @@ class FaissVectorDBStorage(BaseVectorStorage):
         """
         Return the Faiss internal ID for a given custom ID, or None if not found.
         """
-        for fid, meta in self._id_to_meta.items():
-            if meta.get("__id__") == custom_id:
-                return fid
-        return None
+        if self._custom_id_to_fid is None:
+            self._custom_id_to_fid = {
+                custom_id: fid for fid, custom_id in self._id_to_meta.custom_ids()
+            }
+        return self._custom_id_to_fid.get(custom_id)
 
     async def _remove_faiss_ids(self, fid_list):
         """
-        Remove a list of internal Faiss IDs from the index.
-        Because IndexFlatIP doesn't support 'removals',
-        we rebuild the index excluding those vectors.
+        Remove a list of internal Faiss IDs from the index and the metadata.
+        """
+        async with self._storage_lock:
+            self._index.remove_ids(np.array(fid_list, dtype=np.int64))
+            for fid in fid_list:
+                meta = self._id_to_meta.pop(fid, None)
+                if meta is not None and self._custom_id_to_fid is not None:
+                    self._custom_id_to_fid.pop(meta["__id__"], None)
+            if self._ann_index is not None:
+                if self._ann_supports_removal():
+                    self._ann_index.remove_ids(np.array(fid_list, dtype=np.int64))
+                    self._ann_dirty = True
+                else:
+                    self._ann_removed.update(fid_list)
+
+    def _ann_supports_removal(self) -> bool:
+        """IVF indexes hold the Faiss ids natively, HNSW needs an IDMap wrapper
+        that can't remove vectors (as do indexes saved by older versions)"""
+        return not isinstance(self._ann_index, faiss.IndexIDMap)
+
+    def _search(self, embeddings: np.ndarray, top_k: int):
+        """
+        Search the normalized query embeddings, returning (distances, faiss ids)
+        arrays like index.search. Uses the approximate index when it is ready.
         """
-        keep_fids = [fid for fid in self._id_to_meta if fid not in fid_list]
+        candidates = top_k
+        if self._index_type in ("IVFPQ", "OPQ"):
+            candidates *= PQ_RERANK_FACTOR
+        candidates += len(self._ann_removed)
+        if self._ann_index is None or candidates > ANN_MAX_CANDIDATES:
+            return self._index.search(embeddings, top_k)
+
+        if self._index_type == "HNSWFlat":
+            faiss.ParameterSpace().set_index_parameter(
+                self._ann_index, "efSearch", max(self._ef_search, candidates)
+            )
+        _, all_candidates = self._ann_index.search(embeddings, candidates)
+
+        # Re-rank the candidates still in the storage with their exact vectors
+        all_distances = np.full((len(embeddings), top_k), -np.inf, dtype=np.float32)
+        all_indices = np.full((len(embeddings), top_k), -1, dtype=np.int64)
+        for row, (embedding, fids) in enumerate(zip(embeddings, all_candidates)):
+            fids = np.array(
+                [fid for fid in fids if fid != -1 and fid not in self._ann_removed],
+                dtype=np.int64,
+            )
+            if not len(fids):
+                continue
+            distances = self._index.reconstruct_batch(fids) @ embedding
+            order = np.argsort(-distances)[:top_k]
+            all_distances[row, : len(order)] = distances[order]
+            all_indices[row, : len(order)] = fids[order]
+        return all_distances, all_indices
+
+    def _ann_needs_build(self) -> bool:
+        if (
+            self._index_type == "Flat"
+            or self._ann_build_task is not None
+            or self._index.ntotal < self._ann_min_vectors
+        ):
+            return False
+        if self._ann_index is None:
+            return True
+        if len(self._ann_removed) > min(
+            ANN_REBUILD_RATIO * self._ann_index.ntotal, ANN_MAX_CANDIDATES // 2
+        ):
+            return True
+        # IVF lists sized for the corpus at build time get too long as it grows
+        return (
+            self._index_type != "HNSWFlat"
+            and self._nlist is None
+            and self._index.ntotal > 4 * self._ann_built_size
+        )
 
-        # Rebuild the index
-        vectors_to_keep = []
-        new_id_to_meta = {}
-        for new_fid, old_fid in enumerate(keep_fids):
-            vec_meta = self._id_to_meta[old_fid]
-            vectors_to_keep.append(vec_meta["__vector__"])  # stored as list
-            new_id_to_meta[new_fid] = vec_meta
+    def _create_ann_index(self, size: int):
+        nlist = self._nlist or max(1, int(4 * np.sqrt(size)))
+        factory = {
+            "IVFFlat": f"IVF{nlist},Flat",
+            "HNSWFlat": f"HNSW{self._hnsw_m},Flat",
+            "IVFPQ": f"IVF{nlist},PQ{self._pq_m}x{self._pq_nbits}",
+            "OPQ": f"OPQ{self._pq_m},IVF{nlist},PQ{self._pq_m}x{self._pq_nbits}",
+        }[self._index_type]
+        # IVF indexes store ids themselves, HNSW doesn't support add_with_ids
+        if self._index_type == "HNSWFlat":
+            factory = f"IDMap,{factory}"
+        ann_index = faiss.index_factory(self._dim, factory, faiss.METRIC_INNER_PRODUCT)
+        if self._index_type == "HNSWFlat":
+            faiss.downcast_index(
+                ann_index.index
+            ).hnsw.efConstruction = self._ef_construction
+        return ann_index, nlist
+
+    async def _build_ann_index(self):
+        """
+        Train and fill a new approximate index in a worker thread. Vectors are
+        copied in chunks on the event loop so the thread never reads the flat
+        index while it is being modified.
+        """
+        generation = self._ann_generation
+        try:
+            fids = faiss.vector_to_array(self._index.id_map).copy()
+            ann_index, nlist = self._create_ann_index(len(fids))
+            logger.info(
+                f"Process {os.getpid()} building {self._index_type} index for {self.namespace} with {len(fids)} vectors"
+            )
 
-        async with self._storage_lock:
-            # Re-init index
-            self._index = faiss.IndexFlatIP(self._dim)
-            if vectors_to_keep:
-                arr = np.array(vectors_to_keep, dtype=np.float32)
-                self._index.add(arr)
+            if not ann_index.is_trained:
+                sample_size = min(len(fids), max(64 * nlist, 16384))
+                sample = np.random.default_rng(0).choice(
+                    fids, sample_size, replace=False
+                )
+                await asyncio.to_thread(
+                    ann_index.train, self._index.reconstruct_batch(sample)
+                )
 
-            self._id_to_meta = new_id_to_meta
+            for start in range(0, len(fids), 65536):
+                if generation != self._ann_generation:
+                    return
+                chunk = np.array(
+                    [
+                        fid
+                        for fid in fids[start : start + 65536].tolist()
+                        if fid in self._id_to_meta
+                    ],
+                    dtype=np.int64,
+                )
+                if len(chunk):
+                    await asyncio.to_thread(
+                        ann_index.add_with_ids,
+                        self._index.reconstruct_batch(chunk),
+                        chunk,
+                    )
+
+            async with self._storage_lock:
+                if generation != self._ann_generation:
+                    return
+                self._install_ann_index(ann_index)
+                faiss.write_index(self._ann_index, self._ann_index_file)
+                self._ann_dirty = False
+            logger.info(
+                f"Process {os.getpid()} {self._index_type} index for {self.namespace} is ready"
+            )
+        except Exception as e:
+            logger.error(
+                f"Failed to build {self._index_type} index for {self.namespace}: {e}"
+            )
+        finally:
+            self._ann_build_task = None
+
+    def _install_ann_index(self, ann_index):
+        """Catch the approximate index up with the flat index and start using it"""
+        ann_fids = _ann_index_ids(ann_index)
+        fids = faiss.vector_to_array(self._index.id_map)
+        missing = np.setdiff1d(fids, ann_fids)
+        if len(missing):
+            ann_index.add_with_ids(self._index.reconstruct_batch(missing), missing)
+        removed = np.setdiff1d(ann_fids, fids)
+        self._ann_index = ann_index
+        if self._ann_supports_removal():
+            if len(removed):
+                ann_index.remove_ids(removed.astype(np.int64))
+                self._ann_dirty = True
+            self._ann_removed = set()
+        else:
+            self._ann_removed = set(removed.tolist())
+        if self._index_type != "HNSWFlat":
+            # nprobe is a search parameter, it isn't saved with the index
+            faiss.ParameterSpace().set_index_parameter(
+                ann_index, "nprobe", self._nprobe
+            )
+        self._ann_built_size = len(ann_fids) - len(removed)
 
     def _save_faiss_index(self):
         """
@@ -313,15 +791,16 @@ class FaissVectorDBStorage(BaseVectorStorage):
         """
         faiss.write_index(self._index, self._faiss_index_file)
 
-        # Save metadata dict to JSON. Convert all keys to strings for JSON storage.
-        # _id_to_meta is { int: { '__id__': doc_id, '__vector__': [float,...], ... } }
-        # We'll keep the int -> dict, but JSON requires string keys.
-        serializable_dict = {}
-        for fid, meta in self._id_to_meta.items():
-            serializable_dict[str(fid)] = meta
+        # Save metadata as columns, mapping them back so the next save only
+        # encodes the records changed in between
+        _write_columns(self._meta_file, self._id_to_meta.columns())
+        self._id_to_meta = _MetaTable(_read_columns(self._meta_file))
+        if os.path.exists(self._legacy_meta_file):
+            os.remove(self._legacy_meta_file)
 
-        with open(self._meta_file, "w", encoding="utf-8") as f:
-            json.dump(serializable_dict, f)
+        if self._ann_index is not None and self._ann_dirty:
+            faiss.write_index(self._ann_index, self._ann_index_file)
+            self._ann_dirty = False
 
     def _load_faiss_index(self):
         """
@@ -336,14 +815,31 @@ class FaissVectorDBStorage(BaseVectorStorage):
             # Load the Faiss index
             self._index = faiss.read_index(self._faiss_index_file)
             # Load metadata
-            with open(self._meta_file, "r", encoding="utf-8") as f:
-                stored_dict = json.load(f)
-
-            # Convert string keys back to int
-            self._id_to_meta = {}
-            for fid_str, meta in stored_dict.items():
-                fid = int(fid_str)
-                self._id_to_meta[fid] = meta
+            if os.path.exists(self._meta_file):
+                self._id_to_meta = _MetaTable(_read_columns(self._meta_file))
+            else:
+                with open(self._legacy_meta_file, "r", encoding="utf-8") as f:
+                    stored_dict = json.load(f)
+                # Convert string keys back to int
+                self._id_to_meta = _MetaTable()
+                for fid_str, meta in sorted(
+                    stored_dict.items(), key=lambda item: int(item[0])
+                ):
+                    # Vectors were duplicated in the metadata by older versions
+                    meta.pop("__vector__", None)
+                    self._id_to_meta[int(fid_str)] = meta
+
+            if not isinstance(self._index, faiss.IndexIDMap2):
+                # Older versions saved a bare IndexFlatIP whose positions are the ids
+                flat_index = self._index
+                self._index = self._new_index()
+                if flat_index.ntotal:
+                    self._index.add_with_ids(
+                        flat_index.reconstruct_n(0, flat_index.ntotal),
+                        np.arange(flat_index.ntotal, dtype=np.int64),
+                    )
+            fids = faiss.vector_to_array(self._index.id_map)
+            self._next_fid = int(fids.max()) + 1 if len(fids) else 0
 
             logger.info(
                 f"Faiss index loaded with {self._index.ntotal} vectors from {self._faiss_index_file}"
@@ -351,8 +847,17 @@ class FaissVectorDBStorage(BaseVectorStorage):
         except Exception as e:
             logger.error(f"Failed to load Faiss index or metadata: {e}")
             logger.warning("Starting with an empty Faiss index.")
-            self._index = faiss.IndexFlatIP(self._dim)
-            self._id_to_meta = {}
+            self._reset()
+            return
+
+        if self._index_type != "Flat" and os.path.exists(self._ann_index_file):
+            try:
+                self._install_ann_index(faiss.read_index(self._ann_index_file))
+            except Exception as e:
+                logger.error(f"Failed to load {self._index_type} index: {e}")
+                logger.warning("Searching the flat index until it is rebuilt.")
+                self._ann_index = None
+                self._ann_removed = set()
 
     async def index_done_callback(self) -> None:
         async with self._storage_lock:
@@ -363,8 +868,7 @@ class FaissVectorDBStorage(BaseVectorStorage):
                     f"Storage for FAISS {self.namespace} was updated by another process, reloading..."
                 )
                 async with self._storage_lock:
-                    self._index = faiss.IndexFlatIP(self._dim)
-                    self._id_to_meta = {}
+                    self._reset()
                     self._load_faiss_index()
                     self.storage_updated.value = False
                 return False  # Return error
@@ -382,6 +886,9 @@ class FaissVectorDBStorage(BaseVectorStorage):
                 logger.error(f"Error saving FAISS index for {self.namespace}: {e}")
                 return False  # Return error
 
+            if self._ann_needs_build():
+                self._ann_build_task = asyncio.create_task(self._build_ann_index())
+
         return True  # Return success
 
     async def search_by_prefix(self, prefix: str) -> list[dict[str, Any]]:
@@ -467,16 +974,18 @@ class FaissVectorDBStorage(BaseVectorStorage):
         try:
             async with self._storage_lock:
                 # Reset the index
-                self._index = faiss.IndexFlatIP(self._dim)
-                self._id_to_meta = {}
+                self._reset()
 
                 # Remove storage files if they exist
                 if os.path.exists(self._faiss_index_file):
                     os.remove(self._faiss_index_file)
                 if os.path.exists(self._meta_file):
                     os.remove(self._meta_file)
+                if os.path.exists(self._legacy_meta_file):
+                    os.remove(self._legacy_meta_file)
+                if os.path.exists(self._ann_index_file):
+                    os.remove(self._ann_index_file)
 
-                self._id_to_meta = {}
                 self._load_faiss_index()
 
                 # Notify other processes
@@ -8,9 +8,13 @@ from lightrag.base import (
     DocStatusStorage,
 )
 from lightrag.utils import (
+    append_json_log,
+    compact_json_log,
+    json_log_needs_compaction,
+    json_log_records,
     load_json,
     logger,
-    write_json,
+    replay_json_log,
 )
 from .shared_storage import (
     get_namespace_data,
@@ -26,12 +30,21 @@ from .shared_storage import (
 @final
 @dataclass
 class JsonDocStatusStorage(DocStatusStorage):
-    """JSON implementation of document status storage"""
+    """JSON implementation of document status storage
+
+    Persisted like JsonKVStorage: a JSON snapshot plus an append-only log of
+    the documents changed since, so a status change only appends that document.
+    """
 
     def __post_init__(self):
         working_dir = self.global_config["working_dir"]
         self._file_name = os.path.join(working_dir, f"kv_store_{self.namespace}.json")
+        self._log_file_name = os.path.join(
+            working_dir, f"kv_store_{self.namespace}.log.jsonl"
+        )
         self._data = None
+        # Keys changed since the last checkpoint, shared by all processes
+        self._changed_keys = None
         self._storage_lock = None
         self.storage_updated = None
 
@@ -43,10 +56,18 @@ class JsonDocStatusStorage(DocStatusStorage):
             # check need_init must before get_namespace_data
             need_init = await try_initialize_namespace(self.namespace)
             self._data = await get_namespace_data(self.namespace)
+            self._changed_keys = await get_namespace_data(
+                f"{self.namespace}_changed_keys"
+            )
             if need_init:
                 loaded_data = load_json(self._file_name) or {}
+                log_records = replay_json_log(loaded_data, self._log_file_name)
                 async with self._storage_lock:
                     self._data.update(loaded_data)
+                    if log_records:
+                        compact_json_log(
+                            loaded_data, self._file_name, self._log_file_name
+                        )
                     logger.info(
                         f"Process {os.getpid()} doc status load {self.namespace} with {len(loaded_data)} records"
                     )
@@ -99,13 +120,25 @@ class JsonDocStatusStorage(DocStatusStorage):
     async def index_done_callback(self) -> None:
         async with self._storage_lock:
             if self.storage_updated.value:
-                data_dict = (
-                    dict(self._data) if hasattr(self._data, "_getvalue") else self._data
-                )
-                logger.info(
-                    f"Process {os.getpid()} doc status writting {len(data_dict)} records to {self.namespace}"
-                )
-                write_json(data_dict, self._file_name)
+                changed_keys = list(self._changed_keys.keys())
+                self._changed_keys.clear()
+                if changed_keys:
+                    logger.info(
+                        f"Process {os.getpid()} doc status logging {len(changed_keys)} records to {self.namespace}"
+                    )
+                    append_json_log(
+                        json_log_records(self._data, changed_keys), self._log_file_name
+                    )
+                if json_log_needs_compaction(self._file_name, self._log_file_name):
+                    data_dict = (
+                        dict(self._data)
+                        if hasattr(self._data, "_getvalue")
+                        else self._data
+                    )
+                    logger.info(
+                        f"Process {os.getpid()} doc status compacting {len(data_dict)} records to {self.namespace}"
+                    )
+                    compact_json_log(data_dict, self._file_name, self._log_file_name)
                 await clear_all_update_flags(self.namespace)
 
     async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
@@ -119,6 +152,7 @@ class JsonDocStatusStorage(DocStatusStorage):
         logger.debug(f"Inserting {len(data)} records to {self.namespace}")
         async with self._storage_lock:
             self._data.update(data)
+            self._changed_keys.update(dict.fromkeys(data, True))
             await set_all_update_flags(self.namespace)
 
         await self.index_done_callback()
@@ -145,6 +179,7 @@ class JsonDocStatusStorage(DocStatusStorage):
             for doc_id in doc_ids:
                 result = self._data.pop(doc_id, None)
                 if result is not None:
+                    self._changed_keys[doc_id] = True
                     any_deleted = True
 
             if any_deleted:
@@ -166,6 +201,8 @@ class JsonDocStatusStorage(DocStatusStorage):
         try:
             async with self._storage_lock:
                 self._data.clear()
+                self._changed_keys.clear()
+                compact_json_log({}, self._file_name, self._log_file_name)
                 await set_all_update_flags(self.namespace)
 
             await self.index_done_callback()
@@ -1,14 +1,23 @@
 import os
 from dataclasses import dataclass
-from typing import Any, final
+from typing import Any, Union, final
 
 from lightrag.base import (
     BaseKVStorage,
 )
+from lightrag.namespace import NameSpace, is_namespace
 from lightrag.utils import (
+    append_json_log,
+    compact_json_log,
+    flatten_mode_cache,
+    generate_cache_key,
+    invalidate_embedding_cache_index,
+    is_legacy_cache_bucket,
+    json_log_needs_compaction,
+    json_log_records,
     load_json,
     logger,
-    write_json,
+    replay_json_log,
 )
 from .shared_storage import (
     get_namespace_data,
@@ -24,12 +33,27 @@ from .shared_storage import (
 @final
 @dataclass
 class JsonKVStorage(BaseKVStorage):
+    """KV storage kept in memory and persisted as a JSON snapshot plus an
+    append-only log of the records changed since the snapshot
+
+    Checkpoints append the changed records to the log; the log is folded into
+    a new snapshot once it outgrows it (see json_log_needs_compaction).
+    """
+
     def __post_init__(self):
         working_dir = self.global_config["working_dir"]
         self._file_name = os.path.join(working_dir, f"kv_store_{self.namespace}.json")
+        self._log_file_name = os.path.join(
+            working_dir, f"kv_store_{self.namespace}.log.jsonl"
+        )
         self._data = None
+        # Keys changed since the last checkpoint, shared by all processes
+        self._changed_keys = None
         self._storage_lock = None
         self.storage_updated = None
+        self._is_llm_cache = is_namespace(
+            self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE
+        )
 
     async def initialize(self):
         """Initialize storage data"""
@@ -39,50 +63,72 @@ class JsonKVStorage(BaseKVStorage):
             # check need_init must before get_namespace_data
             need_init = await try_initialize_namespace(self.namespace)
             self._data = await get_namespace_data(self.namespace)
+            self._changed_keys = await get_namespace_data(
+                f"{self.namespace}_changed_keys"
+            )
             if need_init:
                 loaded_data = load_json(self._file_name) or {}
+                migrated = False
+                if self._is_llm_cache:
+                    loaded_data, migrated = self._migrate_legacy_cache(loaded_data)
+                log_records = replay_json_log(loaded_data, self._log_file_name)
                 async with self._storage_lock:
                     self._data.update(loaded_data)
-
-                    # Calculate data count based on namespace
-                    if self.namespace.endswith("cache"):
-                        # For cache namespaces, sum the cache entries across all cache types
-                        data_count = sum(
-                            len(first_level_dict)
-                            for first_level_dict in loaded_data.values()
-                            if isinstance(first_level_dict, dict)
+                    if migrated or log_records:
+                        # Start from a snapshot holding the flat layout and the log
+                        compact_json_log(
+                            loaded_data, self._file_name, self._log_file_name
                         )
-                    else:
-                        # For non-cache namespaces, use the original count method
-                        data_count = len(loaded_data)
 
                     logger.info(
-                        f"Process {os.getpid()} KV load {self.namespace} with {data_count} records"
+                        f"Process {os.getpid()} KV load {self.namespace} with {len(loaded_data)} records"
                     )
 
+    def _migrate_legacy_cache(
+        self, loaded_data: dict[str, Any]
+    ) -> tuple[dict[str, Any], bool]:
+        """Convert legacy `{mode: {args_hash: entry}}` buckets to flat cache records
+
+        Returns:
+            The migrated data and whether any legacy bucket was found
+        """
+        legacy_modes = {
+            k for k, v in loaded_data.items() if is_legacy_cache_bucket(k, v)
+        }
+        if not legacy_modes:
+            return loaded_data, False
+
+        migrated_data = {k: v for k, v in loaded_data.items() if k not in legacy_modes}
+        for mode in legacy_modes:
+            migrated_data.update(flatten_mode_cache(mode, loaded_data[mode]))
+        logger.info(
+            f"Migrated legacy LLM cache modes {sorted(legacy_modes)} of {self.namespace} "
+            f"to {len(migrated_data)} flat records"
+        )
+        return migrated_data, True
+
     async def index_done_callback(self) -> None:
         async with self._storage_lock:
             if self.storage_updated.value:
-                data_dict = (
-                    dict(self._data) if hasattr(self._data, "_getvalue") else self._data
-                )
-
-                # Calculate data count based on namespace
-                if self.namespace.endswith("cache"):
-                    # # For cache namespaces, sum the cache entries across all cache types
-                    data_count = sum(
-                        len(first_level_dict)
-                        for first_level_dict in data_dict.values()
-                        if isinstance(first_level_dict, dict)
+                changed_keys = list(self._changed_keys.keys())
+                self._changed_keys.clear()
+                if changed_keys:
+                    logger.info(
+                        f"Process {os.getpid()} KV logging {len(changed_keys)} records to {self.namespace}"
                     )
-                else:
-                    # For non-cache namespaces, use the original count method
-                    data_count = len(data_dict)
-
-                logger.info(
-                    f"Process {os.getpid()} KV writting {data_count} records to {self.namespace}"
-                )
-                write_json(data_dict, self._file_name)
+                    append_json_log(
+                        json_log_records(self._data, changed_keys), self._log_file_name
+                    )
+                if json_log_needs_compaction(self._file_name, self._log_file_name):
+                    data_dict = (
+                        dict(self._data)
+                        if hasattr(self._data, "_getvalue")
+                        else self._data
+                    )
+                    logger.info(
+                        f"Process {os.getpid()} KV compacting {len(data_dict)} records to {self.namespace}"
+                    )
+                    compact_json_log(data_dict, self._file_name, self._log_file_name)
                 await clear_all_update_flags(self.namespace)
 
     async def get_all(self) -> dict[str, Any]:
@@ -109,6 +155,30 @@ class JsonKVStorage(BaseKVStorage):
                 for id in ids
             ]
 
+    async def get_by_mode_and_id(self, mode: str, id: str) -> Union[dict, None]:
+        """Specifically for llm_response_cache: get one cache entry in O(1)
+
+        Returns:
+            `{id: entry}` if the entry exists, None otherwise
+        """
+        async with self._storage_lock:
+            entry = self._data.get(generate_cache_key(mode, id))
+            return {id: entry} if entry is not None else None
+
+    async def get_by_mode(self, mode: str) -> dict[str, Any]:
+        """Specifically for llm_response_cache: get all cache entries of a mode
+
+        Returns:
+            Dictionary of `{args_hash: entry}`
+        """
+        prefix = generate_cache_key(mode, "")
+        async with self._storage_lock:
+            return {
+                k[len(prefix) :]: v
+                for k, v in self._data.items()
+                if k.startswith(prefix)
+            }
+
     async def filter_keys(self, keys: set[str]) -> set[str]:
         async with self._storage_lock:
             return set(keys) - set(self._data.keys())
@@ -121,9 +191,16 @@ class JsonKVStorage(BaseKVStorage):
         """
         if not data:
             return
+        if self._is_llm_cache:
+            # Cache data comes grouped by mode, store one flat record per entry
+            flat_data = {}
+            for mode, mode_cache in data.items():
+                flat_data.update(flatten_mode_cache(mode, mode_cache))
+            data = flat_data
         logger.debug(f"Inserting {len(data)} records to {self.namespace}")
         async with self._storage_lock:
             self._data.update(data)
+            self._changed_keys.update(dict.fromkeys(data, True))
             await set_all_update_flags(self.namespace)
 
     async def delete(self, ids: list[str]) -> None:
@@ -144,6 +221,7 @@ class JsonKVStorage(BaseKVStorage):
             for doc_id in ids:
                 result = self._data.pop(doc_id, None)
                 if result is not None:
+                    self._changed_keys[doc_id] = True
                     any_deleted = True
 
             if any_deleted:
@@ -167,7 +245,11 @@ class JsonKVStorage(BaseKVStorage):
             return False
 
         try:
-            await self.delete(modes)
+            prefixes = tuple(generate_cache_key(mode, "") for mode in modes)
+            async with self._storage_lock:
+                keys = [k for k in self._data.keys() if k.startswith(prefixes)]
+            await self.delete(keys)
+            await invalidate_embedding_cache_index(self)
             return True
         except Exception:
             return False
@@ -189,8 +271,11 @@ class JsonKVStorage(BaseKVStorage):
         try:
             async with self._storage_lock:
                 self._data.clear()
+                self._changed_keys.clear()
+                compact_json_log({}, self._file_name, self._log_file_name)
                 await set_all_update_flags(self.namespace)
 
+            await invalidate_embedding_cache_index(self)
             await self.index_done_callback()
             logger.info(f"Process {os.getpid()} drop {self.namespace}")
             return {"status": "success", "message": "data dropped"}
@@ -102,12 +102,16 @@ class MilvusVectorDBStorage(BaseVectorStorage):
         return results
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
     ) -> list[dict[str, Any]]:
-        embedding = await self.embedding_func([query])
+        embedding = await self._embed_query(query, query_embedding)
         results = self._client.search(
             collection_name=self.namespace,
-            data=embedding,
+            data=[embedding],
             limit=top_k,
             output_fields=list(self.meta_fields),
             search_params={
@@ -121,6 +125,35 @@ class MilvusVectorDBStorage(BaseVectorStorage):
             for dp in results[0]
         ]
 
+    async def query_batch(
+        self,
+        queries: list[str],
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embeddings: np.ndarray | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        embeddings = await self._embed_queries(queries, query_embeddings)
+        if not len(embeddings):
+            return []
+        # Milvus searches all vectors of data in one request, one hit list per vector
+        results = self._client.search(
+            collection_name=self.namespace,
+            data=list(embeddings),
+            limit=top_k,
+            output_fields=list(self.meta_fields),
+            search_params={
+                "metric_type": "COSINE",
+                "params": {"radius": self.cosine_better_than_threshold},
+            },
+        )
+        return [
+            [
+                {**dp["entity"], "id": dp["id"], "distance": dp["distance"]}
+                for dp in hits
+            ]
+            for hits in results
+        ]
+
     async def index_done_callback(self) -> None:
         # Milvus handles persistence automatically
         pass
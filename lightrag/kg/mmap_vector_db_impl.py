@@ -0,0 +1,557 @@
+import asyncio
+import glob
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, final
+
+import numpy as np
+
+from lightrag.base import BaseVectorStorage
+from lightrag.utils import (
+    append_json_log,
+    compact_json_log,
+    compute_mdhash_id,
+    json_log_needs_compaction,
+    load_json,
+    logger,
+    read_json_log,
+    write_json_atomic,
+)
+from .shared_storage import (
+    get_storage_lock,
+    get_update_flag,
+    set_all_update_flags,
+)
+
+# Rows scored per matrix multiply, bounds the float32 copy of float16 blocks
+_SCORE_BLOCK_ROWS = 65536
+
+
+@final
+@dataclass
+class MmapVectorDBStorage(BaseVectorStorage):
+    """
+    Local vector storage keeping the vectors in a memory-mapped file.
+
+    Files of a namespace in the working directory:
+    - vdb_<namespace>.<generation>.vec: normalized vectors, a raw row-major
+      float32 or float16 matrix. Rows are only appended; every process maps
+      it read-only, so gunicorn workers share the page cache instead of each
+      holding a copy.
+    - vdb_<namespace>.meta.json: snapshot of the id -> metadata (and row)
+      table with the generation, dimension and dtype of the vector file.
+    - vdb_<namespace>.<generation>.log.jsonl: upserts and deletes of the
+      metadata since the snapshot, appended at index_done_callback.
+
+    Deleting or re-inserting an id leaves a dead row behind. Once dead rows
+    exceed compact_ratio of the file, index_done_callback copies the live rows
+    to the next generation in a worker thread and commits it by writing the
+    snapshot. Other processes replay only the new log records when notified.
+
+    vector_db_storage_cls_kwargs:
+    - cosine_better_than_threshold (required)
+    - vector_dtype: "float32" (default, or MMAP_VECTOR_DTYPE) or "float16"
+    - compact_ratio: share of dead rows triggering compaction (default 0.3,
+      or MMAP_VECTOR_COMPACT_RATIO)
+    """
+
+    def __post_init__(self):
+        kwargs = self.global_config.get("vector_db_storage_cls_kwargs", {})
+        cosine_threshold = kwargs.get("cosine_better_than_threshold")
+        if cosine_threshold is None:
+            raise ValueError(
+                "cosine_better_than_threshold must be specified in vector_db_storage_cls_kwargs"
+            )
+        self.cosine_better_than_threshold = cosine_threshold
+        self._dtype = np.dtype(
+            kwargs.get("vector_dtype", os.getenv("MMAP_VECTOR_DTYPE", "float32"))
+        )
+        if self._dtype not in (np.float32, np.float16):
+            raise ValueError("vector_dtype must be float32 or float16")
+        self._compact_ratio = float(
+            kwargs.get("compact_ratio", os.getenv("MMAP_VECTOR_COMPACT_RATIO", 0.3))
+        )
+
+        self._file_prefix = os.path.join(
+            self.global_config["working_dir"], f"vdb_{self.namespace}"
+        )
+        self._meta_file = f"{self._file_prefix}.meta.json"
+        self._max_batch_size = self.global_config["embedding_batch_num"]
+        self._dim = self.embedding_func.embedding_dim
+
+        self._storage_lock = None
+        self.storage_updated = None
+        self._load()
+
+    async def initialize(self):
+        """Initialize storage data"""
+        # Get the update flag for cross-process update notification
+        self.storage_updated = await get_update_flag(self.namespace)
+        # Get the storage lock for use in other methods
+        self._storage_lock = get_storage_lock()
+
+    def _vector_file(self, generation: int) -> str:
+        return f"{self._file_prefix}.{generation}.vec"
+
+    def _log_file(self, generation: int) -> str:
+        return f"{self._file_prefix}.{generation}.log.jsonl"
+
+    def _load(self) -> None:
+        """(Re)load the metadata and map the vector file of the snapshot"""
+        snapshot = load_json(self._meta_file) or {
+            "generation": 0,
+            "dim": self._dim,
+            "dtype": self._dtype.name,
+            "records": {},
+        }
+        if snapshot["dim"] != self._dim:
+            raise ValueError(
+                f"{self.namespace} stores {snapshot['dim']}-dimensional vectors, "
+                f"the embedding function returns {self._dim}"
+            )
+        if snapshot["dtype"] != self._dtype.name:
+            logger.warning(
+                f"{self.namespace} stores {snapshot['dtype']} vectors, ignoring vector_dtype {self._dtype.name}"
+            )
+            self._dtype = np.dtype(snapshot["dtype"])
+
+        self._generation = snapshot["generation"]
+        self._snapshot_mtime = (
+            os.stat(self._meta_file).st_mtime_ns
+            if os.path.exists(self._meta_file)
+            else None
+        )
+        self._records: dict[str, dict[str, Any]] = snapshot["records"]
+        self._pending_records: list[dict[str, Any]] = []
+        self._map_vectors()
+
+        self._row_ids: list[str | None] = [None] * len(self._matrix)
+        for id, record in self._records.items():
+            self._row_ids[record["__row__"]] = id
+        self._log_offset = 0
+        self._apply_log()
+        logger.info(
+            f"Process {os.getpid()} mmap vdb load {self.namespace} with {len(self._records)} vectors"
+        )
+
+    def _map_vectors(self) -> None:
+        vector_file = self._vector_file(self._generation)
+        row_bytes = self._dim * self._dtype.itemsize
+        rows = (
+            os.path.getsize(vector_file) // row_bytes
+            if os.path.exists(vector_file)
+            else 0
+        )
+        if rows:
+            self._matrix = np.memmap(
+                vector_file, dtype=self._dtype, mode="r", shape=(rows, self._dim)
+            )
+        else:
+            self._matrix = np.empty((0, self._dim), dtype=self._dtype)
+
+    def _apply_log(self) -> None:
+        """Apply the log records written since the last read and index the rows"""
+        records, self._log_offset = read_json_log(
+            self._log_file(self._generation), self._log_offset
+        )
+        self._row_ids.extend([None] * (len(self._matrix) - len(self._row_ids)))
+        for record in records:
+            old_record = self._records.pop(record["k"], None)
+            if old_record is not None:
+                self._row_ids[old_record["__row__"]] = None
+            if "v" in record:
+                self._records[record["k"]] = record["v"]
+                self._row_ids[record["v"]["__row__"]] = record["k"]
+        self._alive = np.array([id is not None for id in self._row_ids], dtype=bool)
+
+    def _refresh(self) -> None:
+        """Catch up with the changes saved by another process"""
+        mtime = (
+            os.stat(self._meta_file).st_mtime_ns
+            if os.path.exists(self._meta_file)
+            else None
+        )
+        if mtime != self._snapshot_mtime:
+            # New snapshot (compaction or drop): reload everything
+            self._load()
+            return
+        self._map_vectors()
+        self._apply_log()
+
+    async def _get_store(self) -> None:
+        """Check if the storage should be reloaded"""
+        async with self._storage_lock:
+            if self.storage_updated.value:
+                logger.info(
+                    f"Process {os.getpid()} refreshing {self.namespace} due to update by another process"
+                )
+                self._refresh()
+                self.storage_updated.value = False
+
+    def _set_record(self, id: str, record: dict[str, Any] | None) -> None:
+        old_record = self._records.pop(id, None)
+        if old_record is not None:
+            self._row_ids[old_record["__row__"]] = None
+            self._alive[old_record["__row__"]] = False
+        if record is None:
+            self._pending_records.append({"k": id, "d": True})
+        else:
+            self._records[id] = record
+            self._row_ids[record["__row__"]] = id
+            self._alive[record["__row__"]] = True
+            self._pending_records.append({"k": id, "v": record})
+
+    async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
+        """
+        Importance notes:
+        1. Vectors are appended to the vector file right away, the metadata is
+           persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+        logger.debug(f"Inserting {len(data)} to {self.namespace}")
+        if not data:
+            return
+
+        contents = [v["content"] for v in data.values()]
+        batches = [
+            contents[i : i + self._max_batch_size]
+            for i in range(0, len(contents), self._max_batch_size)
+        ]
+        # Execute embedding outside of lock to avoid long lock times
+        embeddings_list = await asyncio.gather(
+            *[self.embedding_func(batch) for batch in batches]
+        )
+        embeddings = np.concatenate(embeddings_list).astype(np.float32)
+        if len(embeddings) != len(data):
+            # sometimes the embedding is not returned correctly. just log it.
+            logger.error(
+                f"embedding is not 1-1 with data, {len(embeddings)} != {len(data)}"
+            )
+            return
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+
+        await self._get_store()
+        vector_file = self._vector_file(self._generation)
+        with open(vector_file, "ab") as f:
+            first_row = f.tell() // (self._dim * self._dtype.itemsize)
+            f.write(embeddings.astype(self._dtype).tobytes())
+        self._map_vectors()
+        self._row_ids.extend([None] * (len(self._matrix) - len(self._row_ids)))
+        self._alive = np.concatenate(
+            [self._alive, np.zeros(len(self._matrix) - len(self._alive), dtype=bool)]
+        )
+
+        current_time = time.time()
+        for row, (id, v) in enumerate(data.items(), first_row):
+            self._set_record(
+                id,
+                {
+                    "__row__": row,
+                    "__created_at__": current_time,
+                    **{k1: v1 for k1, v1 in v.items() if k1 in self.meta_fields},
+                },
+            )
+
+    def _score(self, embeddings: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query with every row, -inf for dead rows"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+        scores = np.empty((len(embeddings), len(self._matrix)), dtype=np.float32)
+        for start in range(0, len(self._matrix), _SCORE_BLOCK_ROWS):
+            block = self._matrix[start : start + _SCORE_BLOCK_ROWS]
+            scores[:, start : start + len(block)] = (
+                embeddings @ np.asarray(block, dtype=np.float32).T
+            )
+        scores[:, ~self._alive] = -np.inf
+        return scores
+
+    def _top_k(self, row_scores: np.ndarray, top_k: int) -> list[dict[str, Any]]:
+        k = min(top_k, len(self._records))
+        if k <= 0:
+            return []
+        top_rows = np.argpartition(-row_scores, k - 1)[:k]
+        top_rows = top_rows[np.argsort(-row_scores[top_rows])]
+        results = []
+        for row in top_rows:
+            score = float(row_scores[row])
+            if score < self.cosine_better_than_threshold:
+                break
+            id = self._row_ids[row]
+            results.append(
+                {
+                    **self._record_data(id),
+                    "__metrics__": score,
+                    "id": id,
+                    "distance": score,
+                    "created_at": self._records[id].get("__created_at__"),
+                }
+            )
+        return results
+
+    def _record_data(self, id: str) -> dict[str, Any]:
+        data = {k: v for k, v in self._records[id].items() if k != "__row__"}
+        data["__id__"] = id
+        return data
+
+    async def query(
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
+    ) -> list[dict[str, Any]]:
+        # Execute embedding outside of lock to avoid long lock times
+        embedding = await self._embed_query(query, query_embedding)
+        await self._get_store()
+        if not self._records:
+            return []
+        return self._top_k(self._score(embedding[None, :])[0], top_k)
+
+    async def query_batch(
+        self,
+        queries: list[str],
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embeddings: np.ndarray | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        """Score all queries against the vector file in one pass"""
+        embeddings = await self._embed_queries(queries, query_embeddings)
+        await self._get_store()
+        if not self._records or not len(embeddings):
+            return [[] for _ in range(len(embeddings))]
+        return [
+            self._top_k(row_scores, top_k) for row_scores in self._score(embeddings)
+        ]
+
+    @property
+    async def client_storage(self):
+        """All records in the shape of NanoVectorDB's storage, vectors excluded"""
+        await self._get_store()
+        return {"data": [self._record_data(id) for id in self._records]}
+
+    async def delete(self, ids: list[str]):
+        """Delete vectors with specified IDs
+
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+
+        Args:
+            ids: List of vector IDs to be deleted
+        """
+        await self._get_store()
+        deleted = 0
+        for id in ids:
+            if id in self._records:
+                self._set_record(id, None)
+                deleted += 1
+        logger.debug(f"Successfully deleted {deleted} vectors from {self.namespace}")
+
+    async def delete_entity(self, entity_name: str) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+        entity_id = compute_mdhash_id(entity_name, prefix="ent-")
+        logger.debug(f"Attempting to delete entity {entity_name} with ID {entity_id}")
+        await self.delete([entity_id])
+
+    async def delete_entity_relation(self, entity_name: str) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+        await self._get_store()
+        ids_to_delete = [
+            id
+            for id, record in self._records.items()
+            if record.get("src_id") == entity_name
+            or record.get("tgt_id") == entity_name
+        ]
+        logger.debug(f"Found {len(ids_to_delete)} relations for entity {entity_name}")
+        await self.delete(ids_to_delete)
+
+    def _compact(self) -> None:
+        """Copy the live rows to the next generation and commit it with a snapshot"""
+        generation = self._generation + 1
+        vector_file = self._vector_file(generation)
+        tmp_file = f"{vector_file}.tmp"
+        records = {}
+        with open(tmp_file, "wb") as f:
+            ids = list(self._records)
+            for start in range(0, len(ids), _SCORE_BLOCK_ROWS):
+                block_ids = ids[start : start + _SCORE_BLOCK_ROWS]
+                rows = [self._records[id]["__row__"] for id in block_ids]
+                f.write(np.ascontiguousarray(self._matrix[rows]).tobytes())
+                for row, id in enumerate(block_ids, start):
+                    records[id] = {**self._records[id], "__row__": row}
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, vector_file)
+        # The snapshot is the commit point, files of older generations are ignored
+        write_json_atomic(
+            {
+                "generation": generation,
+                "dim": self._dim,
+                "dtype": self._dtype.name,
+                "records": records,
+            },
+            self._meta_file,
+        )
+        for file in (
+            self._vector_file(self._generation),
+            self._log_file(self._generation),
+        ):
+            try:
+                os.remove(file)
+            except OSError:
+                # Still mapped by a process on platforms that forbid it
+                pass
+
+    def _dead_rows(self) -> int:
+        return len(self._matrix) - len(self._records)
+
+    async def index_done_callback(self) -> bool:
+        """Save data to disk"""
+        async with self._storage_lock:
+            # Check if storage was updated by another process
+            if self.storage_updated.value:
+                # Storage was updated by another process, reload data instead of saving
+                logger.warning(
+                    f"Storage for {self.namespace} was updated by another process, reloading..."
+                )
+                self._refresh()
+                self.storage_updated.value = False
+                return False  # Return error
+
+            if not self._pending_records:
+                return True
+
+            try:
+                vector_file = self._vector_file(self._generation)
+                if os.path.exists(vector_file):
+                    # Vectors must be durable before the records pointing at them
+                    with open(vector_file, "ab") as f:
+                        os.fsync(f.fileno())
+                log_file = self._log_file(self._generation)
+                append_json_log(self._pending_records, log_file)
+                self._pending_records = []
+                self._log_offset = os.path.getsize(log_file)
+
+                if self._dead_rows() > self._compact_ratio * len(self._matrix):
+                    logger.info(
+                        f"Process {os.getpid()} compacting {self.namespace}: "
+                        f"{self._dead_rows()} of {len(self._matrix)} rows are dead"
+                    )
+                    await asyncio.to_thread(self._compact)
+                    self._load()
+                elif json_log_needs_compaction(self._meta_file, log_file):
+                    compact_json_log(
+                        {
+                            "generation": self._generation,
+                            "dim": self._dim,
+                            "dtype": self._dtype.name,
+                            "records": self._records,
+                        },
+                        self._meta_file,
+                        log_file,
+                    )
+                    self._snapshot_mtime = os.stat(self._meta_file).st_mtime_ns
+                    self._log_offset = 0
+
+                # Notify other processes that data has been updated
+                await set_all_update_flags(self.namespace)
+                # Reset own update flag to avoid self-reloading
+                self.storage_updated.value = False
+                return True  # Return success
+            except Exception as e:
+                logger.error(f"Error saving data for {self.namespace}: {e}")
+                return False  # Return error
+
+    async def search_by_prefix(self, prefix: str) -> list[dict[str, Any]]:
+        """Search for records with IDs starting with a specific prefix.
+
+        Args:
+            prefix: The prefix to search for in record IDs
+
+        Returns:
+            List of records with matching ID prefixes
+        """
+        await self._get_store()
+        matching_records = [
+            {**self._record_data(id), "id": id}
+            for id in self._records
+            if id.startswith(prefix)
+        ]
+        logger.debug(f"Found {len(matching_records)} records with prefix '{prefix}'")
+        return matching_records
+
+    async def get_by_id(self, id: str) -> dict[str, Any] | None:
+        """Get vector data by its ID
+
+        Args:
+            id: The unique identifier of the vector
+
+        Returns:
+            The vector data if found, or None if not found
+        """
+        await self._get_store()
+        if id not in self._records:
+            return None
+        return self._record_data(id)
+
+    async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
+        """Get multiple vector data by their IDs
+
+        Args:
+            ids: List of unique identifiers
+
+        Returns:
+            List of vector data objects that were found
+        """
+        await self._get_store()
+        return [self._record_data(id) for id in ids if id in self._records]
+
+    async def drop(self) -> dict[str, str]:
+        """Drop all vector data from storage and clean up resources
+
+        This method will:
+        1. Remove the snapshot, vector and log files
+        2. Reset the in-memory state to an empty storage
+        3. Update flags to notify other processes
+        4. Changes is persisted to disk immediately
+
+        Returns:
+            dict[str, str]: Operation status and message
+            - On success: {"status": "success", "message": "data dropped"}
+            - On failure: {"status": "error", "message": "<error details>"}
+        """
+        try:
+            async with self._storage_lock:
+                # Release the mapping before removing the files under it
+                self._matrix = np.empty((0, self._dim), dtype=self._dtype)
+                for file in glob.glob(f"{glob.escape(self._file_prefix)}.*"):
+                    os.remove(file)
+                self._load()
+
+                # Notify other processes that data has been updated
+                await set_all_update_flags(self.namespace)
+                # Reset own update flag to avoid self-reloading
+                self.storage_updated.value = False
+
+                logger.info(
+                    f"Process {os.getpid()} drop {self.namespace}(files:{self._file_prefix}.*)"
+                )
+            return {"status": "success", "message": "data dropped"}
+        except Exception as e:
+            logger.error(f"Error dropping {self.namespace}: {e}")
+            return {"status": "error", "message": str(e)}
@@ -3,6 +3,7 @@ from dataclasses import dataclass, field
 import numpy as np
 import configparser
 import asyncio
+import re
 
 from typing import Any, List, Union, final
 
@@ -15,7 +16,7 @@ from ..base import (
     DocStatusStorage,
 )
 from ..namespace import NameSpace, is_namespace
-from ..utils import logger, compute_mdhash_id
+from ..utils import logger, compute_mdhash_id, invalidate_embedding_cache_index
 from ..types import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge
 import pipmaster as pm
 
@@ -30,7 +31,7 @@ from motor.motor_asyncio import (  # type: ignore
     AsyncIOMotorDatabase,
     AsyncIOMotorCollection,
 )
-from pymongo.operations import SearchIndexModel  # type: ignore
+from pymongo.operations import SearchIndexModel, UpdateOne  # type: ignore
 from pymongo.errors import PyMongoError  # type: ignore
 
 config = configparser.ConfigParser()
@@ -120,7 +121,7 @@ class MongoKVStorage(BaseKVStorage):
                     data[mode][k]["_id"] = f"{mode}_{k}"
                     update_tasks.append(
                         self._data.update_one(
-                            {"_id": key}, {"$setOnInsert": v}, upsert=True
+                            {"_id": key}, {"$set": {**v, "mode": mode}}, upsert=True
                         )
                     )
             await asyncio.gather(*update_tasks)
@@ -146,6 +147,14 @@ class MongoKVStorage(BaseKVStorage):
         else:
             return None
 
+    async def get_by_mode(self, mode: str) -> dict[str, Any]:
+        """Specifically for llm_response_cache: get all cache entries of a mode"""
+        if not is_namespace(self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE):
+            return {}
+        prefix = f"{mode}_"
+        cursor = self._data.find({"_id": {"$regex": f"^{re.escape(prefix)}"}})
+        return {doc["_id"][len(prefix) :]: doc async for doc in cursor}
+
     async def index_done_callback(self) -> None:
         # Mongo handles persistence automatically
         pass
@@ -184,6 +193,7 @@ class MongoKVStorage(BaseKVStorage):
             pattern = f"^({'|'.join(modes)})_"
             result = await self._data.delete_many({"_id": {"$regex": pattern}})
             logger.info(f"Deleted {result.deleted_count} documents by modes: {modes}")
+            await invalidate_embedding_cache_index(self)
             return True
         except Exception as e:
             logger.error(f"Error deleting cache by modes {modes}: {e}")
@@ -198,6 +208,7 @@ class MongoKVStorage(BaseKVStorage):
         try:
             result = await self._data.delete_many({})
             deleted_count = result.deleted_count
+            await invalidate_embedding_cache_index(self)
 
             logger.info(
                 f"Dropped {deleted_count} documents from doc status {self._collection_name}"
@@ -609,6 +620,78 @@ class MongoGraphStorage(BaseGraphStorage):
         edges = result[0].get("edges", [])
         return [(source_node_id, e["target"]) for e in edges]
 
+    #
+    # -------------------------------------------------------------------------
+    # BATCH GETTERS
+    # -------------------------------------------------------------------------
+    #
+
+    async def get_nodes_batch(self, node_ids: list[str]) -> dict[str, dict]:
+        """
+        Return the full node documents of node_ids with a single $in query.
+        """
+        cursor = self.collection.find({"_id": {"$in": node_ids}})
+        return {doc["_id"]: doc async for doc in cursor}
+
+    async def node_degrees_batch(self, node_ids: list[str]) -> dict[str, int]:
+        """
+        Count outbound edges from the node documents and inbound edges with one
+        aggregation, instead of two queries per node.
+        """
+        degrees = dict.fromkeys(node_ids, 0)
+
+        # --- 1) Outbound edges (direct from docs) ---
+        cursor = self.collection.find({"_id": {"$in": node_ids}}, {"edges": 1})
+        async for doc in cursor:
+            degrees[doc["_id"]] += len(doc.get("edges", []))
+
+        # --- 2) Inbound edges, grouped by target ---
+        inbound_count_pipeline = [
+            {"$match": {"edges.target": {"$in": node_ids}}},
+            {"$unwind": "$edges"},
+            {"$match": {"edges.target": {"$in": node_ids}}},
+            {"$group": {"_id": "$edges.target", "totalInbound": {"$sum": 1}}},
+        ]
+        cursor = self.collection.aggregate(inbound_count_pipeline)
+        async for doc in cursor:
+            degrees[doc["_id"]] += doc["totalInbound"]
+
+        return degrees
+
+    async def get_edges_batch(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        """
+        Fetch the edges arrays of all source nodes with a single $in query and
+        pick the requested targets from them.
+        """
+        source_ids = list({src for src, _ in edge_pairs})
+        cursor = self.collection.find({"_id": {"$in": source_ids}}, {"edges": 1})
+        edges_by_source = {doc["_id"]: doc.get("edges", []) async for doc in cursor}
+
+        edges = {}
+        for src, tgt in edge_pairs:
+            for e in edges_by_source.get(src, []):
+                if e.get("target") == tgt:
+                    edges[(src, tgt)] = e
+                    break
+        return edges
+
+    async def get_nodes_edges_batch(
+        self, node_ids: list[str]
+    ) -> dict[str, list[tuple[str, str]]]:
+        """
+        Return (source_id, target_id) lists for the direct edges of node_ids
+        with a single $in query.
+        """
+        edges = {node_id: [] for node_id in node_ids}
+        cursor = self.collection.find({"_id": {"$in": node_ids}}, {"edges": 1})
+        async for doc in cursor:
+            edges[doc["_id"]] = [
+                (doc["_id"], e["target"]) for e in doc.get("edges", [])
+            ]
+        return edges
+
     #
     # -------------------------------------------------------------------------
     # UPSERTS
@@ -646,6 +729,52 @@ class MongoGraphStorage(BaseGraphStorage):
             {"_id": source_node_id}, {"$push": {"edges": new_edge}}
         )
 
+    async def upsert_nodes_batch(self, nodes: dict[str, dict[str, str]]) -> None:
+        """
+        Insert or update multiple node documents with one bulk write.
+        """
+        if not nodes:
+            return
+        await self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": node_id},
+                    {"$set": {**node_data}, "$setOnInsert": {"edges": []}},
+                    upsert=True,
+                )
+                for node_id, node_data in nodes.items()
+            ]
+        )
+
+    async def upsert_edges_batch(
+        self, edges: dict[tuple[str, str], dict[str, str]]
+    ) -> None:
+        """
+        Upsert multiple edges with one ordered bulk write, applying the same
+        ensure-source / pull / push steps as upsert_edge for every edge.
+        """
+        if not edges:
+            return
+        operations = []
+        for (source_node_id, target_node_id), edge_data in edges.items():
+            new_edge = {"target": target_node_id}
+            new_edge.update(edge_data)
+            operations.extend(
+                [
+                    UpdateOne(
+                        {"_id": source_node_id},
+                        {"$setOnInsert": {"edges": []}},
+                        upsert=True,
+                    ),
+                    UpdateOne(
+                        {"_id": source_node_id},
+                        {"$pull": {"edges": {"target": target_node_id}}},
+                    ),
+                    UpdateOne({"_id": source_node_id}, {"$push": {"edges": new_edge}}),
+                ]
+            )
+        await self.collection.bulk_write(operations, ordered=True)
+
     #
     # -------------------------------------------------------------------------
     # DELETION
@@ -1028,14 +1157,18 @@ class MongoVectorDBStorage(BaseVectorStorage):
         return list_data
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
     ) -> list[dict[str, Any]]:
         """Queries the vector database using Atlas Vector Search."""
         # Generate the embedding
-        embedding = await self.embedding_func([query])
+        embedding = await self._embed_query(query, query_embedding)
 
         # Convert numpy array to a list to ensure compatibility with MongoDB
-        query_vector = embedding[0].tolist()
+        query_vector = embedding.tolist()
 
         # Define the aggregation pipeline with the converted query vector
         pipeline = [
@@ -122,11 +122,14 @@ class NanoVectorDBStorage(BaseVectorStorage):
             )
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
     ) -> list[dict[str, Any]]:
         # Execute embedding outside of lock to avoid long lock times
-        embedding = await self.embedding_func([query])
-        embedding = embedding[0]
+        embedding = await self._embed_query(query, query_embedding)
 
         client = await self._get_client()
         results = client.query(
@@ -145,6 +148,46 @@ class NanoVectorDBStorage(BaseVectorStorage):
         ]
         return results
 
+    async def query_batch(
+        self,
+        queries: list[str],
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embeddings: np.ndarray | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        """Score all queries against the whole matrix with a single matrix multiply"""
+        embeddings = await self._embed_queries(queries, query_embeddings)
+        storage = await self.client_storage
+        datas, matrix = storage["data"], storage["matrix"]
+        if not len(datas) or not len(embeddings):
+            return [[] for _ in range(len(embeddings))]
+
+        # Stored vectors are normalized by nano-vectordb, normalize the queries alike
+        embeddings = np.asarray(embeddings, dtype=matrix.dtype)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+        scores = embeddings @ matrix.T
+
+        k = min(top_k, len(datas))
+        top_indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        batch_results = []
+        for row_scores, row_indices in zip(scores, top_indices):
+            row_indices = row_indices[np.argsort(-row_scores[row_indices])]
+            batch_results.append(
+                [
+                    {
+                        **datas[i],
+                        "__metrics__": row_scores[i],
+                        "id": datas[i]["__id__"],
+                        "distance": row_scores[i],
+                        "created_at": datas[i].get("__created_at__"),
+                    }
+                    for i in row_indices
+                    if row_scores[i] >= self.cosine_better_than_threshold
+                ]
+            )
+        return batch_results
+
     @property
     async def client_storage(self):
         client = await self._get_client()
@@ -517,6 +517,256 @@ class Neo4JStorage(BaseGraphStorage):
             logger.error(f"Error in get_node_edges for {source_node_id}: {str(e)}")
             raise
 
+    async def get_nodes_batch(self, node_ids: list[str]) -> dict[str, dict]:
+        """Retrieve multiple nodes in one query using UNWIND.
+
+        Args:
+            node_ids: List of node entity IDs to fetch
+
+        Returns:
+            A dictionary mapping each found entity_id to its node properties
+        """
+        async with self._driver.session(
+            database=self._DATABASE, default_access_mode="READ"
+        ) as session:
+            query = """
+                UNWIND $node_ids AS id
+                MATCH (n:base {entity_id: id})
+                RETURN n.entity_id AS entity_id, n
+            """
+            result = await session.run(query, node_ids=node_ids)
+            nodes = {}
+            try:
+                async for record in result:
+                    entity_id = record["entity_id"]
+                    if entity_id in nodes:
+                        logger.warning(
+                            f"Multiple nodes found with label '{entity_id}'. Using first node."
+                        )
+                        continue
+                    node_dict = dict(record["n"])
+                    # Remove base label from labels list if it exists
+                    if "labels" in node_dict:
+                        node_dict["labels"] = [
+                            label for label in node_dict["labels"] if label != "base"
+                        ]
+                    nodes[entity_id] = node_dict
+            finally:
+                await result.consume()  # Ensure result is fully consumed
+            return nodes
+
+    async def node_degrees_batch(self, node_ids: list[str]) -> dict[str, int]:
+        """Retrieve the degrees of multiple nodes in one query using UNWIND.
+
+        Args:
+            node_ids: List of node entity IDs
+
+        Returns:
+            A dictionary mapping each entity_id to its degree, 0 if the node is not found
+        """
+        async with self._driver.session(
+            database=self._DATABASE, default_access_mode="READ"
+        ) as session:
+            query = """
+                UNWIND $node_ids AS id
+                MATCH (n:base {entity_id: id})
+                OPTIONAL MATCH (n)-[r]-()
+                RETURN n.entity_id AS entity_id, count(r) AS degree
+            """
+            result = await session.run(query, node_ids=node_ids)
+            degrees = {}
+            try:
+                async for record in result:
+                    degrees.setdefault(record["entity_id"], record["degree"])
+            finally:
+                await result.consume()  # Ensure result is fully consumed
+
+            for node_id in node_ids:
+                if node_id not in degrees:
+                    logger.warning(f"No node found with label '{node_id}'")
+                    degrees[node_id] = 0
+            return degrees
+
+    async def get_edges_batch(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        """Retrieve the properties of multiple edges in one query using UNWIND.
+
+        Args:
+            edge_pairs: List of (source_entity_id, target_entity_id) tuples
+
+        Returns:
+            A dictionary mapping each found (source, target) pair to its edge properties
+        """
+        async with self._driver.session(
+            database=self._DATABASE, default_access_mode="READ"
+        ) as session:
+            query = """
+                UNWIND $pairs AS pair
+                MATCH (start:base {entity_id: pair.src})-[r]-(end:base {entity_id: pair.tgt})
+                RETURN pair.src AS src_id, pair.tgt AS tgt_id, properties(r) AS edge_properties
+            """
+            result = await session.run(
+                query, pairs=[{"src": src, "tgt": tgt} for src, tgt in edge_pairs]
+            )
+            edges = {}
+            try:
+                async for record in result:
+                    pair = (record["src_id"], record["tgt_id"])
+                    if pair in edges:
+                        logger.warning(
+                            f"Multiple edges found between '{pair[0]}' and '{pair[1]}'. Using first edge."
+                        )
+                        continue
+                    edge_result = dict(record["edge_properties"])
+                    # Ensure required keys exist with defaults
+                    for key, default_value in {
+                        "weight": 0.0,
+                        "source_id": None,
+                        "description": None,
+                        "keywords": None,
+                    }.items():
+                        if key not in edge_result:
+                            edge_result[key] = default_value
+                            logger.warning(
+                                f"Edge between {pair[0]} and {pair[1]} "
+                                f"missing {key}, using default: {default_value}"
+                            )
+                    edges[pair] = edge_result
+            finally:
+                await result.consume()  # Ensure result is fully consumed
+            return edges
+
+    async def get_nodes_edges_batch(
+        self, node_ids: list[str]
+    ) -> dict[str, list[tuple[str, str]]]:
+        """Retrieve the edges of multiple nodes in one query using UNWIND.
+
+        Args:
+            node_ids: List of node entity IDs
+
+        Returns:
+            A dictionary mapping each entity_id to a list of (entity_id, neighbor_id) tuples
+        """
+        async with self._driver.session(
+            database=self._DATABASE, default_access_mode="READ"
+        ) as session:
+            query = """
+                UNWIND $node_ids AS id
+                MATCH (n:base {entity_id: id})-[r]-(connected:base)
+                WHERE connected.entity_id IS NOT NULL
+                RETURN id AS entity_id, connected.entity_id AS connected_id
+            """
+            result = await session.run(query, node_ids=node_ids)
+            edges = {node_id: [] for node_id in node_ids}
+            try:
+                async for record in result:
+                    edges[record["entity_id"]].append(
+                        (record["entity_id"], record["connected_id"])
+                    )
+            finally:
+                await result.consume()  # Ensure result is fully consumed
+            return edges
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(
+            (
+                neo4jExceptions.ServiceUnavailable,
+                neo4jExceptions.TransientError,
+                neo4jExceptions.WriteServiceUnavailable,
+                neo4jExceptions.ClientError,
+            )
+        ),
+    )
+    async def upsert_nodes_batch(self, nodes: dict[str, dict[str, str]]) -> None:
+        """
+        Upsert multiple nodes in one write transaction, with one UNWIND query
+        per entity type since labels can't be parameterized.
+
+        Args:
+            nodes: Dictionary mapping node entity IDs to node properties
+        """
+        nodes_by_type: dict[str, list[dict]] = {}
+        for node_id, properties in nodes.items():
+            if "entity_id" not in properties:
+                raise ValueError(
+                    "Neo4j: node properties must contain an 'entity_id' field"
+                )
+            nodes_by_type.setdefault(properties["entity_type"], []).append(
+                {"entity_id": node_id, "properties": properties}
+            )
+
+        try:
+            async with self._driver.session(database=self._DATABASE) as session:
+
+                async def execute_upsert(tx: AsyncManagedTransaction):
+                    for entity_type, rows in nodes_by_type.items():
+                        query = (
+                            """
+                        UNWIND $rows AS row
+                        MERGE (n:base {entity_id: row.entity_id})
+                        SET n += row.properties
+                        SET n:`%s`
+                        """
+                            % entity_type
+                        )
+                        result = await tx.run(query, rows=rows)
+                        await result.consume()  # Ensure result is fully consumed
+                    logger.debug(f"Upserted {len(nodes)} nodes")
+
+                await session.execute_write(execute_upsert)
+        except Exception as e:
+            logger.error(f"Error during batch node upsert: {str(e)}")
+            raise
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(
+            (
+                neo4jExceptions.ServiceUnavailable,
+                neo4jExceptions.TransientError,
+                neo4jExceptions.WriteServiceUnavailable,
+                neo4jExceptions.ClientError,
+            )
+        ),
+    )
+    async def upsert_edges_batch(
+        self, edges: dict[tuple[str, str], dict[str, str]]
+    ) -> None:
+        """
+        Upsert multiple edges in one UNWIND query. Edges whose nodes don't exist are skipped.
+
+        Args:
+            edges: Dictionary mapping (source_entity_id, target_entity_id) tuples to edge properties
+        """
+        rows = [
+            {"src": src, "tgt": tgt, "properties": edge_data}
+            for (src, tgt), edge_data in edges.items()
+        ]
+        try:
+            async with self._driver.session(database=self._DATABASE) as session:
+
+                async def execute_upsert(tx: AsyncManagedTransaction):
+                    query = """
+                    UNWIND $rows AS row
+                    MATCH (source:base {entity_id: row.src})
+                    WITH source, row
+                    MATCH (target:base {entity_id: row.tgt})
+                    MERGE (source)-[r:DIRECTED]-(target)
+                    SET r += row.properties
+                    """
+                    result = await tx.run(query, rows=rows)
+                    await result.consume()  # Ensure result is fully consumed
+                    logger.debug(f"Upserted {len(rows)} edges")
+
+                await session.execute_write(execute_upsert)
+        except Exception as e:
+            logger.error(f"Error during batch edge upsert: {str(e)}")
+            raise
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -47,6 +47,8 @@ class NetworkXStorage(BaseGraphStorage):
         self._storage_lock = None
         self.storage_updated = None
         self._graph = None
+        # Degree of every node, kept in step with the graph by the write methods
+        self._degrees: dict[str, int] = {}
 
         # Load initial graph
         preloaded_graph = NetworkXStorage.load_nx_graph(self._graphml_xml_file)
@@ -56,7 +58,12 @@ class NetworkXStorage(BaseGraphStorage):
             )
         else:
             logger.info("Created new empty graph")
-        self._graph = preloaded_graph or nx.Graph()
+        self._set_graph(preloaded_graph or nx.Graph())
+
+    def _set_graph(self, graph: nx.Graph) -> None:
+        """Replace the graph and rebuild its degree index"""
+        self._graph = graph
+        self._degrees = dict(graph.degree())
 
     async def initialize(self):
         """Initialize storage data"""
@@ -75,7 +82,7 @@ class NetworkXStorage(BaseGraphStorage):
                     f"Process {os.getpid()} reloading graph {self.namespace} due to update by another process"
                 )
                 # Reload data
-                self._graph = (
+                self._set_graph(
                     NetworkXStorage.load_nx_graph(self._graphml_xml_file) or nx.Graph()
                 )
                 # Reset update flag
@@ -96,12 +103,12 @@ class NetworkXStorage(BaseGraphStorage):
         return graph.nodes.get(node_id)
 
     async def node_degree(self, node_id: str) -> int:
-        graph = await self._get_graph()
-        return graph.degree(node_id)
+        await self._get_graph()
+        return self._degrees.get(node_id, 0)
 
     async def edge_degree(self, src_id: str, tgt_id: str) -> int:
-        graph = await self._get_graph()
-        return graph.degree(src_id) + graph.degree(tgt_id)
+        await self._get_graph()
+        return self._degrees.get(src_id, 0) + self._degrees.get(tgt_id, 0)
 
     async def get_edge(
         self, source_node_id: str, target_node_id: str
@@ -115,6 +122,73 @@ class NetworkXStorage(BaseGraphStorage):
             return list(graph.edges(source_node_id))
         return None
 
+    async def get_nodes_batch(self, node_ids: list[str]) -> dict[str, dict]:
+        graph = await self._get_graph()
+        return {
+            node_id: graph.nodes[node_id]
+            for node_id in node_ids
+            if graph.has_node(node_id)
+        }
+
+    async def node_degrees_batch(self, node_ids: list[str]) -> dict[str, int]:
+        await self._get_graph()
+        degrees = self._degrees
+        return {node_id: degrees.get(node_id, 0) for node_id in node_ids}
+
+    async def get_edges_batch(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        graph = await self._get_graph()
+        return {
+            (src, tgt): graph.edges[src, tgt]
+            for src, tgt in edge_pairs
+            if graph.has_edge(src, tgt)
+        }
+
+    async def edge_degrees_batch(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], int]:
+        await self._get_graph()
+        degrees = self._degrees
+        return {
+            (src, tgt): degrees.get(src, 0) + degrees.get(tgt, 0)
+            for src, tgt in edge_pairs
+        }
+
+    async def get_nodes_edges_batch(
+        self, node_ids: list[str]
+    ) -> dict[str, list[tuple[str, str]]]:
+        graph = await self._get_graph()
+        return {
+            node_id: list(graph.edges(node_id)) if graph.has_node(node_id) else []
+            for node_id in node_ids
+        }
+
+    async def upsert_nodes_batch(self, nodes: dict[str, dict[str, str]]) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+        graph = await self._get_graph()
+        graph.add_nodes_from(nodes.items())
+        for node_id in nodes:
+            self._degrees.setdefault(node_id, 0)
+
+    async def upsert_edges_batch(
+        self, edges: dict[tuple[str, str], dict[str, str]]
+    ) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+        graph = await self._get_graph()
+        for (src, tgt), edge_data in edges.items():
+            self._add_edge(graph, src, tgt, edge_data)
+
     async def upsert_node(self, node_id: str, node_data: dict[str, str]) -> None:
         """
         Importance notes:
@@ -124,6 +198,7 @@ class NetworkXStorage(BaseGraphStorage):
         """
         graph = await self._get_graph()
         graph.add_node(node_id, **node_data)
+        self._degrees.setdefault(node_id, 0)
 
     async def upsert_edge(
         self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
@@ -135,7 +210,21 @@ class NetworkXStorage(BaseGraphStorage):
            KG-storage-log should be used to avoid data corruption
         """
         graph = await self._get_graph()
-        graph.add_edge(source_node_id, target_node_id, **edge_data)
+        self._add_edge(graph, source_node_id, target_node_id, edge_data)
+
+    def _add_edge(self, graph: nx.Graph, src: str, tgt: str, edge_data: dict) -> None:
+        if not graph.has_edge(src, tgt):
+            # A self loop counts twice, as in graph.degree
+            self._degrees[src] = self._degrees.get(src, 0) + 1
+            self._degrees[tgt] = self._degrees.get(tgt, 0) + 1
+        graph.add_edge(src, tgt, **edge_data)
+
+    def _remove_node(self, graph: nx.Graph, node_id: str) -> None:
+        for neighbor in graph.neighbors(node_id):
+            if neighbor != node_id:
+                self._degrees[neighbor] -= 1
+        graph.remove_node(node_id)
+        self._degrees.pop(node_id, None)
 
     async def delete_node(self, node_id: str) -> None:
         """
@@ -146,7 +235,7 @@ class NetworkXStorage(BaseGraphStorage):
         """
         graph = await self._get_graph()
         if graph.has_node(node_id):
-            graph.remove_node(node_id)
+            self._remove_node(graph, node_id)
             logger.debug(f"Node {node_id} deleted from the graph.")
         else:
             logger.warning(f"Node {node_id} not found in the graph for deletion.")
@@ -165,7 +254,7 @@ class NetworkXStorage(BaseGraphStorage):
         graph = await self._get_graph()
         for node in nodes:
             if graph.has_node(node):
-                graph.remove_node(node)
+                self._remove_node(graph, node)
 
     async def remove_edges(self, edges: list[tuple[str, str]]):
         """Delete multiple edges
@@ -182,6 +271,8 @@ class NetworkXStorage(BaseGraphStorage):
         for source, target in edges:
             if graph.has_edge(source, target):
                 graph.remove_edge(source, target)
+                self._degrees[source] -= 1
+                self._degrees[target] -= 1
 
     async def get_all_labels(self) -> list[str]:
         """
@@ -222,7 +313,7 @@ class NetworkXStorage(BaseGraphStorage):
         # Handle special case for "*" label
         if node_label == "*":
             # Get degrees of all nodes
-            degrees = dict(graph.degree())
+            degrees = self._degrees
             # Sort nodes by degree in descending order and take top max_nodes
             sorted_nodes = sorted(degrees.items(), key=lambda x: x[1], reverse=True)
 
@@ -337,7 +428,7 @@ class NetworkXStorage(BaseGraphStorage):
                 logger.info(
                     f"Graph for {self.namespace} was updated by another process, reloading..."
                 )
-                self._graph = (
+                self._set_graph(
                     NetworkXStorage.load_nx_graph(self._graphml_xml_file) or nx.Graph()
                 )
                 # Reset update flag
@@ -379,7 +470,7 @@ class NetworkXStorage(BaseGraphStorage):
                 # delete _client_file_name
                 if os.path.exists(self._graphml_xml_file):
                     os.remove(self._graphml_xml_file)
-                self._graph = nx.Graph()
+                self._set_graph(nx.Graph())
                 # Notify other processes that data has been updated
                 await set_all_update_flags(self.namespace)
                 # Reset own update flag to avoid self-reloading
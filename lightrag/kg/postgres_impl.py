@@ -2,6 +2,7 @@ import asyncio
 import json
 import os
 import time
+from collections import defaultdict
 from dataclasses import dataclass, field
 from typing import Any, Union, final
 import numpy as np
@@ -25,7 +26,7 @@ from ..base import (
     DocStatusStorage,
 )
 from ..namespace import NameSpace, is_namespace
-from ..utils import logger
+from ..utils import invalidate_embedding_cache_index, logger
 
 import pipmaster as pm
 
@@ -74,10 +75,10 @@ class PostgreSQLDB:
                 f"PostgreSQL, Failed to connect database at {self.host}:{self.port}/{self.database}, Got:{e}"
             )
             raise
-    
+
     def set_user_workspace(self, user_id: str | None = None):
         """Set the workspace based on the user ID.
-        
+
         Args:
             user_id: The user ID to set the workspace for. If None, the default workspace is used.
         """
@@ -215,6 +216,25 @@ class PostgreSQLDB:
             logger.error(f"PostgreSQL database,\nsql:{sql},\ndata:{data},\nerror:{e}")
             raise
 
+    async def execute_in_transaction(
+        self,
+        statements: list[str],
+        with_age: bool = False,
+        graph_name: str | None = None,
+    ) -> None:
+        """Run several statements in one round trip and one transaction
+
+        A failing statement rolls the whole batch back and the error is raised.
+        """
+        async with self.pool.acquire() as connection:  # type: ignore
+            if with_age and graph_name:
+                await self.configure_age(connection, graph_name)  # type: ignore
+            elif with_age and not graph_name:
+                raise ValueError("Graph name is required when with_age is True")
+
+            async with connection.transaction():
+                await connection.execute(";\n".join(statements))  # type: ignore
+
 
 class ClientManager:
     _instances: dict[str, Any] = {"db": None, "ref_count": 0}
@@ -275,14 +295,14 @@ class ClientManager:
                         cls._instances["db"] = None
                 else:
                     await db.pool.close()
-        
+
     @classmethod
     async def get_client_for_user(cls, user_id: str | None = None) -> PostgreSQLDB:
         """Get a client with the workspace set for a specific user.
-        
+
         Args:
             user_id: The user ID to set the workspace for. If None, the default workspace is used.
-            
+
         Returns:
             PostgreSQLDB: The database client with the workspace set based on the user ID.
         """
@@ -310,7 +330,7 @@ class PGKVStorage(BaseKVStorage):
 
     def set_user_workspace(self, user_id: str | None = None):
         """Set the workspace based on the user ID.
-        
+
         Args:
             user_id: The user ID to set the workspace for. If None, the default workspace is used.
         """
@@ -336,7 +356,7 @@ class PGKVStorage(BaseKVStorage):
     async def get_by_mode_and_id(self, mode: str, id: str) -> Union[dict, None]:
         """Specifically for llm_response_cache."""
         sql = SQL_TEMPLATES["get_by_mode_id_" + self.namespace]
-        params = {"workspace": self.db.workspace, mode: mode, "id": id}
+        params = {"workspace": self.db.workspace, "mode": mode, "id": id}
         if is_namespace(self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE):
             array_res = await self.db.query(sql, params, multirows=True)
             res = {}
@@ -346,6 +366,12 @@ class PGKVStorage(BaseKVStorage):
         else:
             return None
 
+    async def get_by_mode(self, mode: str) -> dict[str, Any]:
+        """Specifically for llm_response_cache: get all cache entries of a mode"""
+        if not is_namespace(self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE):
+            return {}
+        return await self.get_by_id(mode) or {}
+
     # Query by id
     async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
         """Get doc_chunks data by id"""
@@ -487,6 +513,7 @@ class PGKVStorage(BaseKVStorage):
 
             logger.info(f"Deleting cache by modes: {modes}")
             await self.db.execute(sql, params)
+            await invalidate_embedding_cache_index(self)
             return True
         except Exception as e:
             logger.error(f"Error deleting cache by modes {modes}: {e}")
@@ -506,6 +533,7 @@ class PGKVStorage(BaseKVStorage):
                 table_name=table_name
             )
             await self.db.execute(drop_sql, {"workspace": self.db.workspace})
+            await invalidate_embedding_cache_index(self)
             return {"status": "success", "message": "data dropped"}
         except Exception as e:
             return {"status": "error", "message": str(e)}
@@ -534,10 +562,10 @@ class PGVectorStorage(BaseVectorStorage):
         if self.db is not None:
             await ClientManager.release_client(self.db)
             self.db = None
-    
+
     def set_user_workspace(self, user_id: str | None = None):
         """Set the workspace based on the user ID.
-        
+
         Args:
             user_id: The user ID to set the workspace for. If None, the default workspace is used.
         """
@@ -645,10 +673,13 @@ class PGVectorStorage(BaseVectorStorage):
 
     #################### query method ###############
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
     ) -> list[dict[str, Any]]:
-        embeddings = await self.embedding_func([query])
-        embedding = embeddings[0]
+        embedding = await self._embed_query(query, query_embedding)
         embedding_string = ",".join(map(str, embedding))
 
         if ids:
@@ -667,6 +698,44 @@ class PGVectorStorage(BaseVectorStorage):
         results = await self.db.query(sql, params=params, multirows=True)
         return results
 
+    async def query_batch(
+        self,
+        queries: list[str],
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embeddings: np.ndarray | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        embeddings = await self._embed_queries(queries, query_embeddings)
+        if not len(embeddings):
+            return []
+
+        if ids:
+            formatted_ids = ",".join(f"'{id}'" for id in ids)
+        else:
+            formatted_ids = "NULL"
+
+        # One statement for all queries: the per-query searches are unioned
+        # and their rows tagged with the index of the query
+        sql = "\nUNION ALL\n".join(
+            f"SELECT {i} AS query_index, q.* FROM ("
+            + SQL_TEMPLATES[self.namespace].format(
+                embedding_string=",".join(map(str, embedding)), doc_ids=formatted_ids
+            )
+            + ") q"
+            for i, embedding in enumerate(embeddings)
+        )
+        params = {
+            "workspace": self.db.workspace,
+            "better_than_threshold": self.cosine_better_than_threshold,
+            "top_k": top_k,
+        }
+        rows = await self.db.query(sql, params=params, multirows=True)
+
+        batch_results: list[list[dict[str, Any]]] = [[] for _ in embeddings]
+        for row in rows:
+            batch_results[row.pop("query_index")].append(row)
+        return batch_results
+
     async def index_done_callback(self) -> None:
         # PG handles persistence automatically
         pass
@@ -854,10 +923,10 @@ class PGDocStatusStorage(DocStatusStorage):
         if self.db is not None:
             await ClientManager.release_client(self.db)
             self.db = None
-    
+
     def set_user_workspace(self, user_id: str | None = None):
         """Set the workspace based on the user ID.
-        
+
         Args:
             user_id: The user ID to set the workspace for. If None, the default workspace is used.
         """
@@ -1093,7 +1162,7 @@ class PGGraphStorage(BaseGraphStorage):
 
     def set_user_workspace(self, user_id: str | None = None):
         """Set the workspace based on the user ID.
-        
+
         Args:
             user_id: The user ID to set the workspace for. If None, the default workspace is used.
         """
@@ -1376,6 +1445,222 @@ class PGGraphStorage(BaseGraphStorage):
 
         return edges
 
+    @staticmethod
+    def _format_id_list(node_ids: list[str]) -> str:
+        """Format node IDs as a cypher list literal"""
+        return ", ".join(json.dumps(node_id.strip('"')) for node_id in set(node_ids))
+
+    async def get_nodes_batch(self, node_ids: list[str]) -> dict[str, dict]:
+        """Get multiple nodes in one query, return only node properties"""
+        if not node_ids:
+            return {}
+
+        query = """SELECT * FROM cypher('%s', $$
+                     MATCH (n:base)
+                     WHERE n.entity_id IN [%s]
+                     RETURN n
+                   $$) AS (n agtype)""" % (
+            self.graph_name,
+            self._format_id_list(node_ids),
+        )
+        nodes = {}
+        for record in await self._query(query):
+            node_dict = record["n"]["properties"]
+            nodes.setdefault(node_dict["entity_id"], node_dict)
+        return nodes
+
+    async def node_degrees_batch(self, node_ids: list[str]) -> dict[str, int]:
+        """Get the degrees of multiple nodes in one query, 0 for missing nodes"""
+        if not node_ids:
+            return {}
+
+        query = """SELECT * FROM cypher('%s', $$
+                     MATCH (n:base)
+                     WHERE n.entity_id IN [%s]
+                     OPTIONAL MATCH (n)-[]-(x)
+                     RETURN n, count(x) AS total_edge_count
+                   $$) AS (n agtype, total_edge_count integer)""" % (
+            self.graph_name,
+            self._format_id_list(node_ids),
+        )
+        degrees = {}
+        for record in await self._query(query):
+            entity_id = record["n"]["properties"]["entity_id"]
+            degrees[entity_id] = int(record["total_edge_count"])
+        return {node_id: degrees.get(node_id.strip('"'), 0) for node_id in node_ids}
+
+    async def get_edges_batch(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        """Get the properties of multiple edges in one query"""
+        if not edge_pairs:
+            return {}
+
+        query = """SELECT * FROM cypher('%s', $$
+                     MATCH (a:base)-[r]->(b:base)
+                     WHERE a.entity_id IN [%s] AND b.entity_id IN [%s]
+                     RETURN a, b, properties(r) AS edge_properties
+                   $$) AS (a agtype, b agtype, edge_properties agtype)""" % (
+            self.graph_name,
+            self._format_id_list([src for src, _ in edge_pairs]),
+            self._format_id_list([tgt for _, tgt in edge_pairs]),
+        )
+        found = {}
+        for record in await self._query(query):
+            if not record["edge_properties"]:
+                continue
+            pair = (
+                record["a"]["properties"]["entity_id"],
+                record["b"]["properties"]["entity_id"],
+            )
+            found.setdefault(pair, record["edge_properties"])
+
+        # The IN filters match every combination of the given nodes, keep only
+        # the requested pairs
+        edges = {}
+        for src, tgt in edge_pairs:
+            edge = found.get((src.strip('"'), tgt.strip('"')))
+            if edge is not None:
+                edges[(src, tgt)] = edge
+        return edges
+
+    async def get_nodes_edges_batch(
+        self, node_ids: list[str]
+    ) -> dict[str, list[tuple[str, str]]]:
+        """Get the edges of multiple nodes in one query"""
+        edges = {node_id: [] for node_id in node_ids}
+        if not node_ids:
+            return edges
+
+        query = """SELECT * FROM cypher('%s', $$
+                      MATCH (n:base)
+                      WHERE n.entity_id IN [%s]
+                      OPTIONAL MATCH (n)-[]-(connected:base)
+                      RETURN n, connected
+                    $$) AS (n agtype, connected agtype)""" % (
+            self.graph_name,
+            self._format_id_list(node_ids),
+        )
+        node_edges = defaultdict(list)
+        for record in await self._query(query):
+            source_node = record["n"] if record["n"] else None
+            connected_node = record["connected"] if record["connected"] else None
+
+            if (
+                source_node
+                and connected_node
+                and "properties" in source_node
+                and "properties" in connected_node
+            ):
+                source_label = source_node["properties"].get("entity_id")
+                target_label = connected_node["properties"].get("entity_id")
+
+                if source_label and target_label:
+                    node_edges[source_label].append((source_label, target_label))
+
+        for node_id in node_ids:
+            edges[node_id] = node_edges.get(node_id.strip('"'), [])
+        return edges
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type((PGGraphQueryException,)),
+    )
+    async def upsert_nodes_batch(self, nodes: dict[str, dict[str, str]]) -> None:
+        """
+        Upsert multiple nodes, sending all MERGE statements in a single round trip
+        and a single transaction.
+
+        Args:
+            nodes: Dictionary mapping node IDs to node properties
+        """
+        if not nodes:
+            return
+
+        statements = []
+        for node_id, node_data in nodes.items():
+            if "entity_id" not in node_data:
+                raise ValueError(
+                    "PostgreSQL: node properties must contain an 'entity_id' field"
+                )
+            statements.append(
+                """SELECT * FROM cypher('%s', $$
+                     MERGE (n:base {entity_id: "%s"})
+                     SET n += %s
+                     RETURN n
+                   $$) AS (n agtype)"""
+                % (
+                    self.graph_name,
+                    node_id.strip('"'),
+                    self._format_properties(node_data),
+                )
+            )
+
+        try:
+            await self.db.execute_in_transaction(
+                statements, with_age=True, graph_name=self.graph_name
+            )
+        except Exception as e:
+            logger.error(f"POSTGRES, upsert_nodes_batch error on {len(nodes)} nodes")
+            raise PGGraphQueryException(
+                {
+                    "message": f"Error upserting {len(nodes)} nodes",
+                    "wrapped": statements[0],
+                    "detail": str(e),
+                }
+            ) from e
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type((PGGraphQueryException,)),
+    )
+    async def upsert_edges_batch(
+        self, edges: dict[tuple[str, str], dict[str, str]]
+    ) -> None:
+        """
+        Upsert multiple edges, sending all MERGE statements in a single round trip
+        and a single transaction.
+
+        Args:
+            edges: Dictionary mapping (source_node_id, target_node_id) tuples to edge properties
+        """
+        if not edges:
+            return
+
+        statements = [
+            """SELECT * FROM cypher('%s', $$
+                     MATCH (source:base {entity_id: "%s"})
+                     WITH source
+                     MATCH (target:base {entity_id: "%s"})
+                     MERGE (source)-[r:DIRECTED]->(target)
+                     SET r += %s
+                     RETURN r
+                   $$) AS (r agtype)"""
+            % (
+                self.graph_name,
+                src.strip('"'),
+                tgt.strip('"'),
+                self._format_properties(edge_data),
+            )
+            for (src, tgt), edge_data in edges.items()
+        ]
+
+        try:
+            await self.db.execute_in_transaction(
+                statements, with_age=True, graph_name=self.graph_name
+            )
+        except Exception as e:
+            logger.error(f"POSTGRES, upsert_edges_batch error on {len(edges)} edges")
+            raise PGGraphQueryException(
+                {
+                    "message": f"Error upserting {len(edges)} edges",
+                    "wrapped": statements[0],
+                    "detail": str(e),
+                }
+            ) from e
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -122,12 +122,16 @@ class QdrantVectorDBStorage(BaseVectorStorage):
         return results
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
     ) -> list[dict[str, Any]]:
-        embedding = await self.embedding_func([query])
+        embedding = await self._embed_query(query, query_embedding)
         results = self._client.search(
             collection_name=self.namespace,
-            query_vector=embedding[0],
+            query_vector=embedding,
             limit=top_k,
             with_payload=True,
             score_threshold=self.cosine_better_than_threshold,
@@ -137,6 +141,33 @@ class QdrantVectorDBStorage(BaseVectorStorage):
 
         return [{**dp.payload, "distance": dp.score} for dp in results]
 
+    async def query_batch(
+        self,
+        queries: list[str],
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embeddings: np.ndarray | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        embeddings = await self._embed_queries(queries, query_embeddings)
+        if not len(embeddings):
+            return []
+        results = self._client.search_batch(
+            collection_name=self.namespace,
+            requests=[
+                models.SearchRequest(
+                    vector=embedding.tolist(),
+                    limit=top_k,
+                    with_payload=True,
+                    score_threshold=self.cosine_better_than_threshold,
+                )
+                for embedding in embeddings
+            ],
+        )
+        return [
+            [{**dp.payload, "distance": dp.score} for dp in points]
+            for points in results
+        ]
+
     async def index_done_callback(self) -> None:
         # Qdrant handles persistence automatically
         pass
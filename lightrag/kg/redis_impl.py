@@ -1,5 +1,5 @@
 import os
-from typing import Any, final
+from typing import Any, Union, final
 from dataclasses import dataclass
 import pipmaster as pm
 import configparser
@@ -11,9 +11,16 @@ if not pm.is_installed("redis"):
 # aioredis is a depricated library, replaced with redis
 from redis.asyncio import Redis, ConnectionPool  # type: ignore
 from redis.exceptions import RedisError, ConnectionError  # type: ignore
-from lightrag.utils import logger
+from lightrag.utils import (
+    flatten_mode_cache,
+    generate_cache_key,
+    invalidate_embedding_cache_index,
+    is_legacy_cache_bucket,
+    logger,
+)
 
 from lightrag.base import BaseKVStorage
+from lightrag.namespace import NameSpace, is_namespace
 import json
 
 
@@ -42,10 +49,43 @@ class RedisKVStorage(BaseKVStorage):
             socket_connect_timeout=SOCKET_CONNECT_TIMEOUT,
         )
         self._redis = Redis(connection_pool=self._pool)
+        self._is_llm_cache = is_namespace(
+            self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE
+        )
         logger.info(
             f"Initialized Redis connection pool for {self.namespace} with max {MAX_CONNECTIONS} connections"
         )
 
+    async def initialize(self):
+        """Migrate legacy LLM cache buckets to one key per cache entry"""
+        if self._is_llm_cache:
+            await self._migrate_legacy_cache()
+
+    async def _migrate_legacy_cache(self):
+        """Convert legacy `namespace:mode` buckets to `namespace:mode:args_hash` keys"""
+        prefix = f"{self.namespace}:"
+        async with self._get_redis_connection() as redis:
+            async for key in redis.scan_iter(match=f"{prefix}*"):
+                mode = key[len(prefix) :]
+                if ":" in mode:
+                    continue
+                data = await redis.get(key)
+                try:
+                    mode_cache = json.loads(data) if data else None
+                except json.JSONDecodeError:
+                    continue
+                if not is_legacy_cache_bucket(mode, mode_cache):
+                    continue
+
+                pipe = redis.pipeline()
+                for k, v in flatten_mode_cache(mode, mode_cache).items():
+                    pipe.set(f"{prefix}{k}", json.dumps(v))
+                pipe.delete(key)
+                await pipe.execute()
+                logger.info(
+                    f"Migrated {len(mode_cache)} legacy LLM cache entries of mode {mode} in {self.namespace}"
+                )
+
     @asynccontextmanager
     async def _get_redis_connection(self):
         """Safe context manager for Redis operations."""
@@ -99,6 +139,25 @@ class RedisKVStorage(BaseKVStorage):
                 logger.error(f"JSON decode error in batch get: {e}")
                 return [None] * len(ids)
 
+    async def get_by_mode_and_id(self, mode: str, id: str) -> Union[dict, None]:
+        """Specifically for llm_response_cache: get one cache entry in O(1)"""
+        entry = await self.get_by_id(generate_cache_key(mode, id))
+        return {id: entry} if entry is not None else None
+
+    async def get_by_mode(self, mode: str) -> dict[str, Any]:
+        """Specifically for llm_response_cache: get all cache entries of a mode"""
+        prefix = f"{self.namespace}:{generate_cache_key(mode, '')}"
+        async with self._get_redis_connection() as redis:
+            keys = [key async for key in redis.scan_iter(match=f"{prefix}*")]
+            if not keys:
+                return {}
+            values = await redis.mget(keys)
+            return {
+                key[len(prefix) :]: json.loads(value)
+                for key, value in zip(keys, values)
+                if value
+            }
+
     async def filter_keys(self, keys: set[str]) -> set[str]:
         async with self._get_redis_connection() as redis:
             pipe = redis.pipeline()
@@ -113,6 +172,13 @@ class RedisKVStorage(BaseKVStorage):
         if not data:
             return
 
+        if self._is_llm_cache:
+            # Cache data comes grouped by mode, store one key per entry
+            flat_data = {}
+            for mode, mode_cache in data.items():
+                flat_data.update(flatten_mode_cache(mode, mode_cache))
+            data = flat_data
+
         logger.info(f"Inserting {len(data)} items to {self.namespace}")
         async with self._get_redis_connection() as redis:
             try:
@@ -164,7 +230,14 @@ class RedisKVStorage(BaseKVStorage):
             return False
 
         try:
-            await self.delete(modes)
+            async with self._get_redis_connection() as redis:
+                keys = []
+                for mode in modes:
+                    pattern = f"{self.namespace}:{generate_cache_key(mode, '')}*"
+                    keys.extend([key async for key in redis.scan_iter(match=pattern)])
+            prefix_len = len(self.namespace) + 1
+            await self.delete([key[prefix_len:] for key in keys])
+            await invalidate_embedding_cache_index(self)
             return True
         except Exception:
             return False
@@ -185,6 +258,7 @@ class RedisKVStorage(BaseKVStorage):
                         pipe.delete(key)
                     results = await pipe.execute()
                     deleted_count = sum(results)
+                    await invalidate_embedding_cache_index(self)
 
                     logger.info(f"Dropped {deleted_count} keys from {self.namespace}")
                     return {
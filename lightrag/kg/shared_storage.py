@@ -276,6 +276,11 @@ def get_data_init_lock(enable_logging: bool = False) -> UnifiedLock:
     )
 
 
+def is_multiprocess() -> bool:
+    """Whether the shared data is shared between several worker processes"""
+    return bool(_is_multiprocess)
+
+
 def initialize_share_data(workers: int = 1):
     """
     Initialize shared storage data for single or multi-process mode.
@@ -380,8 +385,8 @@ async def initialize_pipeline_status():
                 "job_name": "-",  # Current job name (indexing files/indexing texts)
                 "job_start": None,  # Job start time
                 "docs": 0,  # Total number of documents to be indexed
-                "batchs": 0,  # Number of batches for processing documents
-                "cur_batch": 0,  # Current processing batch
+                "batchs": 0,  # Progress total, the number of documents being processed
+                "cur_batch": 0,  # Progress, the number of documents finished
                 "request_pending": False,  # Flag for pending request for processing
                 "latest_message": "",  # Latest message from pipeline processing
                 "history_messages": history_messages,  # 使用共享列表对象
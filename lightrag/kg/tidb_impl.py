@@ -10,7 +10,7 @@ from lightrag.types import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdg
 
 from ..base import BaseGraphStorage, BaseKVStorage, BaseVectorStorage
 from ..namespace import NameSpace, is_namespace
-from ..utils import logger
+from ..utils import invalidate_embedding_cache_index, logger
 
 import pipmaster as pm
 import configparser
@@ -335,6 +335,7 @@ class TiDBKVStorage(BaseKVStorage):
 
             logger.info(f"Deleting cache by modes: {modes}")
             await self.db.execute(sql, {"workspace": self.db.workspace})
+            await invalidate_embedding_cache_index(self)
             return True
         except Exception as e:
             logger.error(f"Error deleting cache by modes {modes}: {e}")
@@ -354,6 +355,7 @@ class TiDBKVStorage(BaseKVStorage):
                 table_name=table_name
             )
             await self.db.execute(drop_sql, {"workspace": self.db.workspace})
+            await invalidate_embedding_cache_index(self)
             return {"status": "success", "message": "data dropped"}
         except Exception as e:
             return {"status": "error", "message": str(e)}
@@ -387,11 +389,14 @@ class TiDBVectorDBStorage(BaseVectorStorage):
             self.db = None
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: np.ndarray | None = None,
     ) -> list[dict[str, Any]]:
         """Search from tidb vector"""
-        embeddings = await self.embedding_func([query])
-        embedding = embeddings[0]
+        embedding = await self._embed_query(query, query_embedding)
 
         embedding_string = "[" + ", ".join(map(str, embedding.tolist())) + "]"
 
@@ -3,7 +3,10 @@ from __future__ import annotations
 import asyncio
 import configparser
 import os
+import pickle
+import time
 import warnings
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from functools import partial
@@ -32,24 +35,35 @@ from .base import (
 )
 from .namespace import NameSpace, make_namespace
 from .operate import (
+    chunk_document,
     chunking_by_token_size,
     extract_entities,
     kg_query,
     mix_kg_vector_query,
     naive_query,
     query_with_keywords,
+    retrieve_context,
 )
 from .prompt import GRAPH_FIELD_SEP, PROMPTS
 from .utils import (
+    AdaptiveConcurrencyLimiter,
     EmbeddingFunc,
+    KeyedLock,
     always_get_an_event_loop,
+    cache_query_embeddings,
     compute_mdhash_id,
     convert_response_to_json,
     encode_string_by_tiktoken,
     lazy_external_import,
     limit_async_func_call,
+    limit_async_func_call_adaptive,
+    limit_async_func_call_with_priority,
+    parse_lane_limits,
+    PriorityLLMScheduler,
+    query_embedding_scope,
     get_content_summary,
     clean_text,
+    clean_and_hash_texts,
     check_storage_env_vars,
     logger,
 )
@@ -111,6 +125,12 @@ class LightRAG:
         default=int(os.getenv("FORCE_LLM_SUMMARY_ON_MERGE", 6))
     )
 
+    extract_pipeline_queue_size: int = field(
+        default=int(os.getenv("EXTRACT_PIPELINE_QUEUE_SIZE", 16))
+    )
+    """Queue depth between the extraction, graph merge and vector DB upsert stages of a document.
+    Chunk results are merged in batches of at most this size while extraction is still running."""
+
     # Text chunking
     # ---
 
@@ -157,6 +177,15 @@ class LightRAG:
     Defaults to `chunking_by_token_size` if not specified.
     """
 
+    chunk_executor: str = field(default=os.getenv("CHUNK_EXECUTOR", "thread"))
+    """Where documents are cleaned, hashed and chunked, off the event loop:
+    'thread' (thread pool), 'process' (process pool, needs a picklable chunking_func) or 'none' (inline)."""
+
+    chunk_executor_max_workers: int = field(
+        default=int(os.getenv("CHUNK_EXECUTOR_MAX_WORKERS", 4))
+    )
+    """Maximum number of worker threads or processes of the chunk executor."""
+
     # Embedding
     # ---
 
@@ -182,6 +211,8 @@ class LightRAG:
     - enabled: If True, enables caching to avoid redundant computations.
     - similarity_threshold: Minimum similarity score to use cached embeddings.
     - use_llm_check: If True, validates cached embeddings using an LLM.
+    - ann_min_entries: Optional. Once a cache mode holds this many embeddings, lookups only scan the closest clusters instead of every entry.
+    - ann_nprobe: Optional. Number of clusters scanned per lookup when ann_min_entries is reached (default 8).
     """
 
     # LLM Configuration
@@ -199,9 +230,28 @@ class LightRAG:
     llm_model_max_async: int = field(default=int(os.getenv("MAX_ASYNC", 4)))
     """Maximum number of concurrent LLM calls."""
 
+    llm_lane_max_async: dict[str, int] = field(
+        default_factory=lambda: parse_lane_limits(os.getenv("LLM_LANE_MAX_ASYNC"))
+    )
+    """Optional per-lane caps on concurrent LLM calls, e.g. {"extract": 2}. Lanes are, by priority: query, keywords, summary, extract."""
+
+    llm_scheduler: PriorityLLMScheduler | None = field(default=None)
+    """Scheduler sharing the LLM concurrency between query and indexing requests.
+    Created from llm_model_max_async, llm_lane_max_async and adaptive_concurrency if not given; pass the same instance to several LightRAG objects to share one limit."""
+
     llm_model_kwargs: dict[str, Any] = field(default_factory=dict)
     """Additional keyword arguments passed to the LLM model function."""
 
+    adaptive_concurrency: bool = field(
+        default=os.getenv("ADAPTIVE_CONCURRENCY", "false").lower() == "true"
+    )
+    """If True, llm_model_max_async and embedding_func_max_async are only the starting limits: concurrency grows while latency stays flat and is halved on rate limit errors and timeouts."""
+
+    adaptive_concurrency_max_factor: float = field(
+        default=float(os.getenv("ADAPTIVE_CONCURRENCY_MAX_FACTOR", 4))
+    )
+    """Upper bound of the adaptive limits, as a multiple of the starting limits."""
+
     # Storage
     # ---
 
@@ -224,6 +274,19 @@ class LightRAG:
     max_parallel_insert: int = field(default=int(os.getenv("MAX_PARALLEL_INSERT", 2)))
     """Maximum number of parallel insert operations."""
 
+    insert_checkpoint_docs: int = field(
+        default=int(os.getenv("INSERT_CHECKPOINT_DOCS", 10))
+    )
+    """Persist all storages (index_done_callback) after this many documents have been processed."""
+
+    insert_checkpoint_interval: float = field(
+        default=float(os.getenv("INSERT_CHECKPOINT_INTERVAL", 60))
+    )
+    """Persist all storages when this many seconds have passed since the last checkpoint, checked whenever a document finishes."""
+
+    max_parallel_merge: int = field(default=int(os.getenv("MAX_PARALLEL_MERGE", 8)))
+    """Maximum number of entities or relationships merged into the graph concurrently (including their LLM summaries)."""
+
     addon_params: dict[str, Any] = field(
         default_factory=lambda: {
             "language": os.getenv("SUMMARY_LANGUAGE", PROMPTS["DEFAULT_LANGUAGE"])
@@ -252,6 +315,11 @@ class LightRAG:
         default=float(os.getenv("COSINE_THRESHOLD", 0.2))
     )
 
+    chunk_fetch_batch_size: int = field(
+        default=int(os.getenv("CHUNK_FETCH_BATCH_SIZE", 500))
+    )
+    """Maximum number of text chunks requested from the KV storage in one get_by_ids call at query time."""
+
     _storages_status: StoragesStatus = field(default=StoragesStatus.NOT_CREATED)
 
     def __post_init__(self):
@@ -310,10 +378,31 @@ class LightRAG:
         _print_config = ",\n  ".join([f"{k} = {v}" for k, v in global_config.items()])
         logger.debug(f"LightRAG init with param:\n  {_print_config}\n")
 
+        # Created on first use, see _run_in_chunk_executor
+        self._chunk_executor: Executor | None = None
+
+        # Per entity / per relation locks, shared by the graph merges of all
+        # documents processed at the same time and the entity / relation edits
+        self._graph_merge_lock = KeyedLock()
+
         # Init LLM
-        self.embedding_func = limit_async_func_call(self.embedding_func_max_async)(  # type: ignore
-            self.embedding_func
-        )
+        self.embedding_limiter: AdaptiveConcurrencyLimiter | None = None
+        if self.adaptive_concurrency:
+            self.embedding_limiter = AdaptiveConcurrencyLimiter(
+                self.embedding_func_max_async,
+                max_limit=int(
+                    self.embedding_func_max_async * self.adaptive_concurrency_max_factor
+                ),
+            )
+            self.embedding_func = limit_async_func_call_adaptive(  # type: ignore
+                self.embedding_limiter
+            )(self.embedding_func)
+        else:
+            self.embedding_func = limit_async_func_call(self.embedding_func_max_async)(  # type: ignore
+                self.embedding_func
+            )
+        # Queries embed their strings once, outside the concurrency limit
+        self.embedding_func = cache_query_embeddings(self.embedding_func)  # type: ignore
 
         # Initialize all storages
         self.key_string_value_json_storage_cls: type[BaseKVStorage] = (
@@ -399,7 +488,21 @@ class LightRAG:
         # Directly use llm_response_cache, don't create a new object
         hashing_kv = self.llm_response_cache
 
-        self.llm_model_func = limit_async_func_call(self.llm_model_max_async)(
+        if self.llm_scheduler is None:
+            llm_limiter = None
+            if self.adaptive_concurrency:
+                llm_limiter = AdaptiveConcurrencyLimiter(
+                    self.llm_model_max_async,
+                    max_limit=int(
+                        self.llm_model_max_async * self.adaptive_concurrency_max_factor
+                    ),
+                )
+            self.llm_scheduler = PriorityLLMScheduler(
+                llm_limiter.max_limit if llm_limiter else self.llm_model_max_async,
+                self.llm_lane_max_async,
+                limiter=llm_limiter,
+            )
+        self.llm_model_func = limit_async_func_call_with_priority(self.llm_scheduler)(
             partial(
                 self.llm_model_func,  # type: ignore
                 hashing_kv=hashing_kv,
@@ -478,9 +581,38 @@ class LightRAG:
 
             await asyncio.gather(*tasks)
 
+            if self._chunk_executor is not None:
+                self._chunk_executor.shutdown(wait=True, cancel_futures=True)
+                self._chunk_executor = None
+
             self._storages_status = StoragesStatus.FINALIZED
             logger.debug("Finalized Storages")
 
+    async def _run_in_chunk_executor(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a CPU bound document preprocessing function without blocking the event loop"""
+        if self.chunk_executor == "none":
+            return func(*args)
+
+        if self._chunk_executor is None:
+            if self.chunk_executor == "process":
+                try:
+                    pickle.dumps(self.chunking_func)
+                    self._chunk_executor = ProcessPoolExecutor(
+                        max_workers=self.chunk_executor_max_workers
+                    )
+                except (pickle.PicklingError, AttributeError, TypeError) as e:
+                    logger.warning(
+                        f"chunking_func can't be sent to a process pool ({e}), using a thread pool"
+                    )
+            if self._chunk_executor is None:
+                self._chunk_executor = ThreadPoolExecutor(
+                    max_workers=self.chunk_executor_max_workers,
+                    thread_name_prefix="lightrag-chunk",
+                )
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._chunk_executor, partial(func, *args))
+
     async def get_graph_labels(self):
         text = await self.chunk_entity_relation_graph.get_all_labels()
         return text
@@ -684,25 +816,17 @@ class LightRAG:
                 for id_, doc, path in zip(ids, input, file_paths)
             }
         else:
-            # Clean input text and remove duplicates
-            cleaned_input = [
-                (clean_text(doc), path) for doc, path in zip(input, file_paths)
-            ]
-            unique_content_with_paths = {}
-
-            # Keep track of unique content and their paths
-            for content, path in cleaned_input:
-                if content not in unique_content_with_paths:
-                    unique_content_with_paths[content] = path
+            # Clean input text and generate MD5 hash IDs off the event loop
+            cleaned_input = await self._run_in_chunk_executor(
+                clean_and_hash_texts, input, "doc-"
+            )
 
-            # Generate contents dict of MD5 hash IDs and documents with paths
-            contents = {
-                compute_mdhash_id(content, prefix="doc-"): {
-                    "content": content,
-                    "file_path": path,
-                }
-                for content, path in unique_content_with_paths.items()
-            }
+            # Generate contents dict of MD5 hash IDs and documents with paths,
+            # keeping the first path of duplicate contents
+            contents = {}
+            for (id_, content), path in zip(cleaned_input, file_paths):
+                if id_ not in contents:
+                    contents[id_] = {"content": content, "file_path": path}
 
         # 2. Remove duplicate contents
         unique_contents = {}
@@ -838,17 +962,13 @@ class LightRAG:
                     break
 
                 # 2. split docs into chunks, insert chunks, update doc status
-                docs_batches = [
-                    list(to_process_docs.items())[i : i + self.max_parallel_insert]
-                    for i in range(0, len(to_process_docs), self.max_parallel_insert)
-                ]
-
-                log_message = f"Processing {len(to_process_docs)} document(s) in {len(docs_batches)} batches"
+                log_message = f"Processing {len(to_process_docs)} document(s) with {self.max_parallel_insert} in flight"
                 logger.info(log_message)
 
-                # Update pipeline status with current batch information
+                # Update pipeline status, progress is counted in documents
                 pipeline_status["docs"] = len(to_process_docs)
-                pipeline_status["batchs"] = len(docs_batches)
+                pipeline_status["batchs"] = len(to_process_docs)
+                pipeline_status["cur_batch"] = 0
                 pipeline_status["latest_message"] = log_message
                 pipeline_status["history_messages"].append(log_message)
 
@@ -884,22 +1004,20 @@ class LightRAG:
                             pipeline_status["latest_message"] = log_message
                             pipeline_status["history_messages"].append(log_message)
 
-                        # Generate chunks from document
-                        chunks: dict[str, Any] = {
-                            compute_mdhash_id(dp["content"], prefix="chunk-"): {
-                                **dp,
-                                "full_doc_id": doc_id,
-                                "file_path": file_path,  # Add file path to each chunk
-                            }
-                            for dp in self.chunking_func(
-                                status_doc.content,
-                                split_by_character,
-                                split_by_character_only,
-                                self.chunk_overlap_token_size,
-                                self.chunk_token_size,
-                                self.tiktoken_model_name,
-                            )
-                        }
+                        # Generate chunks from document in the chunk executor, so
+                        # each document goes on as soon as its own chunks are ready
+                        chunks: dict[str, Any] = await self._run_in_chunk_executor(
+                            chunk_document,
+                            self.chunking_func,
+                            doc_id,
+                            status_doc.content,
+                            file_path,
+                            split_by_character,
+                            split_by_character_only,
+                            self.chunk_overlap_token_size,
+                            self.chunk_token_size,
+                            self.tiktoken_model_name,
+                        )
 
                         # Process document (text chunks and full docs) in parallel
                         # Create tasks with references for potential cancellation
@@ -990,39 +1108,67 @@ class LightRAG:
                             }
                         )
 
-                # 3. iterate over batches
-                total_batches = len(docs_batches)
-                for batch_idx, docs_batch in enumerate(docs_batches):
-                    current_batch = batch_idx + 1
-                    log_message = (
-                        f"Start processing batch {current_batch} of {total_batches}."
-                    )
-                    logger.info(log_message)
-                    pipeline_status["cur_batch"] = current_batch
-                    pipeline_status["latest_message"] = log_message
-                    pipeline_status["history_messages"].append(log_message)
+                # 3. keep max_parallel_insert documents in flight: a worker picks
+                # the next document as soon as its previous one is done, so a slow
+                # document never holds back the others
+                pending_docs_iter = iter(list(to_process_docs.items()))
+                total_docs = len(to_process_docs)
+                finished_docs = 0
+                docs_since_checkpoint = 0
+                last_checkpoint = time.monotonic()
+                checkpoint_lock = asyncio.Lock()
+
+                async def checkpoint_if_due() -> None:
+                    """Persist storages every insert_checkpoint_docs documents or insert_checkpoint_interval seconds"""
+                    nonlocal docs_since_checkpoint, last_checkpoint
+                    async with checkpoint_lock:
+                        if docs_since_checkpoint == 0:
+                            return
+                        if (
+                            docs_since_checkpoint < self.insert_checkpoint_docs
+                            and time.monotonic() - last_checkpoint
+                            < self.insert_checkpoint_interval
+                        ):
+                            return
+                        docs_since_checkpoint = 0
+                        last_checkpoint = time.monotonic()
+                        await self._insert_done()
+
+                async def document_worker() -> None:
+                    nonlocal finished_docs, docs_since_checkpoint
+                    for doc_id, status_doc in pending_docs_iter:
+                        await process_document(
+                            doc_id,
+                            status_doc,
+                            split_by_character,
+                            split_by_character_only,
+                            pipeline_status,
+                            pipeline_status_lock,
+                        )
+                        finished_docs += 1
+                        docs_since_checkpoint += 1
 
-                    doc_tasks = []
-                    for doc_id, status_doc in docs_batch:
-                        doc_tasks.append(
-                            process_document(
-                                doc_id,
-                                status_doc,
-                                split_by_character,
-                                split_by_character_only,
-                                pipeline_status,
-                                pipeline_status_lock,
-                            )
+                        log_message = (
+                            f"Completed document {finished_docs} of {total_docs}."
                         )
+                        logger.info(log_message)
+                        async with pipeline_status_lock:
+                            pipeline_status["cur_batch"] = finished_docs
+                            pipeline_status["latest_message"] = log_message
+                            pipeline_status["history_messages"].append(log_message)
 
-                    # Process documents in one batch parallelly
-                    await asyncio.gather(*doc_tasks)
-                    await self._insert_done()
+                        await checkpoint_if_due()
 
-                    log_message = f"Completed batch {current_batch} of {total_batches}."
-                    logger.info(log_message)
-                    pipeline_status["latest_message"] = log_message
-                    pipeline_status["history_messages"].append(log_message)
+                await asyncio.gather(
+                    *[
+                        document_worker()
+                        for _ in range(
+                            max(1, min(self.max_parallel_insert, total_docs))
+                        )
+                    ]
+                )
+                # Final checkpoint for the documents processed since the last one
+                await self._insert_done()
 
                 # Check if there's a pending request to process more documents (with lock)
                 has_pending_request = False
@@ -1074,6 +1220,7 @@ class LightRAG:
                 pipeline_status=pipeline_status,
                 pipeline_status_lock=pipeline_status_lock,
                 llm_response_cache=self.llm_response_cache,
+                keyed_lock=self._graph_merge_lock,
             )
         except Exception as e:
             logger.error("Failed to extract entities and relationships")
@@ -1321,30 +1468,94 @@ class LightRAG:
         # If a custom model is provided in param, temporarily update global config
         global_config = asdict(self)
 
-        if param.mode in ["local", "global", "hybrid"]:
-            response = await kg_query(
-                query.strip(),
-                self.chunk_entity_relation_graph,
-                self.entities_vdb,
-                self.relationships_vdb,
-                self.text_chunks,
-                param,
-                global_config,
-                hashing_kv=self.llm_response_cache,  # Directly use llm_response_cache
-                system_prompt=system_prompt,
-            )
-        elif param.mode == "naive":
-            response = await naive_query(
-                query.strip(),
-                self.chunks_vdb,
-                self.text_chunks,
-                param,
-                global_config,
-                hashing_kv=self.llm_response_cache,  # Directly use llm_response_cache
-                system_prompt=system_prompt,
-            )
-        elif param.mode == "mix":
-            response = await mix_kg_vector_query(
+        # One embedding per distinct string for the whole query
+        with query_embedding_scope():
+            if param.mode in ["local", "global", "hybrid"]:
+                response = await kg_query(
+                    query.strip(),
+                    self.chunk_entity_relation_graph,
+                    self.entities_vdb,
+                    self.relationships_vdb,
+                    self.text_chunks,
+                    param,
+                    global_config,
+                    hashing_kv=self.llm_response_cache,  # Directly use llm_response_cache
+                    system_prompt=system_prompt,
+                )
+            elif param.mode == "naive":
+                response = await naive_query(
+                    query.strip(),
+                    self.chunks_vdb,
+                    self.text_chunks,
+                    param,
+                    global_config,
+                    hashing_kv=self.llm_response_cache,  # Directly use llm_response_cache
+                    system_prompt=system_prompt,
+                )
+            elif param.mode == "mix":
+                response = await mix_kg_vector_query(
+                    query.strip(),
+                    self.chunk_entity_relation_graph,
+                    self.entities_vdb,
+                    self.relationships_vdb,
+                    self.chunks_vdb,
+                    self.text_chunks,
+                    param,
+                    global_config,
+                    hashing_kv=self.llm_response_cache,  # Directly use llm_response_cache
+                    system_prompt=system_prompt,
+                )
+            elif param.mode == "bypass":
+                # Bypass mode: directly use LLM without knowledge retrieval
+                use_llm_func = param.model_func or global_config["llm_model_func"]
+                param.stream = True if param.stream is None else param.stream
+                response = await use_llm_func(
+                    query.strip(),
+                    system_prompt=system_prompt,
+                    history_messages=param.conversation_history,
+                    stream=param.stream,
+                )
+            else:
+                raise ValueError(f"Unknown mode {param.mode}")
+        await self._query_done()
+        return response
+
+    def retrieve(
+        self, query: str, param: QueryParam = QueryParam()
+    ) -> dict[str, list[dict[str, Any]]]:
+        """
+        Sync version of aretrieve.
+
+        Args:
+            query (str): The query to retrieve context for.
+            param (QueryParam): Configuration parameters for the retrieval.
+
+        Returns:
+            dict: The entity, relationship and chunk records of the context.
+        """
+        loop = always_get_an_event_loop()
+        return loop.run_until_complete(self.aretrieve(query, param))
+
+    async def aretrieve(
+        self, query: str, param: QueryParam = QueryParam()
+    ) -> dict[str, list[dict[str, Any]]]:
+        """
+        Retrieve the context of a query without any LLM call.
+
+        The raw query, or param.hl_keywords / param.ll_keywords when provided,
+        is matched against the vector storages; keyword extraction and the
+        response cache are skipped. Supports the local, global, hybrid, naive
+        and mix modes.
+
+        Args:
+            query (str): The query to retrieve context for.
+            param (QueryParam): Configuration parameters for the retrieval.
+
+        Returns:
+            dict: ``{"entities": [...], "relationships": [...], "chunks": [...]}``
+        """
+        with query_embedding_scope():
+            return await retrieve_context(
                 query.strip(),
                 self.chunk_entity_relation_graph,
                 self.entities_vdb,
@@ -1352,24 +1563,7 @@ class LightRAG:
                 self.chunks_vdb,
                 self.text_chunks,
                 param,
-                global_config,
-                hashing_kv=self.llm_response_cache,  # Directly use llm_response_cache
-                system_prompt=system_prompt,
             )
-        elif param.mode == "bypass":
-            # Bypass mode: directly use LLM without knowledge retrieval
-            use_llm_func = param.model_func or global_config["llm_model_func"]
-            param.stream = True if param.stream is None else param.stream
-            response = await use_llm_func(
-                query.strip(),
-                system_prompt=system_prompt,
-                history_messages=param.conversation_history,
-                stream=param.stream,
-            )
-        else:
-            raise ValueError(f"Unknown mode {param.mode}")
-        await self._query_done()
-        return response
 
     def query_with_separate_keyword_extraction(
         self, query: str, prompt: str, param: QueryParam = QueryParam()
@@ -1406,18 +1600,19 @@ class LightRAG:
         Returns:
             Query response or async iterator
         """
-        response = await query_with_keywords(
-            query=query,
-            prompt=prompt,
-            param=param,
-            knowledge_graph_inst=self.chunk_entity_relation_graph,
-            entities_vdb=self.entities_vdb,
-            relationships_vdb=self.relationships_vdb,
-            chunks_vdb=self.chunks_vdb,
-            text_chunks_db=self.text_chunks,
-            global_config=asdict(self),
-            hashing_kv=self.llm_response_cache,
-        )
+        with query_embedding_scope():
+            response = await query_with_keywords(
+                query=query,
+                prompt=prompt,
+                param=param,
+                knowledge_graph_inst=self.chunk_entity_relation_graph,
+                entities_vdb=self.entities_vdb,
+                relationships_vdb=self.relationships_vdb,
+                chunks_vdb=self.chunks_vdb,
+                text_chunks_db=self.text_chunks,
+                global_config=asdict(self),
+                hashing_kv=self.llm_response_cache,
+            )
 
         await self._query_done()
         return response
@@ -1759,6 +1954,7 @@ class LightRAG:
             self.entities_vdb,
             self.relationships_vdb,
             entity_name,
+            keyed_lock=self._graph_merge_lock,
         )
 
     def delete_by_entity(self, entity_name: str) -> None:
@@ -1779,6 +1975,7 @@ class LightRAG:
             self.relationships_vdb,
             source_entity,
             target_entity,
+            keyed_lock=self._graph_merge_lock,
         )
 
     def delete_by_relation(self, source_entity: str, target_entity: str) -> None:
@@ -1846,6 +2043,7 @@ class LightRAG:
             entity_name,
             updated_data,
             allow_rename,
+            keyed_lock=self._graph_merge_lock,
         )
 
     def edit_entity(
@@ -1880,6 +2078,7 @@ class LightRAG:
             source_entity,
             target_entity,
             updated_data,
+            keyed_lock=self._graph_merge_lock,
         )
 
     def edit_relation(
@@ -1912,6 +2111,7 @@ class LightRAG:
             self.relationships_vdb,
             entity_name,
             entity_data,
+            keyed_lock=self._graph_merge_lock,
         )
 
     def create_entity(
@@ -1944,6 +2144,7 @@ class LightRAG:
             source_entity,
             target_entity,
             relation_data,
+            keyed_lock=self._graph_merge_lock,
         )
 
     def create_relation(
@@ -1991,6 +2192,7 @@ class LightRAG:
             target_entity,
             merge_strategy,
             target_entity_data,
+            keyed_lock=self._graph_merge_lock,
         )
 
     def merge_entities(
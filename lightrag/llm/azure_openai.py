@@ -21,6 +21,7 @@ from tenacity import (
 )
 
 from lightrag.utils import (
+    report_throttle_on_retry,
     wrap_embedding_func_with_attrs,
     locate_json_string_body_from_string,
     safe_unicode_decode,
@@ -35,6 +36,7 @@ import numpy as np
     retry=retry_if_exception_type(
         (RateLimitError, APIConnectionError, APIConnectionError)
     ),
+    before_sleep=report_throttle_on_retry,
 )
 async def azure_openai_complete_if_cache(
     model,
@@ -120,6 +122,7 @@ async def azure_openai_complete(
     retry=retry_if_exception_type(
         (RateLimitError, APIConnectionError, APITimeoutError)
     ),
+    before_sleep=report_throttle_on_retry,
 )
 async def azure_openai_embed(
     texts: list[str],
@@ -26,6 +26,7 @@ from tenacity import (
     retry_if_exception_type,
 )
 from lightrag.utils import (
+    report_throttle_on_retry,
     wrap_embedding_func_with_attrs,
     locate_json_string_body_from_string,
     safe_unicode_decode,
@@ -93,6 +94,7 @@ def create_openai_async_client(
     retry=retry_if_exception_type(
         (RateLimitError, APIConnectionError, APITimeoutError, InvalidResponseError)
     ),
+    before_sleep=report_throttle_on_retry,
 )
 async def openai_complete_if_cache(
     model: str,
@@ -332,6 +334,7 @@ async def nvidia_openai_complete(
     retry=retry_if_exception_type(
         (RateLimitError, APIConnectionError, APITimeoutError)
     ),
+    before_sleep=report_throttle_on_retry,
 )
 async def openai_embed(
     texts: list[str],
@@ -1,32 +1,42 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 import traceback
 import json
 import re
 import os
-from typing import Any, AsyncIterator
+from typing import Any, AsyncIterator, Callable
+from bisect import bisect_left
 from collections import Counter, defaultdict
+from dataclasses import replace
 
 from .utils import (
     logger,
     clean_str,
     compute_mdhash_id,
-    decode_tokens_by_tiktoken,
-    encode_string_by_tiktoken,
+    count_tokens,
+    encode_string_with_offsets,
     is_float_regex,
     list_of_list_to_csv,
     normalize_extracted_info,
     pack_user_ass_to_openai_messages,
     split_string_by_multi_markers,
     truncate_list_by_token_size,
-    process_combine_contexts,
     compute_args_hash,
     handle_cache,
     save_to_cache,
+    cache_streamed_response,
+    stream_cached_response,
     CacheData,
     get_conversation_turns,
     use_llm_func_with_cache,
+    KeyedLock,
+    UnlimitedSemaphore,
+    truncate_string_by_token_size,
+    llm_priority,
+    trace_span,
+    trace_llm_call,
 )
 from .base import (
     BaseGraphStorage,
@@ -53,31 +63,39 @@ def chunking_by_token_size(
     max_token_size: int = 1536,
     tiktoken_model: str = "gpt-4o",
 ) -> list[dict[str, Any]]:
-    tokens = encode_string_by_tiktoken(content, model_name=tiktoken_model)
+    # Tokenize the whole document once; chunks are sliced out of the text by
+    # token start offsets instead of decoding token windows or re-encoding pieces
+    tokens, offsets, text = encode_string_with_offsets(
+        content, model_name=tiktoken_model
+    )
+
+    def _char_offset(token_index: int) -> int:
+        return offsets[token_index] if token_index < len(offsets) else len(text)
+
     results: list[dict[str, Any]] = []
     if split_by_character:
-        raw_chunks = content.split(split_by_character)
         new_chunks = []
-        if split_by_character_only:
-            for chunk in raw_chunks:
-                _tokens = encode_string_by_tiktoken(chunk, model_name=tiktoken_model)
-                new_chunks.append((len(_tokens), chunk))
-        else:
-            for chunk in raw_chunks:
-                _tokens = encode_string_by_tiktoken(chunk, model_name=tiktoken_model)
-                if len(_tokens) > max_token_size:
-                    for start in range(
-                        0, len(_tokens), max_token_size - overlap_token_size
-                    ):
-                        chunk_content = decode_tokens_by_tiktoken(
-                            _tokens[start : start + max_token_size],
-                            model_name=tiktoken_model,
-                        )
-                        new_chunks.append(
-                            (min(max_token_size, len(_tokens) - start), chunk_content)
+        piece_start = 0
+        for chunk in text.split(split_by_character):
+            piece_end = piece_start + len(chunk)
+            # Tokens starting inside this piece
+            first_token = bisect_left(offsets, piece_start)
+            last_token = bisect_left(offsets, piece_end)
+            num_tokens = last_token - first_token
+            if split_by_character_only or num_tokens <= max_token_size:
+                new_chunks.append((num_tokens, chunk))
+            else:
+                for start in range(
+                    first_token, last_token, max_token_size - overlap_token_size
+                ):
+                    end = min(start + max_token_size, last_token)
+                    chunk_content = text[
+                        max(_char_offset(start), piece_start) : min(
+                            _char_offset(end), piece_end
                         )
-                else:
-                    new_chunks.append((len(_tokens), chunk))
+                    ]
+                    new_chunks.append((end - start, chunk_content))
+            piece_start = piece_end + len(split_by_character)
         for index, (_len, chunk) in enumerate(new_chunks):
             results.append(
                 {
@@ -90,12 +108,11 @@ def chunking_by_token_size(
         for index, start in enumerate(
             range(0, len(tokens), max_token_size - overlap_token_size)
         ):
-            chunk_content = decode_tokens_by_tiktoken(
-                tokens[start : start + max_token_size], model_name=tiktoken_model
-            )
+            end = min(start + max_token_size, len(tokens))
+            chunk_content = text[_char_offset(start) : _char_offset(end)]
             results.append(
                 {
-                    "tokens": min(max_token_size, len(tokens) - start),
+                    "tokens": end - start,
                     "content": chunk_content.strip(),
                     "chunk_order_index": index,
                 }
@@ -103,6 +120,38 @@ def chunking_by_token_size(
     return results
 
 
+def chunk_document(
+    chunking_func: Callable[..., list[dict[str, Any]]],
+    doc_id: str,
+    content: str,
+    file_path: str,
+    split_by_character: str | None,
+    split_by_character_only: bool,
+    overlap_token_size: int,
+    max_token_size: int,
+    tiktoken_model: str,
+) -> dict[str, Any]:
+    """Split a document into chunks keyed by their MD5 hash IDs, ready to be upserted.
+
+    Only takes picklable arguments, so it can run in a process pool.
+    """
+    return {
+        compute_mdhash_id(dp["content"], prefix="chunk-"): {
+            **dp,
+            "full_doc_id": doc_id,
+            "file_path": file_path,  # Add file path to each chunk
+        }
+        for dp in chunking_func(
+            content,
+            split_by_character,
+            split_by_character_only,
+            overlap_token_size,
+            max_token_size,
+            tiktoken_model,
+        )
+    }
+
+
 async def _handle_entity_relation_summary(
     entity_or_relation_name: str,
     description: str,
@@ -124,10 +173,9 @@ async def _handle_entity_relation_summary(
         "language", PROMPTS["DEFAULT_LANGUAGE"]
     )
 
-    tokens = encode_string_by_tiktoken(description, model_name=tiktoken_model_name)
     prompt_template = PROMPTS["summarize_entity_descriptions"]
-    use_description = decode_tokens_by_tiktoken(
-        tokens[:llm_max_tokens], model_name=tiktoken_model_name
+    use_description = truncate_string_by_token_size(
+        description, llm_max_tokens, model_name=tiktoken_model_name
     )
     context_base = dict(
         entity_name=entity_or_relation_name,
@@ -138,13 +186,14 @@ async def _handle_entity_relation_summary(
     logger.debug(f"Trigger summary: {entity_or_relation_name}")
 
     # Use LLM function with cache
-    summary = await use_llm_func_with_cache(
-        use_prompt,
-        use_llm_func,
-        llm_response_cache=llm_response_cache,
-        max_tokens=summary_max_tokens,
-        cache_type="extract",
-    )
+    with llm_priority("summary"):
+        summary = await use_llm_func_with_cache(
+            use_prompt,
+            use_llm_func,
+            llm_response_cache=llm_response_cache,
+            max_tokens=summary_max_tokens,
+            cache_type="extract",
+        )
     return summary
 
 
@@ -230,22 +279,21 @@ async def _handle_single_relationship_extraction(
     )
 
 
-async def _merge_nodes_then_upsert(
+async def _merge_nodes(
     entity_name: str,
     nodes_data: list[dict],
-    knowledge_graph_inst: BaseGraphStorage,
+    already_node: dict | None,
     global_config: dict,
     pipeline_status: dict = None,
     pipeline_status_lock=None,
     llm_response_cache: BaseKVStorage | None = None,
-):
-    """Get existing nodes from knowledge graph use name,if exists, merge data, else create, then upsert."""
+) -> dict:
+    """Merge extracted entity data into the existing node (if any), return the node properties to upsert."""
     already_entity_types = []
     already_source_ids = []
     already_description = []
     already_file_paths = []
 
-    already_node = await knowledge_graph_inst.get_node(entity_name)
     if already_node is not None:
         already_entity_types.append(already_node["entity_type"])
         already_source_ids.extend(
@@ -280,7 +328,7 @@ async def _merge_nodes_then_upsert(
 
     if num_fragment > 1:
         if num_fragment >= force_llm_summary_on_merge:
-            status_message = f"LLM merge N: {entity_name} | {num_new_fragment}+{num_fragment-num_new_fragment}"
+            status_message = f"LLM merge N: {entity_name} | {num_new_fragment}+{num_fragment - num_new_fragment}"
             logger.info(status_message)
             if pipeline_status is not None and pipeline_status_lock is not None:
                 async with pipeline_status_lock:
@@ -295,78 +343,71 @@ async def _merge_nodes_then_upsert(
                 llm_response_cache,
             )
         else:
-            status_message = f"Merge N: {entity_name} | {num_new_fragment}+{num_fragment-num_new_fragment}"
+            status_message = f"Merge N: {entity_name} | {num_new_fragment}+{num_fragment - num_new_fragment}"
             logger.info(status_message)
             if pipeline_status is not None and pipeline_status_lock is not None:
                 async with pipeline_status_lock:
                     pipeline_status["latest_message"] = status_message
                     pipeline_status["history_messages"].append(status_message)
 
-    node_data = dict(
+    return dict(
         entity_id=entity_name,
         entity_type=entity_type,
         description=description,
         source_id=source_id,
         file_path=file_path,
     )
-    await knowledge_graph_inst.upsert_node(
-        entity_name,
-        node_data=node_data,
-    )
-    node_data["entity_name"] = entity_name
-    return node_data
 
 
-async def _merge_edges_then_upsert(
+async def _merge_edges(
     src_id: str,
     tgt_id: str,
     edges_data: list[dict],
-    knowledge_graph_inst: BaseGraphStorage,
+    already_edge: dict | None,
     global_config: dict,
     pipeline_status: dict = None,
     pipeline_status_lock=None,
     llm_response_cache: BaseKVStorage | None = None,
-):
+) -> dict:
+    """Merge extracted relation data into the existing edge (if any), return the edge properties to upsert."""
     already_weights = []
     already_source_ids = []
     already_description = []
     already_keywords = []
     already_file_paths = []
 
-    if await knowledge_graph_inst.has_edge(src_id, tgt_id):
-        already_edge = await knowledge_graph_inst.get_edge(src_id, tgt_id)
-        # Handle the case where get_edge returns None or missing fields
-        if already_edge:
-            # Get weight with default 0.0 if missing
-            already_weights.append(already_edge.get("weight", 0.0))
-
-            # Get source_id with empty string default if missing or None
-            if already_edge.get("source_id") is not None:
-                already_source_ids.extend(
-                    split_string_by_multi_markers(
-                        already_edge["source_id"], [GRAPH_FIELD_SEP]
-                    )
+    # Handle the case where the edge is missing or has missing fields
+    if already_edge:
+        # Get weight with default 0.0 if missing
+        already_weights.append(already_edge.get("weight", 0.0))
+
+        # Get source_id with empty string default if missing or None
+        if already_edge.get("source_id") is not None:
+            already_source_ids.extend(
+                split_string_by_multi_markers(
+                    already_edge["source_id"], [GRAPH_FIELD_SEP]
                 )
+            )
 
-            # Get file_path with empty string default if missing or None
-            if already_edge.get("file_path") is not None:
-                already_file_paths.extend(
-                    split_string_by_multi_markers(
-                        already_edge["file_path"], [GRAPH_FIELD_SEP]
-                    )
+        # Get file_path with empty string default if missing or None
+        if already_edge.get("file_path") is not None:
+            already_file_paths.extend(
+                split_string_by_multi_markers(
+                    already_edge["file_path"], [GRAPH_FIELD_SEP]
                 )
+            )
 
-            # Get description with empty string default if missing or None
-            if already_edge.get("description") is not None:
-                already_description.append(already_edge["description"])
+        # Get description with empty string default if missing or None
+        if already_edge.get("description") is not None:
+            already_description.append(already_edge["description"])
 
-            # Get keywords with empty string default if missing or None
-            if already_edge.get("keywords") is not None:
-                already_keywords.extend(
-                    split_string_by_multi_markers(
-                        already_edge["keywords"], [GRAPH_FIELD_SEP]
-                    )
+        # Get keywords with empty string default if missing or None
+        if already_edge.get("keywords") is not None:
+            already_keywords.extend(
+                split_string_by_multi_markers(
+                    already_edge["keywords"], [GRAPH_FIELD_SEP]
                 )
+            )
 
     # Process edges_data with None checks
     weight = sum([dp["weight"] for dp in edges_data] + already_weights)
@@ -399,19 +440,6 @@ async def _merge_edges_then_upsert(
         )
     )
 
-    for need_insert_id in [src_id, tgt_id]:
-        if not (await knowledge_graph_inst.has_node(need_insert_id)):
-            await knowledge_graph_inst.upsert_node(
-                need_insert_id,
-                node_data={
-                    "entity_id": need_insert_id,
-                    "source_id": source_id,
-                    "description": description,
-                    "entity_type": "UNKNOWN",
-                    "file_path": file_path,
-                },
-            )
-
     force_llm_summary_on_merge = global_config["force_llm_summary_on_merge"]
 
     num_fragment = description.count(GRAPH_FIELD_SEP) + 1
@@ -421,7 +449,7 @@ async def _merge_edges_then_upsert(
 
     if num_fragment > 1:
         if num_fragment >= force_llm_summary_on_merge:
-            status_message = f"LLM merge E: {src_id} - {tgt_id} | {num_new_fragment}+{num_fragment-num_new_fragment}"
+            status_message = f"LLM merge E: {src_id} - {tgt_id} | {num_new_fragment}+{num_fragment - num_new_fragment}"
             logger.info(status_message)
             if pipeline_status is not None and pipeline_status_lock is not None:
                 async with pipeline_status_lock:
@@ -436,35 +464,100 @@ async def _merge_edges_then_upsert(
                 llm_response_cache,
             )
         else:
-            status_message = f"Merge E: {src_id} - {tgt_id} | {num_new_fragment}+{num_fragment-num_new_fragment}"
+            status_message = f"Merge E: {src_id} - {tgt_id} | {num_new_fragment}+{num_fragment - num_new_fragment}"
             logger.info(status_message)
             if pipeline_status is not None and pipeline_status_lock is not None:
                 async with pipeline_status_lock:
                     pipeline_status["latest_message"] = status_message
                     pipeline_status["history_messages"].append(status_message)
 
-    await knowledge_graph_inst.upsert_edge(
-        src_id,
-        tgt_id,
-        edge_data=dict(
-            weight=weight,
-            description=description,
-            keywords=keywords,
-            source_id=source_id,
-            file_path=file_path,
-        ),
-    )
-
-    edge_data = dict(
-        src_id=src_id,
-        tgt_id=tgt_id,
+    return dict(
+        weight=weight,
         description=description,
         keywords=keywords,
         source_id=source_id,
         file_path=file_path,
     )
 
-    return edge_data
+
+async def _merge_nodes_and_edges_then_upsert(
+    all_nodes: dict[str, list[dict]],
+    all_edges: dict[tuple[str, str], list[dict]],
+    knowledge_graph_inst: BaseGraphStorage,
+    global_config: dict,
+    merge_semaphore: asyncio.Semaphore,
+    keyed_lock: KeyedLock,
+    pipeline_status: dict = None,
+    pipeline_status_lock=None,
+    llm_response_cache: BaseKVStorage | None = None,
+) -> None:
+    """Merge a batch of extracted entities and relations into the knowledge graph.
+
+    Existing nodes and edges are fetched with one batched read each, merged
+    concurrently (bounded by merge_semaphore), then written back with one batched
+    upsert for nodes and one for edges. Edge endpoints that don't exist yet are
+    created as UNKNOWN entities.
+
+    The locks of every entity and relation of the batch are held from the read to
+    the write, so batches of documents processed at the same time only wait for
+    each other when they share entities or relations.
+    """
+    endpoint_ids = {node_id for edge_key in all_edges for node_id in edge_key}
+    async with keyed_lock.lock(*(all_nodes.keys() | endpoint_ids), *all_edges):
+        already_nodes, already_edges = await asyncio.gather(
+            knowledge_graph_inst.get_nodes_batch(list(all_nodes.keys() | endpoint_ids)),
+            knowledge_graph_inst.get_edges_batch(list(all_edges)),
+        )
+
+        async def _merge_node(entity_name: str, nodes_data: list[dict]):
+            async with merge_semaphore:
+                return await _merge_nodes(
+                    entity_name,
+                    nodes_data,
+                    already_nodes.get(entity_name),
+                    global_config,
+                    pipeline_status,
+                    pipeline_status_lock,
+                    llm_response_cache,
+                )
+
+        async def _merge_edge(edge_key: tuple[str, str], edges_data: list[dict]):
+            async with merge_semaphore:
+                return await _merge_edges(
+                    edge_key[0],
+                    edge_key[1],
+                    edges_data,
+                    already_edges.get(edge_key),
+                    global_config,
+                    pipeline_status,
+                    pipeline_status_lock,
+                    llm_response_cache,
+                )
+
+        # Nothing is written until all merges are done, so entities and relations
+        # can be merged at the same time
+        merged_nodes, merged_edges = await asyncio.gather(
+            asyncio.gather(*[_merge_node(k, v) for k, v in all_nodes.items()]),
+            asyncio.gather(*[_merge_edge(k, v) for k, v in all_edges.items()]),
+        )
+        nodes_to_upsert = dict(zip(all_nodes, merged_nodes))
+        edges_to_upsert = dict(zip(all_edges, merged_edges))
+
+        for (src_id, tgt_id), edge_data in edges_to_upsert.items():
+            for need_insert_id in [src_id, tgt_id]:
+                if need_insert_id in already_nodes or need_insert_id in nodes_to_upsert:
+                    continue
+                nodes_to_upsert[need_insert_id] = {
+                    "entity_id": need_insert_id,
+                    "source_id": edge_data["source_id"],
+                    "description": edge_data["description"],
+                    "entity_type": "UNKNOWN",
+                    "file_path": edge_data["file_path"],
+                }
+
+        # Nodes first, edges need both of their endpoints to exist
+        await knowledge_graph_inst.upsert_nodes_batch(nodes_to_upsert)
+        await knowledge_graph_inst.upsert_edges_batch(edges_to_upsert)
 
 
 async def extract_entities(
@@ -476,6 +569,7 @@ async def extract_entities(
     pipeline_status: dict = None,
     pipeline_status_lock=None,
     llm_response_cache: BaseKVStorage | None = None,
+    keyed_lock: KeyedLock | None = None,
 ) -> None:
     use_llm_func: callable = global_config["llm_model_func"]
     entity_extract_max_gleaning = global_config["entity_extract_max_gleaning"]
@@ -521,13 +615,20 @@ async def extract_entities(
 
     processed_chunks = 0
     total_chunks = len(ordered_chunks)
-    total_entities_count = 0
-    total_relations_count = 0
+    # Entities and relations can recur in several merge batches, count them once
+    extracted_entities: set[str] = set()
+    extracted_relations: set[tuple[str, str]] = set()
 
-    # Get lock manager from shared storage
-    from .kg.shared_storage import get_graph_db_lock
+    # Merges of one process are isolated from each other and from the entity
+    # edit helpers of utils_graph by the per key locks, the graph database lock
+    # is only needed to isolate them from other processes
+    from .kg.shared_storage import get_graph_db_lock, is_multiprocess
 
-    graph_db_lock = get_graph_db_lock(enable_logging=False)
+    graph_db_lock = (
+        get_graph_db_lock(enable_logging=False)
+        if is_multiprocess()
+        else UnlimitedSemaphore()
+    )
 
     # Use the global use_llm_func_with_cache function from utils.py
 
@@ -665,90 +766,143 @@ async def extract_entities(
         # Return the extracted nodes and edges for centralized processing
         return maybe_nodes, maybe_edges
 
-    # Handle all chunks in parallel and collect results
-    tasks = [_process_single_content(c) for c in ordered_chunks]
-    chunk_results = await asyncio.gather(*tasks)
-
-    # Collect all nodes and edges from all chunks
-    all_nodes = defaultdict(list)
-    all_edges = defaultdict(list)
-
-    for maybe_nodes, maybe_edges in chunk_results:
-        # Collect nodes
-        for entity_name, entities in maybe_nodes.items():
-            all_nodes[entity_name].extend(entities)
-
-        # Collect edges with sorted keys for undirected graph
-        for edge_key, edges in maybe_edges.items():
-            sorted_edge_key = tuple(sorted(edge_key))
-            all_edges[sorted_edge_key].extend(edges)
-
-    # Centralized processing of all nodes and edges
-    entities_data = []
-    relationships_data = []
-
-    # Use graph database lock to ensure atomic merges and updates
-    async with graph_db_lock:
-        # Process and update all entities at once
-        for entity_name, entities in all_nodes.items():
-            entity_data = await _merge_nodes_then_upsert(
-                entity_name,
-                entities,
-                knowledge_graph_inst,
-                global_config,
-                pipeline_status,
-                pipeline_status_lock,
-                llm_response_cache,
-            )
-            entities_data.append(entity_data)
-
-        # Process and update all relationships at once
-        for edge_key, edges in all_edges.items():
-            edge_data = await _merge_edges_then_upsert(
-                edge_key[0],
-                edge_key[1],
-                edges,
-                knowledge_graph_inst,
-                global_config,
-                pipeline_status,
-                pipeline_status_lock,
-                llm_response_cache,
+    # Extraction workers -> merge stage -> VDB upsert stage, connected by bounded
+    # queues so merges and embeddings overlap with the remaining LLM extraction
+    # and only a bounded number of chunk results is held in memory at a time
+    queue_size = max(1, global_config.get("extract_pipeline_queue_size", 16))
+    extract_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    vdb_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    pending_chunks = iter(ordered_chunks)
+    num_workers = max(1, min(total_chunks, global_config["llm_model_max_async"]))
+
+    # Bounded concurrency for the merge phase; the per entity / per edge locks
+    # are shared with the other documents processed at the same time
+    merge_semaphore = asyncio.Semaphore(max(1, global_config["max_parallel_merge"]))
+    if keyed_lock is None:
+        keyed_lock = KeyedLock()
+
+    async def _extraction_worker():
+        # Workers share one iterator, so every chunk is extracted exactly once
+        for chunk_key_dp in pending_chunks:
+            # Lowest LLM priority, interactive queries go first
+            with llm_priority("extract"):
+                chunk_result = await _process_single_content(chunk_key_dp)
+            await extract_queue.put(chunk_result)
+
+    async def _extraction_stage():
+        try:
+            await asyncio.gather(*[_extraction_worker() for _ in range(num_workers)])
+        finally:
+            await extract_queue.put(None)
+
+    async def _merge_stage():
+        extraction_done = False
+        while not extraction_done:
+            # Wait for one chunk result, then take whatever else is already queued
+            chunk_results = []
+            item = await extract_queue.get()
+            while item is not None:
+                chunk_results.append(item)
+                if extract_queue.empty() or len(chunk_results) >= queue_size:
+                    break
+                item = extract_queue.get_nowait()
+            extraction_done = item is None
+            if not chunk_results:
+                continue
+
+            # Collect all nodes and edges from the chunks of this batch
+            all_nodes = defaultdict(list)
+            all_edges = defaultdict(list)
+
+            for maybe_nodes, maybe_edges in chunk_results:
+                # Collect nodes
+                for entity_name, entities in maybe_nodes.items():
+                    all_nodes[entity_name].extend(entities)
+
+                # Collect edges with sorted keys for undirected graph
+                for edge_key, edges in maybe_edges.items():
+                    sorted_edge_key = tuple(sorted(edge_key))
+                    all_edges[sorted_edge_key].extend(edges)
+
+            # Isolate the merge from other processes writing to the graph
+            async with graph_db_lock:
+                await _merge_nodes_and_edges_then_upsert(
+                    all_nodes,
+                    all_edges,
+                    knowledge_graph_inst,
+                    global_config,
+                    merge_semaphore,
+                    keyed_lock,
+                    pipeline_status,
+                    pipeline_status_lock,
+                    llm_response_cache,
+                )
+
+            extracted_entities.update(all_nodes)
+            extracted_relations.update(all_edges)
+            await vdb_queue.put((list(all_nodes), list(all_edges)))
+
+        await vdb_queue.put(None)
+
+    async def _vdb_upsert_stage():
+        while (item := await vdb_queue.get()) is not None:
+            entity_names, edge_keys = item
+            endpoint_ids = {node_id for edge_key in edge_keys for node_id in edge_key}
+
+            # Embed the current graph state of the batch with its keys locked: a
+            # later merge of the same keys may have been embedded first, and
+            # entities deleted or edited since the merge must not be overwritten
+            batch_locks = keyed_lock.lock(
+                *(set(entity_names) | endpoint_ids), *edge_keys
             )
-            relationships_data.append(edge_data)
-
-        # Update vector databases with all collected data
-        if entity_vdb is not None and entities_data:
-            data_for_vdb = {
-                compute_mdhash_id(dp["entity_name"], prefix="ent-"): {
-                    "entity_name": dp["entity_name"],
-                    "entity_type": dp["entity_type"],
-                    "content": f"{dp['entity_name']}\n{dp['description']}",
-                    "source_id": dp["source_id"],
-                    "file_path": dp.get("file_path", "unknown_source"),
-                }
-                for dp in entities_data
-            }
-            await entity_vdb.upsert(data_for_vdb)
-
-        if relationships_vdb is not None and relationships_data:
-            data_for_vdb = {
-                compute_mdhash_id(dp["src_id"] + dp["tgt_id"], prefix="rel-"): {
-                    "src_id": dp["src_id"],
-                    "tgt_id": dp["tgt_id"],
-                    "keywords": dp["keywords"],
-                    "content": f"{dp['src_id']}\t{dp['tgt_id']}\n{dp['keywords']}\n{dp['description']}",
-                    "source_id": dp["source_id"],
-                    "file_path": dp.get("file_path", "unknown_source"),
-                }
-                for dp in relationships_data
-            }
-            await relationships_vdb.upsert(data_for_vdb)
+            async with graph_db_lock, batch_locks:
+                nodes, edges = await asyncio.gather(
+                    knowledge_graph_inst.get_nodes_batch(entity_names),
+                    knowledge_graph_inst.get_edges_batch(edge_keys),
+                )
 
-    # Update total counts
-    total_entities_count = len(entities_data)
-    total_relations_count = len(relationships_data)
+                if entity_vdb is not None and nodes:
+                    data_for_vdb = {
+                        compute_mdhash_id(entity_name, prefix="ent-"): {
+                            "entity_name": entity_name,
+                            "entity_type": dp["entity_type"],
+                            "content": f"{entity_name}\n{dp['description']}",
+                            "source_id": dp["source_id"],
+                            "file_path": dp.get("file_path", "unknown_source"),
+                        }
+                        for entity_name, dp in nodes.items()
+                    }
+                    await entity_vdb.upsert(data_for_vdb)
+
+                if relationships_vdb is not None and edges:
+                    data_for_vdb = {
+                        compute_mdhash_id(src_id + tgt_id, prefix="rel-"): {
+                            "src_id": src_id,
+                            "tgt_id": tgt_id,
+                            "keywords": dp["keywords"],
+                            "content": f"{src_id}\t{tgt_id}\n{dp['keywords']}\n{dp['description']}",
+                            "source_id": dp["source_id"],
+                            "file_path": dp.get("file_path", "unknown_source"),
+                        }
+                        for (src_id, tgt_id), dp in edges.items()
+                    }
+                    await relationships_vdb.upsert(data_for_vdb)
 
-    log_message = f"Extracted {total_entities_count} entities + {total_relations_count} relationships (total)"
+    stages = [
+        asyncio.create_task(_extraction_stage()),
+        asyncio.create_task(_merge_stage()),
+        asyncio.create_task(_vdb_upsert_stage()),
+    ]
+    try:
+        await asyncio.gather(*stages)
+    except BaseException:
+        # A failed stage would leave the others blocked on their queues
+        for stage in stages:
+            stage.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+        raise
+
+    log_message = f"Extracted {len(extracted_entities)} entities + {len(extracted_relations)} relationships (total)"
     logger.info(log_message)
     if pipeline_status is not None:
         async with pipeline_status_lock:
@@ -774,10 +928,13 @@ async def kg_query(
         else global_config["llm_model_func"]
     )
     args_hash = compute_args_hash(query_param.mode, query, cache_type="query")
-    cached_response, quantized, min_val, max_val = await handle_cache(
-        hashing_kv, args_hash, query, query_param.mode, cache_type="query"
-    )
+    with trace_span("cache_lookup"):
+        cached_response, quantized, min_val, max_val = await handle_cache(
+            hashing_kv, args_hash, query, query_param.mode, cache_type="query"
+        )
     if cached_response is not None:
+        if query_param.stream:
+            return stream_cached_response(cached_response)
         return cached_response
 
     hl_keywords, ll_keywords = await get_keywords_from_query(
@@ -823,27 +980,30 @@ async def kg_query(
     if context is None:
         return PROMPTS["fail_response"]
 
-    # Process conversation history
-    history_context = ""
-    if query_param.conversation_history:
-        history_context = get_conversation_turns(
-            query_param.conversation_history, query_param.history_turns
-        )
+    with trace_span("prompt_build"):
+        # Process conversation history
+        history_context = ""
+        if query_param.conversation_history:
+            history_context = get_conversation_turns(
+                query_param.conversation_history, query_param.history_turns
+            )
 
-    sys_prompt_temp = system_prompt if system_prompt else PROMPTS["rag_response"]
-    sys_prompt = sys_prompt_temp.format(
-        context_data=context,
-        response_type=query_param.response_type,
-        history=history_context,
-    )
+        sys_prompt_temp = system_prompt if system_prompt else PROMPTS["rag_response"]
+        sys_prompt = sys_prompt_temp.format(
+            context_data=context,
+            response_type=query_param.response_type,
+            history=history_context,
+        )
 
     if query_param.only_need_prompt:
         return sys_prompt
 
-    len_of_prompts = len(encode_string_by_tiktoken(query + sys_prompt))
-    logger.debug(f"[kg_query]Prompt Tokens: {len_of_prompts}")
+    if logger.isEnabledFor(logging.DEBUG):
+        len_of_prompts = count_tokens(query + sys_prompt)
+        logger.debug(f"[kg_query]Prompt Tokens: {len_of_prompts}")
 
-    response = await use_model_func(
+    response = await trace_llm_call(
+        use_model_func,
         query,
         system_prompt=sys_prompt,
         stream=query_param.stream,
@@ -860,19 +1020,19 @@ async def kg_query(
         )
 
     # Save to cache
-    await save_to_cache(
-        hashing_kv,
-        CacheData(
-            args_hash=args_hash,
-            content=response,
-            prompt=query,
-            quantized=quantized,
-            min_val=min_val,
-            max_val=max_val,
-            mode=query_param.mode,
-            cache_type="query",
-        ),
-    )
+    cache_data = CacheData(
+        args_hash=args_hash,
+        content=response,
+        prompt=query,
+        quantized=quantized,
+        min_val=min_val,
+        max_val=max_val,
+        mode=query_param.mode,
+        cache_type="query",
+    )
+    if hasattr(response, "__aiter__"):
+        return cache_streamed_response(response, hashing_kv, cache_data)
+    await save_to_cache(hashing_kv, cache_data)
     return response
 
 
@@ -902,9 +1062,10 @@ async def get_keywords_from_query(
         return query_param.hl_keywords, query_param.ll_keywords
 
     # Extract keywords using extract_keywords_only function which already supports conversation history
-    hl_keywords, ll_keywords = await extract_keywords_only(
-        query, query_param, global_config, hashing_kv
-    )
+    with trace_span("keywords"):
+        hl_keywords, ll_keywords = await extract_keywords_only(
+            query, query_param, global_config, hashing_kv
+        )
     return hl_keywords, ll_keywords
 
 
@@ -960,14 +1121,16 @@ async def extract_keywords_only(
         query=text, examples=examples, language=language, history=history_context
     )
 
-    len_of_prompts = len(encode_string_by_tiktoken(kw_prompt))
-    logger.debug(f"[kg_query]Prompt Tokens: {len_of_prompts}")
+    if logger.isEnabledFor(logging.DEBUG):
+        len_of_prompts = count_tokens(kw_prompt)
+        logger.debug(f"[kg_query]Prompt Tokens: {len_of_prompts}")
 
     # 5. Call the LLM for keyword extraction
     use_model_func = (
         param.model_func if param.model_func else global_config["llm_model_func"]
     )
-    result = await use_model_func(kw_prompt, keyword_extraction=True)
+    with llm_priority("keywords"):
+        result = await use_model_func(kw_prompt, keyword_extraction=True)
 
     # 6. Parse out JSON from the LLM response
     match = re.search(r"\{.*\}", result, re.DOTALL)
@@ -1032,10 +1195,13 @@ async def mix_kg_vector_query(
         else global_config["llm_model_func"]
     )
     args_hash = compute_args_hash("mix", query, cache_type="query")
-    cached_response, quantized, min_val, max_val = await handle_cache(
-        hashing_kv, args_hash, query, "mix", cache_type="query"
-    )
+    with trace_span("cache_lookup"):
+        cached_response, quantized, min_val, max_val = await handle_cache(
+            hashing_kv, args_hash, query, "mix", cache_type="query"
+        )
     if cached_response is not None:
+        if query_param.stream:
+            return stream_cached_response(cached_response)
         return cached_response
 
     # Process conversation history
@@ -1045,9 +1211,27 @@ async def mix_kg_vector_query(
             query_param.conversation_history, query_param.history_turns
         )
 
+    # Answers built without the keyword context are not cached, so the next
+    # identical query (or a non-speculative one) gets the refined context
+    cache_answer = True
+
     # 2. Execute knowledge graph and vector searches in parallel
     async def get_kg_context():
+        nonlocal cache_answer
         try:
+            if query_param.speculative_retrieval:
+                context, cache_answer = await _get_speculative_kg_context(
+                    query,
+                    knowledge_graph_inst,
+                    entities_vdb,
+                    relationships_vdb,
+                    text_chunks_db,
+                    query_param,
+                    global_config,
+                    hashing_kv,
+                )
+                return context
+
             hl_keywords, ll_keywords = await get_keywords_from_query(
                 query, query_param, global_config, hashing_kv
             )
@@ -1097,14 +1281,16 @@ async def mix_kg_vector_query(
         try:
             # Reduce top_k for vector search in hybrid mode since we have structured information from KG
             mix_topk = min(10, query_param.top_k)
-            results = await chunks_vdb.query(
-                augmented_query, top_k=mix_topk, ids=query_param.ids
-            )
+            with trace_span("chunks_search"):
+                results = await chunks_vdb.query(
+                    augmented_query, top_k=mix_topk, ids=query_param.ids
+                )
             if not results:
                 return None
 
             chunks_ids = [r["id"] for r in results]
-            chunks = await text_chunks_db.get_by_ids(chunks_ids)
+            with trace_span("chunks_fetch"):
+                chunks = await text_chunks_db.get_by_ids(chunks_ids)
 
             valid_chunks = []
             for chunk, result in zip(chunks, results):
@@ -1112,6 +1298,7 @@ async def mix_kg_vector_query(
                     # Merge chunk content and time metadata
                     chunk_with_time = {
                         "content": chunk["content"],
+                        "tokens": chunk.get("tokens"),
                         "created_at": result.get("created_at", None),
                         "file_path": result.get("file_path", None),
                     }
@@ -1124,6 +1311,7 @@ async def mix_kg_vector_query(
                 valid_chunks,
                 key=lambda x: x["content"],
                 max_token_size=query_param.max_token_for_text_unit,
+                token_count=lambda x: x["tokens"],
             )
 
             if not maybe_trun_chunks:
@@ -1165,29 +1353,32 @@ async def mix_kg_vector_query(
         return context_str
 
     # 5. Construct hybrid prompt
-    sys_prompt = (
-        system_prompt
-        if system_prompt
-        else PROMPTS["mix_rag_response"].format(
-            kg_context=kg_context
-            if kg_context
-            else "No relevant knowledge graph information found",
-            vector_context=vector_context
-            if vector_context
-            else "No relevant text information found",
-            response_type=query_param.response_type,
-            history=history_context,
+    with trace_span("prompt_build"):
+        sys_prompt = (
+            system_prompt
+            if system_prompt
+            else PROMPTS["mix_rag_response"].format(
+                kg_context=kg_context
+                if kg_context
+                else "No relevant knowledge graph information found",
+                vector_context=vector_context
+                if vector_context
+                else "No relevant text information found",
+                response_type=query_param.response_type,
+                history=history_context,
+            )
         )
-    )
 
     if query_param.only_need_prompt:
         return sys_prompt
 
-    len_of_prompts = len(encode_string_by_tiktoken(query + sys_prompt))
-    logger.debug(f"[mix_kg_vector_query]Prompt Tokens: {len_of_prompts}")
+    if logger.isEnabledFor(logging.DEBUG):
+        len_of_prompts = count_tokens(query + sys_prompt)
+        logger.debug(f"[mix_kg_vector_query]Prompt Tokens: {len_of_prompts}")
 
     # 6. Generate response
-    response = await use_model_func(
+    response = await trace_llm_call(
+        use_model_func,
         query,
         system_prompt=sys_prompt,
         stream=query_param.stream,
@@ -1206,11 +1397,27 @@ async def mix_kg_vector_query(
         )
 
         # 7. Save cache - Only cache after collecting complete response
-        await save_to_cache(
+        if cache_answer:
+            await save_to_cache(
+                hashing_kv,
+                CacheData(
+                    args_hash=args_hash,
+                    content=response,
+                    prompt=query,
+                    quantized=quantized,
+                    min_val=min_val,
+                    max_val=max_val,
+                    mode="mix",
+                    cache_type="query",
+                ),
+            )
+    elif cache_answer and hasattr(response, "__aiter__"):
+        response = cache_streamed_response(
+            response,
             hashing_kv,
             CacheData(
                 args_hash=args_hash,
-                content=response,
+                content="",
                 prompt=query,
                 quantized=quantized,
                 min_val=min_val,
@@ -1223,6 +1430,91 @@ async def mix_kg_vector_query(
     return response
 
 
+async def _get_speculative_kg_context(
+    query: str,
+    knowledge_graph_inst: BaseGraphStorage,
+    entities_vdb: BaseVectorStorage,
+    relationships_vdb: BaseVectorStorage,
+    text_chunks_db: BaseKVStorage,
+    query_param: QueryParam,
+    global_config: dict[str, str],
+    hashing_kv: BaseKVStorage | None = None,
+) -> tuple[str | None, bool]:
+    """Knowledge graph context for mix mode that does not wait for keyword extraction
+
+    Entities and relations are retrieved for the raw query while the keywords
+    are extracted. The extraction is then awaited for at most
+    query_param.speculative_keyword_timeout seconds, and the keyword results
+    are ranked in front of the raw query results. If the timeout expires, the
+    extraction is cancelled and the raw query context is used alone.
+
+    Returns:
+        The context, and whether it includes the keyword context. Answers built
+        from the raw query context alone should not be cached.
+    """
+    keywords_task = asyncio.create_task(
+        get_keywords_from_query(query, query_param, global_config, hashing_kv)
+    )
+    try:
+        raw_records = await _get_query_context_records(
+            query,
+            query,
+            knowledge_graph_inst,
+            entities_vdb,
+            relationships_vdb,
+            text_chunks_db,
+            replace(query_param, mode="hybrid"),
+        )
+    except BaseException:
+        keywords_task.cancel()
+        raise
+
+    try:
+        done, _ = await asyncio.wait(
+            {keywords_task}, timeout=query_param.speculative_keyword_timeout
+        )
+    finally:
+        if not keywords_task.done():
+            keywords_task.cancel()
+    if not done:
+        logger.warning(
+            f"Keywords not ready after {query_param.speculative_keyword_timeout}s, "
+            "using the raw query context"
+        )
+        return _render_query_context(*raw_records), False
+
+    try:
+        hl_keywords, ll_keywords = keywords_task.result()
+    except Exception as e:
+        logger.warning(f"Keyword extraction failed, using the raw query context: {e}")
+        return _render_query_context(*raw_records), False
+
+    ll_keywords_str = ", ".join(ll_keywords)
+    hl_keywords_str = ", ".join(hl_keywords)
+    if not ll_keywords_str and not hl_keywords_str:
+        return _render_query_context(*raw_records), False
+    elif not ll_keywords_str:
+        mode = "global"
+    elif not hl_keywords_str:
+        mode = "local"
+    else:
+        mode = "hybrid"
+
+    keyword_records = await _get_query_context_records(
+        ll_keywords_str,
+        hl_keywords_str,
+        knowledge_graph_inst,
+        entities_vdb,
+        relationships_vdb,
+        text_chunks_db,
+        replace(query_param, mode=mode),
+    )
+    return (
+        _render_query_context(*_merge_context_records(keyword_records, raw_records)),
+        True,
+    )
+
+
 async def _build_query_context(
     ll_keywords: str,
     hl_keywords: str,
@@ -1233,8 +1525,32 @@ async def _build_query_context(
     query_param: QueryParam,
 ):
     logger.info(f"Process {os.getpid()} buidling query context...")
+    with trace_span("context"):
+        records = await _get_query_context_records(
+            ll_keywords,
+            hl_keywords,
+            knowledge_graph_inst,
+            entities_vdb,
+            relationships_vdb,
+            text_chunks_db,
+            query_param,
+        )
+        with trace_span("context_render"):
+            return _render_query_context(*records)
+
+
+async def _get_query_context_records(
+    ll_keywords: str,
+    hl_keywords: str,
+    knowledge_graph_inst: BaseGraphStorage,
+    entities_vdb: BaseVectorStorage,
+    relationships_vdb: BaseVectorStorage,
+    text_chunks_db: BaseKVStorage,
+    query_param: QueryParam,
+) -> tuple[list[dict], list[dict], list[dict]]:
+    """Entity, relation and text unit records of the query context"""
     if query_param.mode == "local":
-        entities_context, relations_context, text_units_context = await _get_node_data(
+        entities, relations, text_units = await _get_node_data(
             ll_keywords,
             knowledge_graph_inst,
             entities_vdb,
@@ -1242,7 +1558,7 @@ async def _build_query_context(
             query_param,
         )
     elif query_param.mode == "global":
-        entities_context, relations_context, text_units_context = await _get_edge_data(
+        entities, relations, text_units = await _get_edge_data(
             hl_keywords,
             knowledge_graph_inst,
             relationships_vdb,
@@ -1267,27 +1583,39 @@ async def _build_query_context(
             ),
         )
 
-        (
-            ll_entities_context,
-            ll_relations_context,
-            ll_text_units_context,
-        ) = ll_data
+        return _merge_context_records(hl_data, ll_data)
+    return entities, relations, text_units
 
-        (
-            hl_entities_context,
-            hl_relations_context,
-            hl_text_units_context,
-        ) = hl_data
 
-        entities_context, relations_context, text_units_context = combine_contexts(
-            [hl_entities_context, ll_entities_context],
-            [hl_relations_context, ll_relations_context],
-            [hl_text_units_context, ll_text_units_context],
-        )
+def _merge_context_records(
+    *record_sets: tuple[list[dict], list[dict], list[dict]],
+) -> tuple[list[dict], list[dict], list[dict]]:
+    """Merge (entities, relations, text units) record sets, earlier sets first"""
+    entities = _merge_records(
+        *(records[0] for records in record_sets), key=lambda r: r["entity"]
+    )
+    relations = _merge_records(
+        *(records[1] for records in record_sets),
+        key=lambda r: tuple(sorted((r["source"], r["target"]))),
+    )
+    text_units = _merge_records(
+        *(records[2] for records in record_sets),
+        key=lambda r: r["chunk_id"] or r["content"],
+    )
+    return entities, relations, text_units
+
+
+def _render_query_context(
+    entities: list[dict], relations: list[dict], text_units: list[dict]
+) -> str | None:
     # not necessary to use LLM to generate a response
-    if not entities_context.strip() and not relations_context.strip():
+    if not entities and not relations:
         return None
 
+    entities_context = _records_to_csv(entities, _ENTITY_COLUMNS)
+    relations_context = _records_to_csv(relations, _RELATION_COLUMNS)
+    text_units_context = _records_to_csv(text_units, _TEXT_UNIT_COLUMNS)
+
     result = f"""
     -----Entities-----
     ```csv
@@ -1305,6 +1633,117 @@ async def _build_query_context(
     return result
 
 
+def _fuse_search_results(
+    result_lists: list[list[dict]], top_k: int, key: Callable[[dict], Any], k: int = 60
+) -> list[dict]:
+    """Merge ranked result lists by reciprocal rank fusion: score(r) = sum 1 / (k + rank)"""
+    scores: dict[Any, float] = defaultdict(float)
+    first_seen: dict[Any, dict] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            result_key = key(result)
+            scores[result_key] += 1 / (k + rank + 1)
+            first_seen.setdefault(result_key, result)
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    return [first_seen[result_key] for result_key in ranked[:top_k]]
+
+
+async def _search_keywords(
+    vdb: BaseVectorStorage,
+    keywords: str,
+    query_param: QueryParam,
+    key: Callable[[dict], Any],
+) -> list[dict]:
+    """Vector search for the comma separated keywords of a query
+
+    With query_param.per_keyword_search, every keyword and the joined keywords
+    are searched in one query_batch call and the result lists are fused.
+    """
+    keyword_list = [kw.strip() for kw in keywords.split(",") if kw.strip()]
+    if not query_param.per_keyword_search or len(keyword_list) < 2:
+        return await vdb.query(keywords, top_k=query_param.top_k, ids=query_param.ids)
+
+    result_lists = await vdb.query_batch(
+        [keywords, *keyword_list], top_k=query_param.top_k, ids=query_param.ids
+    )
+    return _fuse_search_results(result_lists, query_param.top_k, key)
+
+
+_ENTITY_COLUMNS = ("entity", "type", "description", "rank", "created_at", "file_path")
+_RELATION_COLUMNS = (
+    "source",
+    "target",
+    "description",
+    "keywords",
+    "weight",
+    "rank",
+    "created_at",
+    "file_path",
+)
+_TEXT_UNIT_COLUMNS = ("content", "file_path")
+
+
+def _readable_time(created_at: Any) -> Any:
+    if isinstance(created_at, (int, float)):
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created_at))
+    return created_at
+
+
+def _entity_record(node: dict, unknown_time: str) -> dict[str, Any]:
+    return {
+        "entity": node["entity_name"],
+        "type": node.get("entity_type", "UNKNOWN"),
+        "description": node.get("description", "UNKNOWN"),
+        "rank": node["rank"],
+        "created_at": _readable_time(node.get("created_at", unknown_time)),
+        "file_path": node.get("file_path", "unknown_source"),
+    }
+
+
+def _relation_record(
+    edge: dict, source: str, target: str, unknown_time: str
+) -> dict[str, Any]:
+    return {
+        "source": source,
+        "target": target,
+        "description": edge["description"],
+        "keywords": edge["keywords"],
+        "weight": edge["weight"],
+        "rank": edge["rank"],
+        "created_at": _readable_time(edge.get("created_at", unknown_time)),
+        "file_path": edge.get("file_path", "unknown_source"),
+    }
+
+
+def _text_unit_record(chunk: dict, unknown_path: str) -> dict[str, Any]:
+    return {
+        "chunk_id": chunk.get("id"),
+        "content": chunk["content"],
+        "file_path": chunk.get("file_path", unknown_path),
+    }
+
+
+def _merge_records(*record_lists: list[dict], key: Callable[[dict], Any]) -> list[dict]:
+    """Concatenate record lists, keeping the first record of each key"""
+    merged = []
+    seen = set()
+    for records in record_lists:
+        for record in records:
+            k = key(record)
+            if k not in seen:
+                seen.add(k)
+                merged.append(record)
+    return merged
+
+
+def _records_to_csv(records: list[dict], columns: tuple[str, ...]) -> str:
+    """Render context records as a CSV table with a leading id column"""
+    return list_of_list_to_csv(
+        [["id", *columns]]
+        + [[i, *(record[c] for c in columns)] for i, record in enumerate(records)]
+    )
+
+
 async def _get_node_data(
     query: str,
     knowledge_graph_inst: BaseGraphStorage,
@@ -1317,29 +1756,28 @@ async def _get_node_data(
         f"Query nodes: {query}, top_k: {query_param.top_k}, cosine: {entities_vdb.cosine_better_than_threshold}"
     )
 
-    results = await entities_vdb.query(
-        query, top_k=query_param.top_k, ids=query_param.ids
-    )
+    with trace_span("entities_search"):
+        results = await _search_keywords(
+            entities_vdb, query, query_param, key=lambda r: r["entity_name"]
+        )
 
     if not len(results):
-        return "", "", ""
+        return [], [], []
     # get entity information
-    node_datas, node_degrees = await asyncio.gather(
-        asyncio.gather(
-            *[knowledge_graph_inst.get_node(r["entity_name"]) for r in results]
-        ),
-        asyncio.gather(
-            *[knowledge_graph_inst.node_degree(r["entity_name"]) for r in results]
-        ),
-    )
+    entity_names = [r["entity_name"] for r in results]
+    with trace_span("graph_fetch"):
+        nodes_dict, degrees_dict = await asyncio.gather(
+            knowledge_graph_inst.get_nodes_batch(entity_names),
+            knowledge_graph_inst.node_degrees_batch(entity_names),
+        )
 
-    if not all([n is not None for n in node_datas]):
+    if not all(name in nodes_dict for name in entity_names):
         logger.warning("Some nodes are missing, maybe the storage is damaged")
 
     node_datas = [
-        {**n, "entity_name": k["entity_name"], "rank": d}
-        for k, n, d in zip(results, node_datas, node_degrees)
-        if n is not None
+        {**nodes_dict[name], "entity_name": name, "rank": degrees_dict.get(name, 0)}
+        for name in entity_names
+        if name in nodes_dict
     ]  # what is this text_chunks_db doing.  dont remember it in airvx.  check the diagram.
     # get entitytext chunk
     use_text_units, use_relations = await asyncio.gather(
@@ -1365,83 +1803,42 @@ async def _get_node_data(
         f"Local query uses {len(node_datas)} entites, {len(use_relations)} relations, {len(use_text_units)} chunks"
     )
 
-    # build prompt
-    entites_section_list = [
-        [
-            "id",
-            "entity",
-            "type",
-            "description",
-            "rank",
-            "created_at",
-            "file_path",
-        ]
+    entities = [_entity_record(n, "UNKNOWN") for n in node_datas]
+    relations = [
+        _relation_record(e, e["src_tgt"][0], e["src_tgt"][1], "UNKNOWN")
+        for e in use_relations
     ]
-    for i, n in enumerate(node_datas):
-        created_at = n.get("created_at", "UNKNOWN")
-        if isinstance(created_at, (int, float)):
-            created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created_at))
-
-        # Get file path from node data
-        file_path = n.get("file_path", "unknown_source")
-
-        entites_section_list.append(
-            [
-                i,
-                n["entity_name"],
-                n.get("entity_type", "UNKNOWN"),
-                n.get("description", "UNKNOWN"),
-                n["rank"],
-                created_at,
-                file_path,
-            ]
-        )
-    entities_context = list_of_list_to_csv(entites_section_list)
+    text_units = [_text_unit_record(t, "unknown_source") for t in use_text_units]
+    return entities, relations, text_units
 
-    relations_section_list = [
-        [
-            "id",
-            "source",
-            "target",
-            "description",
-            "keywords",
-            "weight",
-            "rank",
-            "created_at",
-            "file_path",
-        ]
+
+async def _get_text_chunks(
+    text_chunks_db: BaseKVStorage, chunk_ids: list[str]
+) -> dict[str, dict]:
+    """Fetch chunks with bulk get_by_ids calls and return the valid ones by id
+
+    Some backends return only the rows they found, in their own order, so
+    records carrying an id are matched by it and the rest by position.
+    """
+    batch_size = max(1, text_chunks_db.global_config.get("chunk_fetch_batch_size", 500))
+    batches = [
+        chunk_ids[i : i + batch_size] for i in range(0, len(chunk_ids), batch_size)
     ]
-    for i, e in enumerate(use_relations):
-        created_at = e.get("created_at", "UNKNOWN")
-        # Convert timestamp to readable format
-        if isinstance(created_at, (int, float)):
-            created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created_at))
-
-        # Get file path from edge data
-        file_path = e.get("file_path", "unknown_source")
-
-        relations_section_list.append(
-            [
-                i,
-                e["src_tgt"][0],
-                e["src_tgt"][1],
-                e["description"],
-                e["keywords"],
-                e["weight"],
-                e["rank"],
-                created_at,
-                file_path,
-            ]
+    with trace_span("chunks_fetch"):
+        results = await asyncio.gather(
+            *[text_chunks_db.get_by_ids(batch) for batch in batches]
         )
-    relations_context = list_of_list_to_csv(relations_section_list)
 
-    text_units_section_list = [["id", "content", "file_path"]]
-    for i, t in enumerate(use_text_units):
-        text_units_section_list.append(
-            [i, t["content"], t.get("file_path", "unknown_source")]
-        )
-    text_units_context = list_of_list_to_csv(text_units_section_list)
-    return entities_context, relations_context, text_units_context
+    chunks = {}
+    for batch, records in zip(batches, results):
+        for position, data in enumerate(records):
+            if data is None or "content" not in data:
+                continue
+            chunk_id = data.get("id", data.get("_id"))
+            if chunk_id is None:
+                chunk_id = batch[position]
+            chunks[str(chunk_id)] = data
+    return chunks
 
 
 async def _find_most_related_text_unit_from_entities(
@@ -1455,48 +1852,43 @@ async def _find_most_related_text_unit_from_entities(
         for dp in node_datas
         if dp["source_id"] is not None
     ]
-    edges = await asyncio.gather(
-        *[knowledge_graph_inst.get_node_edges(dp["entity_name"]) for dp in node_datas]
-    )
+    with trace_span("graph_fetch"):
+        edges_dict = await knowledge_graph_inst.get_nodes_edges_batch(
+            [dp["entity_name"] for dp in node_datas]
+        )
+    edges = [edges_dict.get(dp["entity_name"], []) for dp in node_datas]
     all_one_hop_nodes = set()
     for this_edges in edges:
         if not this_edges:
             continue
         all_one_hop_nodes.update([e[1] for e in this_edges])
 
-    all_one_hop_nodes = list(all_one_hop_nodes)
-    all_one_hop_nodes_data = await asyncio.gather(
-        *[knowledge_graph_inst.get_node(e) for e in all_one_hop_nodes]
-    )
+    with trace_span("graph_fetch"):
+        all_one_hop_nodes_data = await knowledge_graph_inst.get_nodes_batch(
+            list(all_one_hop_nodes)
+        )
 
     # Add null check for node data
     all_one_hop_text_units_lookup = {
         k: set(split_string_by_multi_markers(v["source_id"], [GRAPH_FIELD_SEP]))
-        for k, v in zip(all_one_hop_nodes, all_one_hop_nodes_data)
+        for k, v in all_one_hop_nodes_data.items()
         if v is not None and "source_id" in v  # Add source_id check
     }
 
-    all_text_units_lookup = {}
-    tasks = []
-
+    # Each chunk is fetched once and keeps the order of the first entity citing it
+    tasks = {}
     for index, (this_text_units, this_edges) in enumerate(zip(text_units, edges)):
         for c_id in this_text_units:
-            if c_id not in all_text_units_lookup:
-                all_text_units_lookup[c_id] = index
-                tasks.append((c_id, index, this_edges))
-
-    # Process in batches of 25 tasks at a time to avoid overwhelming resources
-    batch_size = 5
-    results = []
+            if c_id not in tasks:
+                tasks[c_id] = (index, this_edges)
 
-    for i in range(0, len(tasks), batch_size):
-        batch_tasks = tasks[i : i + batch_size]
-        batch_results = await asyncio.gather(
-            *[text_chunks_db.get_by_id(c_id) for c_id, _, _ in batch_tasks]
-        )
-        results.extend(batch_results)
+    chunks = await _get_text_chunks(text_chunks_db, list(tasks))
 
-    for (c_id, index, this_edges), data in zip(tasks, results):
+    all_text_units_lookup = {}
+    for c_id, (index, this_edges) in tasks.items():
+        data = chunks.get(c_id)
+        if data is None:
+            continue
         all_text_units_lookup[c_id] = {
             "data": data,
             "order": index,
@@ -1530,13 +1922,14 @@ async def _find_most_related_text_unit_from_entities(
         all_text_units,
         key=lambda x: x["data"]["content"],
         max_token_size=query_param.max_token_for_text_unit,
+        token_count=lambda x: x["data"].get("tokens"),
     )
 
     logger.debug(
         f"Truncate chunks from {len(all_text_units_lookup)} to {len(all_text_units)} (max tokens:{query_param.max_token_for_text_unit})"
     )
 
-    all_text_units = [t["data"] for t in all_text_units]
+    all_text_units = [{**t["data"], "id": t["id"]} for t in all_text_units]
     return all_text_units
 
 
@@ -1545,29 +1938,29 @@ async def _find_most_related_edges_from_entities(
     query_param: QueryParam,
     knowledge_graph_inst: BaseGraphStorage,
 ):
-    all_related_edges = await asyncio.gather(
-        *[knowledge_graph_inst.get_node_edges(dp["entity_name"]) for dp in node_datas]
-    )
+    with trace_span("graph_fetch"):
+        all_related_edges = await knowledge_graph_inst.get_nodes_edges_batch(
+            [dp["entity_name"] for dp in node_datas]
+        )
     all_edges = []
     seen = set()
 
-    for this_edges in all_related_edges:
-        for e in this_edges:
+    for dp in node_datas:
+        for e in all_related_edges.get(dp["entity_name"], []):
             sorted_edge = tuple(sorted(e))
             if sorted_edge not in seen:
                 seen.add(sorted_edge)
                 all_edges.append(sorted_edge)
 
-    all_edges_pack, all_edges_degree = await asyncio.gather(
-        asyncio.gather(*[knowledge_graph_inst.get_edge(e[0], e[1]) for e in all_edges]),
-        asyncio.gather(
-            *[knowledge_graph_inst.edge_degree(e[0], e[1]) for e in all_edges]
-        ),
-    )
+    with trace_span("graph_fetch"):
+        all_edges_pack, all_edges_degree = await asyncio.gather(
+            knowledge_graph_inst.get_edges_batch(all_edges),
+            knowledge_graph_inst.edge_degrees_batch(all_edges),
+        )
     all_edges_data = [
-        {"src_tgt": k, "rank": d, **v}
-        for k, v, d in zip(all_edges, all_edges_pack, all_edges_degree)
-        if v is not None
+        {"src_tgt": k, "rank": all_edges_degree.get(k, 0), **all_edges_pack[k]}
+        for k in all_edges
+        if k in all_edges_pack
     ]
     all_edges_data = sorted(
         all_edges_data, key=lambda x: (x["rank"], x["weight"]), reverse=True
@@ -1596,35 +1989,34 @@ async def _get_edge_data(
         f"Query edges: {keywords}, top_k: {query_param.top_k}, cosine: {relationships_vdb.cosine_better_than_threshold}"
     )
 
-    results = await relationships_vdb.query(
-        keywords, top_k=query_param.top_k, ids=query_param.ids
-    )
+    with trace_span("relationships_search"):
+        results = await _search_keywords(
+            relationships_vdb,
+            keywords,
+            query_param,
+            key=lambda r: (r["src_id"], r["tgt_id"]),
+        )
 
     if not len(results):
-        return "", "", ""
+        return [], [], []
 
-    edge_datas, edge_degree = await asyncio.gather(
-        asyncio.gather(
-            *[knowledge_graph_inst.get_edge(r["src_id"], r["tgt_id"]) for r in results]
-        ),
-        asyncio.gather(
-            *[
-                knowledge_graph_inst.edge_degree(r["src_id"], r["tgt_id"])
-                for r in results
-            ]
-        ),
-    )
+    edge_pairs = [(r["src_id"], r["tgt_id"]) for r in results]
+    with trace_span("graph_fetch"):
+        edges_dict, edge_degrees_dict = await asyncio.gather(
+            knowledge_graph_inst.get_edges_batch(edge_pairs),
+            knowledge_graph_inst.edge_degrees_batch(edge_pairs),
+        )
 
     edge_datas = [
         {
             "src_id": k["src_id"],
             "tgt_id": k["tgt_id"],
-            "rank": d,
+            "rank": edge_degrees_dict.get(pair, 0),
             "created_at": k.get("__created_at__", None),
-            **v,
+            **edges_dict[pair],
         }
-        for k, v, d in zip(results, edge_datas, edge_degree)
-        if v is not None
+        for k, pair in zip(results, edge_pairs)
+        if pair in edges_dict
     ]
     edge_datas = sorted(
         edge_datas, key=lambda x: (x["rank"], x["weight"]), reverse=True
@@ -1646,73 +2038,12 @@ async def _get_edge_data(
         f"Global query uses {len(use_entities)} entites, {len(edge_datas)} relations, {len(use_text_units)} chunks"
     )
 
-    relations_section_list = [
-        [
-            "id",
-            "source",
-            "target",
-            "description",
-            "keywords",
-            "weight",
-            "rank",
-            "created_at",
-            "file_path",
-        ]
+    relations = [
+        _relation_record(e, e["src_id"], e["tgt_id"], "Unknown") for e in edge_datas
     ]
-    for i, e in enumerate(edge_datas):
-        created_at = e.get("created_at", "Unknown")
-        # Convert timestamp to readable format
-        if isinstance(created_at, (int, float)):
-            created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created_at))
-
-        # Get file path from edge data
-        file_path = e.get("file_path", "unknown_source")
-
-        relations_section_list.append(
-            [
-                i,
-                e["src_id"],
-                e["tgt_id"],
-                e["description"],
-                e["keywords"],
-                e["weight"],
-                e["rank"],
-                created_at,
-                file_path,
-            ]
-        )
-    relations_context = list_of_list_to_csv(relations_section_list)
-
-    entites_section_list = [
-        ["id", "entity", "type", "description", "rank", "created_at", "file_path"]
-    ]
-    for i, n in enumerate(use_entities):
-        created_at = n.get("created_at", "Unknown")
-        # Convert timestamp to readable format
-        if isinstance(created_at, (int, float)):
-            created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created_at))
-
-        # Get file path from node data
-        file_path = n.get("file_path", "unknown_source")
-
-        entites_section_list.append(
-            [
-                i,
-                n["entity_name"],
-                n.get("entity_type", "UNKNOWN"),
-                n.get("description", "UNKNOWN"),
-                n["rank"],
-                created_at,
-                file_path,
-            ]
-        )
-    entities_context = list_of_list_to_csv(entites_section_list)
-
-    text_units_section_list = [["id", "content", "file_path"]]
-    for i, t in enumerate(use_text_units):
-        text_units_section_list.append([i, t["content"], t.get("file_path", "unknown")])
-    text_units_context = list_of_list_to_csv(text_units_section_list)
-    return entities_context, relations_context, text_units_context
+    entities = [_entity_record(n, "Unknown") for n in use_entities]
+    text_units = [_text_unit_record(t, "unknown") for t in use_text_units]
+    return entities, relations, text_units
 
 
 async def _find_most_related_entities_from_relationships(
@@ -1731,24 +2062,15 @@ async def _find_most_related_entities_from_relationships(
             entity_names.append(e["tgt_id"])
             seen.add(e["tgt_id"])
 
-    node_datas, node_degrees = await asyncio.gather(
-        asyncio.gather(
-            *[
-                knowledge_graph_inst.get_node(entity_name)
-                for entity_name in entity_names
-            ]
-        ),
-        asyncio.gather(
-            *[
-                knowledge_graph_inst.node_degree(entity_name)
-                for entity_name in entity_names
-            ]
-        ),
-    )
+    with trace_span("graph_fetch"):
+        nodes_dict, degrees_dict = await asyncio.gather(
+            knowledge_graph_inst.get_nodes_batch(entity_names),
+            knowledge_graph_inst.node_degrees_batch(entity_names),
+        )
     node_datas = [
-        {**n, "entity_name": k, "rank": d}
-        for k, n, d in zip(entity_names, node_datas, node_degrees)
-        if n is not None
+        {**nodes_dict[name], "entity_name": name, "rank": degrees_dict.get(name, 0)}
+        for name in entity_names
+        if name in nodes_dict
     ]
 
     len_node_datas = len(node_datas)
@@ -1775,24 +2097,18 @@ async def _find_related_text_unit_from_relationships(
         for dp in edge_datas
         if dp["source_id"] is not None
     ]
-    all_text_units_lookup = {}
-
-    async def fetch_chunk_data(c_id, index):
-        if c_id not in all_text_units_lookup:
-            chunk_data = await text_chunks_db.get_by_id(c_id)
-            # Only store valid data
-            if chunk_data is not None and "content" in chunk_data:
-                all_text_units_lookup[c_id] = {
-                    "data": chunk_data,
-                    "order": index,
-                }
-
-    tasks = []
+    # Each chunk is fetched once and keeps the order of the first relation citing it
+    chunk_order = {}
     for index, unit_list in enumerate(text_units):
         for c_id in unit_list:
-            tasks.append(fetch_chunk_data(c_id, index))
+            chunk_order.setdefault(c_id, index)
 
-    await asyncio.gather(*tasks)
+    chunks = await _get_text_chunks(text_chunks_db, list(chunk_order))
+    all_text_units_lookup = {
+        c_id: {"data": chunks[c_id], "order": index}
+        for c_id, index in chunk_order.items()
+        if c_id in chunks
+    }
 
     if not all_text_units_lookup:
         logger.warning("No valid text chunks found")
@@ -1814,36 +2130,20 @@ async def _find_related_text_unit_from_relationships(
         valid_text_units,
         key=lambda x: x["data"]["content"],
         max_token_size=query_param.max_token_for_text_unit,
+        token_count=lambda x: x["data"].get("tokens"),
     )
 
     logger.debug(
         f"Truncate chunks from {len(valid_text_units)} to {len(truncated_text_units)} (max tokens:{query_param.max_token_for_text_unit})"
     )
 
-    all_text_units: list[TextChunkSchema] = [t["data"] for t in truncated_text_units]
+    all_text_units: list[TextChunkSchema] = [
+        {**t["data"], "id": t["id"]} for t in truncated_text_units
+    ]
 
     return all_text_units
 
 
-def combine_contexts(entities, relationships, sources):
-    # Function to extract entities, relationships, and sources from context strings
-    hl_entities, ll_entities = entities[0], entities[1]
-    hl_relationships, ll_relationships = relationships[0], relationships[1]
-    hl_sources, ll_sources = sources[0], sources[1]
-    # Combine and deduplicate the entities
-    combined_entities = process_combine_contexts(hl_entities, ll_entities)
-
-    # Combine and deduplicate the relationships
-    combined_relationships = process_combine_contexts(
-        hl_relationships, ll_relationships
-    )
-
-    # Combine and deduplicate the sources
-    combined_sources = process_combine_contexts(hl_sources, ll_sources)
-
-    return combined_entities, combined_relationships, combined_sources
-
-
 async def naive_query(
     query: str,
     chunks_vdb: BaseVectorStorage,
@@ -1860,20 +2160,23 @@ async def naive_query(
         else global_config["llm_model_func"]
     )
     args_hash = compute_args_hash(query_param.mode, query, cache_type="query")
-    cached_response, quantized, min_val, max_val = await handle_cache(
-        hashing_kv, args_hash, query, query_param.mode, cache_type="query"
-    )
+    with trace_span("cache_lookup"):
+        cached_response, quantized, min_val, max_val = await handle_cache(
+            hashing_kv, args_hash, query, query_param.mode, cache_type="query"
+        )
     if cached_response is not None:
         return cached_response
 
-    results = await chunks_vdb.query(
-        query, top_k=query_param.top_k, ids=query_param.ids
-    )
+    with trace_span("chunks_search"):
+        results = await chunks_vdb.query(
+            query, top_k=query_param.top_k, ids=query_param.ids
+        )
     if not len(results):
         return PROMPTS["fail_response"]
 
     chunks_ids = [r["id"] for r in results]
-    chunks = await text_chunks_db.get_by_ids(chunks_ids)
+    with trace_span("chunks_fetch"):
+        chunks = await text_chunks_db.get_by_ids(chunks_ids)
 
     # Filter out invalid chunks
     valid_chunks = [
@@ -1888,6 +2191,7 @@ async def naive_query(
         valid_chunks,
         key=lambda x: x["content"],
         max_token_size=query_param.max_token_for_text_unit,
+        token_count=lambda x: x.get("tokens"),
     )
 
     if not maybe_trun_chunks:
@@ -1908,27 +2212,32 @@ async def naive_query(
     if query_param.only_need_context:
         return section
 
-    # Process conversation history
-    history_context = ""
-    if query_param.conversation_history:
-        history_context = get_conversation_turns(
-            query_param.conversation_history, query_param.history_turns
-        )
+    with trace_span("prompt_build"):
+        # Process conversation history
+        history_context = ""
+        if query_param.conversation_history:
+            history_context = get_conversation_turns(
+                query_param.conversation_history, query_param.history_turns
+            )
 
-    sys_prompt_temp = system_prompt if system_prompt else PROMPTS["naive_rag_response"]
-    sys_prompt = sys_prompt_temp.format(
-        content_data=section,
-        response_type=query_param.response_type,
-        history=history_context,
-    )
+        sys_prompt_temp = (
+            system_prompt if system_prompt else PROMPTS["naive_rag_response"]
+        )
+        sys_prompt = sys_prompt_temp.format(
+            content_data=section,
+            response_type=query_param.response_type,
+            history=history_context,
+        )
 
     if query_param.only_need_prompt:
         return sys_prompt
 
-    len_of_prompts = len(encode_string_by_tiktoken(query + sys_prompt))
-    logger.debug(f"[naive_query]Prompt Tokens: {len_of_prompts}")
+    if logger.isEnabledFor(logging.DEBUG):
+        len_of_prompts = count_tokens(query + sys_prompt)
+        logger.debug(f"[naive_query]Prompt Tokens: {len_of_prompts}")
 
-    response = await use_model_func(
+    response = await trace_llm_call(
+        use_model_func,
         query,
         system_prompt=sys_prompt,
     )
@@ -1963,6 +2272,84 @@ async def naive_query(
     return response
 
 
+async def retrieve_context(
+    query: str,
+    knowledge_graph_inst: BaseGraphStorage,
+    entities_vdb: BaseVectorStorage,
+    relationships_vdb: BaseVectorStorage,
+    chunks_vdb: BaseVectorStorage,
+    text_chunks_db: BaseKVStorage,
+    query_param: QueryParam,
+) -> dict[str, list[dict]]:
+    """Retrieve the context records of a query without calling the LLM
+
+    The caller supplied query_param.hl_keywords / ll_keywords are searched when
+    given and the raw query otherwise, so neither keyword extraction nor the
+    response cache is on the path. The knowledge graph is searched in the
+    local, global, hybrid and mix modes, and the chunks vector storage in the
+    naive and mix modes.
+
+    Returns:
+        {"entities": [...], "relationships": [...], "chunks": [...]} with the
+        same records as the context of kg_query.
+    """
+    if query_param.mode not in ["local", "global", "hybrid", "naive", "mix"]:
+        raise ValueError(f"Unknown retrieval mode {query_param.mode}")
+
+    entities, relations, text_units = [], [], []
+    if query_param.mode != "naive":
+        ll_keywords = ", ".join(query_param.ll_keywords) or query
+        hl_keywords = ", ".join(query_param.hl_keywords) or query
+        kg_param = query_param
+        if query_param.mode == "mix":
+            kg_param = replace(query_param, mode="hybrid")
+        entities, relations, text_units = await _get_query_context_records(
+            ll_keywords,
+            hl_keywords,
+            knowledge_graph_inst,
+            entities_vdb,
+            relationships_vdb,
+            text_chunks_db,
+            kg_param,
+        )
+
+    if query_param.mode in ["naive", "mix"]:
+        vector_text_units = await _get_vector_text_unit_records(
+            query, chunks_vdb, text_chunks_db, query_param
+        )
+        text_units = _merge_records(
+            text_units, vector_text_units, key=lambda r: r["chunk_id"]
+        )
+
+    return {"entities": entities, "relationships": relations, "chunks": text_units}
+
+
+async def _get_vector_text_unit_records(
+    query: str,
+    chunks_vdb: BaseVectorStorage,
+    text_chunks_db: BaseKVStorage,
+    query_param: QueryParam,
+) -> list[dict]:
+    with trace_span("chunks_search"):
+        results = await chunks_vdb.query(
+            query, top_k=query_param.top_k, ids=query_param.ids
+        )
+    if not results:
+        return []
+
+    chunks = await _get_text_chunks(text_chunks_db, [r["id"] for r in results])
+    valid_chunks = [
+        {**chunks[r["id"]], "id": r["id"]} for r in results if r["id"] in chunks
+    ]
+    valid_chunks = truncate_list_by_token_size(
+        valid_chunks,
+        key=lambda x: x["content"],
+        max_token_size=query_param.max_token_for_text_unit,
+        token_count=lambda x: x.get("tokens"),
+    )
+    return [_text_unit_record(chunk, "unknown_source") for chunk in valid_chunks]
+
+
 async def kg_query_with_keywords(
     query: str,
     knowledge_graph_inst: BaseGraphStorage,
@@ -1988,10 +2375,13 @@ async def kg_query_with_keywords(
         else global_config["llm_model_func"]
     )
     args_hash = compute_args_hash(query_param.mode, query, cache_type="query")
-    cached_response, quantized, min_val, max_val = await handle_cache(
-        hashing_kv, args_hash, query, query_param.mode, cache_type="query"
-    )
+    with trace_span("cache_lookup"):
+        cached_response, quantized, min_val, max_val = await handle_cache(
+            hashing_kv, args_hash, query, query_param.mode, cache_type="query"
+        )
     if cached_response is not None:
+        if query_param.stream:
+            return stream_cached_response(cached_response)
         return cached_response
 
     # ---------------------------
@@ -2054,28 +2444,31 @@ async def kg_query_with_keywords(
     # 4) BUILD THE SYSTEM PROMPT + CALL LLM
     # ---------------------------
 
-    # Process conversation history
-    history_context = ""
-    if query_param.conversation_history:
-        history_context = get_conversation_turns(
-            query_param.conversation_history, query_param.history_turns
-        )
+    with trace_span("prompt_build"):
+        # Process conversation history
+        history_context = ""
+        if query_param.conversation_history:
+            history_context = get_conversation_turns(
+                query_param.conversation_history, query_param.history_turns
+            )
 
-    sys_prompt_temp = PROMPTS["rag_response"]
-    sys_prompt = sys_prompt_temp.format(
-        context_data=context,
-        response_type=query_param.response_type,
-        history=history_context,
-    )
+        sys_prompt_temp = PROMPTS["rag_response"]
+        sys_prompt = sys_prompt_temp.format(
+            context_data=context,
+            response_type=query_param.response_type,
+            history=history_context,
+        )
 
     if query_param.only_need_prompt:
         return sys_prompt
 
-    len_of_prompts = len(encode_string_by_tiktoken(query + sys_prompt))
-    logger.debug(f"[kg_query_with_keywords]Prompt Tokens: {len_of_prompts}")
+    if logger.isEnabledFor(logging.DEBUG):
+        len_of_prompts = count_tokens(query + sys_prompt)
+        logger.debug(f"[kg_query_with_keywords]Prompt Tokens: {len_of_prompts}")
 
     # 6. Generate response
-    response = await use_model_func(
+    response = await trace_llm_call(
+        use_model_func,
         query,
         system_prompt=sys_prompt,
         stream=query_param.stream,
@@ -2107,6 +2500,21 @@ async def kg_query_with_keywords(
                 cache_type="query",
             ),
         )
+    elif hasattr(response, "__aiter__"):
+        response = cache_streamed_response(
+            response,
+            hashing_kv,
+            CacheData(
+                args_hash=args_hash,
+                content="",
+                prompt=query,
+                quantized=quantized,
+                min_val=min_val,
+                max_val=max_val,
+                mode=query_param.mode,
+                cache_type="query",
+            ),
+        )
 
     return response
 
@@ -9,14 +9,25 @@ import logging
 import logging.handlers
 import os
 import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from functools import wraps
 from hashlib import md5
-from typing import Any, Callable, TYPE_CHECKING
+from typing import Any, AsyncIterator, Callable, TYPE_CHECKING
 import xml.etree.ElementTree as ET
 import numpy as np
 import tiktoken
 from lightrag.prompt import PROMPTS
+from lightrag.namespace import NameSpace, is_namespace
+from lightrag.kg.shared_storage import (
+    get_namespace_data,
+    get_storage_lock,
+    get_update_flag,
+    set_all_update_flags,
+)
 from dotenv import load_dotenv
 
 # Use TYPE_CHECKING to avoid circular imports
@@ -193,6 +204,41 @@ class UnlimitedSemaphore:
         pass
 
 
+class KeyedLock:
+    """Per-key mutual exclusion for the coroutines of one process.
+
+    Locks are created on first use and discarded once no coroutine holds or
+    waits for them, so memory stays proportional to the keys in flight.
+    """
+
+    def __init__(self):
+        self._locks: dict[Any, asyncio.Lock] = {}
+        self._users: dict[Any, int] = {}
+
+    @asynccontextmanager
+    async def lock(self, *keys: Any):
+        """Hold the locks of all given keys, acquired in sorted order to avoid deadlocks"""
+        ordered_keys = sorted(set(keys), key=str)
+        for key in ordered_keys:
+            self._users[key] = self._users.get(key, 0) + 1
+            self._locks.setdefault(key, asyncio.Lock())
+
+        acquired = []
+        try:
+            for key in ordered_keys:
+                await self._locks[key].acquire()
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._locks[key].release()
+            for key in ordered_keys:
+                self._users[key] -= 1
+                if self._users[key] == 0:
+                    del self._users[key]
+                    del self._locks[key]
+
+
 ENCODER = None
 
 
@@ -207,6 +253,79 @@ class EmbeddingFunc:
         return await self.func(*args, **kwargs)
 
 
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 1024))
+_query_embedding_cache: OrderedDict[tuple[Any, str], np.ndarray] = OrderedDict()
+_query_embeddings: ContextVar[dict[tuple[Any, str], asyncio.Future] | None] = (
+    ContextVar("query_embeddings", default=None)
+)
+
+
+@contextmanager
+def query_embedding_scope():
+    """Share the embeddings computed in this context, e.g. one query, between
+    the vector storages and the LLM cache, see cache_query_embeddings"""
+    token = _query_embeddings.set({})
+    try:
+        yield
+    finally:
+        _query_embeddings.reset(token)
+
+
+def cache_query_embeddings(embedding_func: EmbeddingFunc):
+    """Wrap an embedding function so that the calls made inside a
+    query_embedding_scope embed each distinct text at most once
+
+    Embeddings are also kept in a process-wide LRU cache of
+    QUERY_EMBEDDING_CACHE_SIZE entries keyed by (embedding function, text), so
+    repeated queries and several LightRAG instances sharing the same embedding
+    function reuse them. Calls outside a scope, e.g. while indexing, are not cached.
+    """
+    model_key = getattr(embedding_func, "func", embedding_func)
+
+    @wraps(embedding_func)
+    async def wrapped(texts: list[str], *args, **kwargs) -> np.ndarray:
+        scope = _query_embeddings.get()
+        if scope is None or args or kwargs:
+            return await embedding_func(texts, *args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        keys = [(model_key, text) for text in texts]
+        # Futures are taken at lookup time, a failed embedding call removes its
+        # keys from the scope while other coroutines may still be waiting on them
+        futures: dict[tuple[Any, str], asyncio.Future] = {}
+        pending: dict[tuple[Any, str], asyncio.Future] = {}
+        for key in dict.fromkeys(keys):
+            if key in scope:
+                futures[key] = scope[key]
+                continue
+            future = futures[key] = scope[key] = loop.create_future()
+            if key in _query_embedding_cache:
+                _query_embedding_cache.move_to_end(key)
+                future.set_result(_query_embedding_cache[key])
+            else:
+                pending[key] = future
+
+        if pending:
+            try:
+                embeddings = await embedding_func([text for _, text in pending])
+            except BaseException as e:
+                for key, future in pending.items():
+                    del scope[key]
+                    future.set_exception(e)
+                    future.exception()  # Raised below, don't log it as unretrieved
+                raise
+            for (key, future), embedding in zip(pending.items(), embeddings):
+                embedding = np.array(embedding)
+                future.set_result(embedding)
+                _query_embedding_cache[key] = embedding
+            while len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                _query_embedding_cache.popitem(last=False)
+
+        return np.array([await futures[key] for key in keys])
+
+    return wrapped
+
+
 def locate_json_string_body_from_string(content: str) -> str | None:
     """Locate the JSON string body from a string"""
     try:
@@ -263,6 +382,42 @@ def compute_args_hash(*args: Any, cache_type: str | None = None) -> str:
     return hashlib.md5(args_str.encode()).hexdigest()
 
 
+def generate_cache_key(mode: str, args_hash: str) -> str:
+    """Generate the flat storage key of an LLM response cache entry.
+
+    Cache entries are stored one record per (mode, args_hash) pair instead of one
+    dict per mode, so that reading or writing a single entry is O(1).
+    """
+    return f"{mode}:{args_hash}"
+
+
+def parse_cache_key(cache_key: str) -> tuple[str, str] | None:
+    """Split a flat cache key into (mode, args_hash), or None for non-flat keys"""
+    mode, sep, args_hash = cache_key.partition(":")
+    if not sep or not args_hash:
+        return None
+    return mode, args_hash
+
+
+def flatten_mode_cache(
+    mode: str, mode_cache: dict[str, dict[str, Any]]
+) -> dict[str, dict[str, Any]]:
+    """Convert a `{args_hash: entry}` dict of one mode to flat cache records"""
+    return {
+        generate_cache_key(mode, args_hash): {**entry, "mode": mode}
+        for args_hash, entry in mode_cache.items()
+    }
+
+
+def is_legacy_cache_bucket(key: str, value: Any) -> bool:
+    """Check if a record is a legacy `{mode: {args_hash: entry}}` cache bucket"""
+    if parse_cache_key(key) is not None or not isinstance(value, dict):
+        return False
+    return all(
+        isinstance(entry, dict) and "return" in entry for entry in value.values()
+    )
+
+
 def compute_mdhash_id(content: str, prefix: str = "") -> str:
     """
     Compute a unique ID for a given content string.
@@ -289,6 +444,368 @@ def limit_async_func_call(max_size: int):
     return final_decro
 
 
+LLM_PRIORITY_LANES = ("query", "keywords", "summary", "extract")
+"""LLM request lanes, from highest to lowest priority"""
+
+_llm_priority_lane: ContextVar[str] = ContextVar("llm_priority_lane", default="query")
+
+
+@contextmanager
+def llm_priority(lane: str):
+    """Run the LLM calls made in this context (and in tasks created from it) in the given lane
+
+    Calls made outside any llm_priority context, e.g. direct calls of
+    llm_model_func by the API server, use the "query" lane.
+    """
+    if lane not in LLM_PRIORITY_LANES:
+        raise ValueError(f"Unknown LLM priority lane: {lane}")
+    token = _llm_priority_lane.set(lane)
+    try:
+        yield
+    finally:
+        _llm_priority_lane.reset(token)
+
+
+def parse_lane_limits(value: str | None) -> dict[str, int]:
+    """Parse per-lane concurrency limits given as "extract=4,summary=2" """
+    limits = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        lane, _, limit = item.partition("=")
+        limits[lane.strip()] = int(limit)
+    return limits
+
+
+class PriorityLLMScheduler:
+    """Shares a fixed number of concurrent LLM calls between priority lanes
+
+    A free slot goes to the waiting request of the highest priority lane, so
+    interactive queries don't queue behind bulk extraction. A lane that has
+    been passed over max_skips times in a row is served next, which gives
+    every lane a minimum share. Each lane can also be capped below the global
+    limit.
+
+    One scheduler can be shared by several LightRAG instances to enforce a
+    process-wide limit.
+
+    With an AdaptiveConcurrencyLimiter, the number of concurrent calls follows
+    the limit of the limiter, capped by max_async.
+    """
+
+    def __init__(
+        self,
+        max_async: int,
+        lane_limits: dict[str, int] | None = None,
+        max_skips: int = 8,
+        limiter: AdaptiveConcurrencyLimiter | None = None,
+    ):
+        lane_limits = lane_limits or {}
+        unknown_lanes = set(lane_limits) - set(LLM_PRIORITY_LANES)
+        if unknown_lanes:
+            raise ValueError(f"Unknown LLM priority lanes: {sorted(unknown_lanes)}")
+
+        self.max_async = max_async
+        self.max_skips = max_skips
+        self.limiter = limiter
+        self.lane_limits = {
+            lane: min(max_async, lane_limits.get(lane, max_async))
+            for lane in LLM_PRIORITY_LANES
+        }
+        self._in_use = 0
+        self._waiters: dict[str, deque[asyncio.Future]] = {
+            lane: deque() for lane in LLM_PRIORITY_LANES
+        }
+        self._running = dict.fromkeys(LLM_PRIORITY_LANES, 0)
+        self._skips = dict.fromkeys(LLM_PRIORITY_LANES, 0)
+        self._completed = dict.fromkeys(LLM_PRIORITY_LANES, 0)
+        self._total_wait = dict.fromkeys(LLM_PRIORITY_LANES, 0.0)
+
+    def __deepcopy__(self, memo):
+        # Shared by design, keep it out of the copies made by dataclasses.asdict
+        return self
+
+    def _pick_lane(self) -> str | None:
+        candidates = [
+            lane
+            for lane in LLM_PRIORITY_LANES
+            if self._waiters[lane] and self._running[lane] < self.lane_limits[lane]
+        ]
+        if not candidates:
+            return None
+
+        starved = [lane for lane in candidates if self._skips[lane] >= self.max_skips]
+        chosen = starved[0] if starved else candidates[0]
+        for lane in candidates:
+            self._skips[lane] = 0 if lane == chosen else self._skips[lane] + 1
+        return chosen
+
+    @property
+    def capacity(self) -> int:
+        """Number of concurrent calls currently allowed"""
+        if self.limiter is None:
+            return self.max_async
+        return min(self.max_async, self.limiter.limit)
+
+    def _dispatch(self) -> None:
+        while self._in_use < self.capacity:
+            lane = self._pick_lane()
+            if lane is None:
+                return
+            waiter = self._waiters[lane].popleft()
+            if waiter.done():  # Cancelled while waiting
+                continue
+            self._in_use += 1
+            self._running[lane] += 1
+            waiter.set_result(None)
+
+    async def acquire(self, lane: str) -> None:
+        """Wait for a slot in the given lane"""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(waiter)
+        start = time.monotonic()
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                if waiter in self._waiters[lane]:
+                    self._waiters[lane].remove(waiter)
+            else:
+                # The slot was granted just before the cancellation
+                self.release(lane)
+            raise
+        self._total_wait[lane] += time.monotonic() - start
+
+    def release(self, lane: str) -> None:
+        """Give back a slot acquired in the given lane"""
+        self._in_use -= 1
+        self._running[lane] -= 1
+        self._completed[lane] += 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, lane: str):
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Queue depth, running and completed requests and mean wait time of each lane"""
+        return {
+            lane: {
+                "waiting": sum(not w.done() for w in self._waiters[lane]),
+                "running": self._running[lane],
+                "completed": self._completed[lane],
+                "avg_wait": self._total_wait[lane] / self._completed[lane]
+                if self._completed[lane]
+                else 0.0,
+            }
+            for lane in LLM_PRIORITY_LANES
+        }
+
+
+def limit_async_func_call_with_priority(scheduler: PriorityLLMScheduler):
+    """Add restriction of maximum concurrent async calls using a PriorityLLMScheduler,
+    the lane of each call is taken from the llm_priority context"""
+
+    def final_decro(func):
+        @wraps(func)
+        async def wait_func(*args, **kwargs):
+            async with scheduler.slot(_llm_priority_lane.get()):
+                if scheduler.limiter is None:
+                    return await func(*args, **kwargs)
+                async with scheduler.limiter.track():
+                    return await func(*args, **kwargs)
+
+        return wait_func
+
+    return final_decro
+
+
+def is_throttle_error(e: BaseException) -> bool:
+    """Whether an exception means the provider is overloaded: a rate limit (HTTP 429) or a timeout"""
+    if isinstance(e, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    status = getattr(e, "status_code", None) or getattr(e, "status", None)
+    if status == 429:
+        return True
+    name = type(e).__name__
+    return "RateLimit" in name or "Timeout" in name
+
+
+_active_limiter: ContextVar[AdaptiveConcurrencyLimiter | None] = ContextVar(
+    "active_limiter", default=None
+)
+
+
+def report_throttle_on_retry(retry_state) -> None:
+    """tenacity before_sleep hook telling the adaptive limiter of the current call
+    about rate limits and timeouts that are retried inside the call"""
+    limiter = _active_limiter.get()
+    exception = retry_state.outcome.exception() if retry_state.outcome else None
+    if limiter is not None and exception is not None and is_throttle_error(exception):
+        limiter.on_throttle()
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit for calls to a rate limited provider
+
+    While the limit is fully used and latency stays within latency_tolerance
+    times the baseline (the lowest latency seen, drifting slowly upwards), the
+    limit grows by about one per limit completed calls. A rate limit error or
+    timeout multiplies it by decrease_factor, at most once per cooldown
+    seconds so that a burst of failures of calls sent together counts once.
+
+    Use slot() to gate calls directly, or track() for calls already gated by
+    something reading limit, like PriorityLLMScheduler.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int | None = None,
+        latency_tolerance: float = 2.0,
+        decrease_factor: float = 0.5,
+        cooldown: float = 5.0,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit or initial, initial)
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._baseline_latency: float | None = None
+        self._last_decrease = float("-inf")
+        self.throttle_events = 0
+
+    def __deepcopy__(self, memo):
+        # Shared by design, keep it out of the copies made by dataclasses.asdict
+        return self
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def on_success(self, latency: float) -> None:
+        if self._baseline_latency is None or latency < self._baseline_latency:
+            self._baseline_latency = latency
+        else:
+            self._baseline_latency = 0.99 * self._baseline_latency + 0.01 * latency
+
+        if (
+            self._in_flight >= self.limit
+            and latency <= self._baseline_latency * self.latency_tolerance
+        ):
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._dispatch()
+
+    def on_throttle(self) -> None:
+        self.throttle_events += 1
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        old_limit = self.limit
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        logger.warning(
+            f"Provider is throttling, concurrency limit {old_limit} -> {self.limit}"
+        )
+
+    def _dispatch(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():  # Cancelled while waiting
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    async def _acquire(self) -> None:
+        if not self._waiters and self._in_flight < self.limit:
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            else:
+                # The slot was granted just before the cancellation
+                self._in_flight -= 1
+                self._dispatch()
+            raise
+
+    @asynccontextmanager
+    async def _measure(self):
+        token = _active_limiter.set(self)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_throttle_error(e):
+                self.on_throttle()
+            raise
+        else:
+            self.on_success(time.monotonic() - start)
+        finally:
+            _active_limiter.reset(token)
+
+    @asynccontextmanager
+    async def track(self):
+        """Count and measure a call that was admitted by an external gate"""
+        self._in_flight += 1
+        try:
+            async with self._measure():
+                yield
+        finally:
+            self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait until the current limit admits another call, then measure it"""
+        await self._acquire()
+        try:
+            async with self._measure():
+                yield
+        finally:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def stats(self) -> dict[str, Any]:
+        """Current limit, calls in flight and number of rate limit / timeout errors seen"""
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "throttle_events": self.throttle_events,
+        }
+
+
+def limit_async_func_call_adaptive(limiter: AdaptiveConcurrencyLimiter):
+    """Add restriction of maximum concurrent async calls using an AdaptiveConcurrencyLimiter"""
+
+    def final_decro(func):
+        @wraps(func)
+        async def wait_func(*args, **kwargs):
+            async with limiter.slot():
+                return await func(*args, **kwargs)
+
+        return wait_func
+
+    return final_decro
+
+
 def wrap_embedding_func_with_attrs(**kwargs):
     """Wrap a function with attributes"""
 
@@ -311,6 +828,109 @@ def write_json(json_obj, file_name):
         json.dump(json_obj, f, indent=2, ensure_ascii=False)
 
 
+JSON_LOG_COMPACT_MIN_BYTES = int(os.getenv("JSON_LOG_COMPACT_MIN_BYTES", 16 * 1024**2))
+
+
+def write_json_atomic(json_obj, file_name):
+    """Write JSON to a temporary file, fsync it and rename it over file_name,
+    so a crash leaves either the old or the new file"""
+    tmp_file_name = f"{file_name}.tmp"
+    with open(tmp_file_name, "w", encoding="utf-8") as f:
+        json.dump(json_obj, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file_name, file_name)
+
+
+def append_json_log(records: list[dict[str, Any]], file_name: str) -> None:
+    """Append records to a JSON lines log and fsync it"""
+    with open(file_name, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def json_log_records(data: dict[str, Any], keys: list[str]) -> list[dict[str, Any]]:
+    """Log records setting keys to their current value in data: an upsert
+    record for the keys present and a delete record for the others"""
+    records = []
+    for key in keys:
+        value = data.get(key)
+        if value is None:
+            records.append({"k": key, "d": True})
+        else:
+            records.append({"k": key, "v": value})
+    return records
+
+
+def read_json_log(file_name: str, offset: int = 0) -> tuple[list[dict[str, Any]], int]:
+    """Read the records of a JSON lines log from a byte offset
+
+    Lines that can't be parsed are skipped. A last line without a newline, e.g.
+    one being appended or torn by a crash, is left for the next read.
+
+    Returns:
+        The records and the offset following the last complete line
+    """
+    if not os.path.exists(file_name):
+        return [], 0
+    records = []
+    with open(file_name, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+                record["k"]
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Skipping damaged record of {file_name}")
+                continue
+            records.append(record)
+    return records, offset
+
+
+def replay_json_log(data: dict[str, Any], file_name: str) -> int:
+    """Apply the upsert/delete records of a JSON lines log to data in order
+
+    Returns:
+        The number of records applied
+    """
+    records, _ = read_json_log(file_name)
+    for record in records:
+        if record.get("d"):
+            data.pop(record["k"], None)
+        else:
+            data[record["k"]] = record["v"]
+    return len(records)
+
+
+def json_log_needs_compaction(snapshot_file_name: str, log_file_name: str) -> bool:
+    """Whether a log has outgrown both its snapshot and JSON_LOG_COMPACT_MIN_BYTES"""
+    try:
+        log_size = os.path.getsize(log_file_name)
+    except OSError:
+        return False
+    snapshot_size = (
+        os.path.getsize(snapshot_file_name) if os.path.exists(snapshot_file_name) else 0
+    )
+    return log_size > max(snapshot_size, JSON_LOG_COMPACT_MIN_BYTES)
+
+
+def compact_json_log(
+    json_obj: dict[str, Any], snapshot_file_name: str, log_file_name: str
+) -> None:
+    """Write the full data as the new snapshot, then drop the log
+
+    The log is removed only after the snapshot is renamed into place; replaying
+    a leftover log over the new snapshot gives the same data.
+    """
+    write_json_atomic(json_obj, snapshot_file_name)
+    if os.path.exists(log_file_name):
+        os.remove(log_file_name)
+
+
 def encode_string_by_tiktoken(content: str, model_name: str = "gpt-4o"):
     global ENCODER
     if ENCODER is None:
@@ -327,6 +947,80 @@ def decode_tokens_by_tiktoken(tokens: list[int], model_name: str = "gpt-4o"):
     return content
 
 
+def encode_string_with_offsets(
+    content: str, model_name: str = "gpt-4o"
+) -> tuple[list[int], list[int], str]:
+    """Encode a string once and map every token to the character where it starts
+
+    Returns:
+        tuple: (tokens, offsets, text), where text is the string the tokens decode to
+        (the input itself for any well-formed string). Any token window
+        tokens[i:j] can then be read as text[offsets[i]:offsets[j]] without
+        decoding it again.
+    """
+    global ENCODER
+    if ENCODER is None:
+        ENCODER = tiktoken.encoding_for_model(model_name)
+    tokens = ENCODER.encode(content)
+    text, offsets = ENCODER.decode_with_offsets(tokens)
+    return tokens, offsets, text
+
+
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 100_000))
+_token_count_cache: OrderedDict[bytes, int] = OrderedDict()
+
+
+def count_tokens_batch(contents: list[str], model_name: str = "gpt-4o") -> list[int]:
+    """Count the tokens of several strings
+
+    Counts are kept in an LRU cache keyed by the content hash, so the entity
+    descriptions and chunks that come back query after query are encoded once.
+    The strings missing from the cache are encoded together in one batch.
+    """
+    global ENCODER
+    if ENCODER is None:
+        ENCODER = tiktoken.encoding_for_model(model_name)
+
+    keys = [md5(content.encode()).digest() for content in contents]
+    counts: dict[bytes, int] = {}
+    missing: dict[bytes, str] = {}
+    for key, content in zip(keys, contents):
+        count = _token_count_cache.get(key)
+        if count is None:
+            missing[key] = content
+        else:
+            _token_count_cache.move_to_end(key)
+            counts[key] = count
+
+    if missing:
+        for key, tokens in zip(
+            missing, ENCODER.encode_ordinary_batch(list(missing.values()))
+        ):
+            counts[key] = _token_count_cache[key] = len(tokens)
+        while len(_token_count_cache) > TOKEN_COUNT_CACHE_SIZE:
+            _token_count_cache.popitem(last=False)
+
+    return [counts[key] for key in keys]
+
+
+def count_tokens(content: str, model_name: str = "gpt-4o") -> int:
+    """Count the tokens of a string, see count_tokens_batch"""
+    return count_tokens_batch([content], model_name)[0]
+
+
+def truncate_string_by_token_size(
+    content: str, max_token_size: int, model_name: str = "gpt-4o"
+) -> str:
+    """Truncate a string to its first max_token_size tokens, decoding only when it is too long"""
+    global ENCODER
+    if ENCODER is None:
+        ENCODER = tiktoken.encoding_for_model(model_name)
+    tokens = ENCODER.encode(content)
+    if len(tokens) <= max_token_size:
+        return content
+    return ENCODER.decode(tokens[:max_token_size])
+
+
 def pack_user_ass_to_openai_messages(*args: str):
     roles = ["user", "assistant"]
     return [
@@ -361,14 +1055,30 @@ def is_float_regex(value: str) -> bool:
 
 
 def truncate_list_by_token_size(
-    list_data: list[Any], key: Callable[[Any], str], max_token_size: int
+    list_data: list[Any],
+    key: Callable[[Any], str],
+    max_token_size: int,
+    token_count: Callable[[Any], int | None] | None = None,
 ) -> list[int]:
-    """Truncate a list of data by token size"""
+    """Truncate a list of data by token size
+
+    token_count can return a token count stored with the data (e.g. the tokens
+    field of text chunks); the text of the data without one is counted with
+    count_tokens_batch.
+    """
     if max_token_size <= 0:
         return []
+    with trace_span("truncate"):
+        counts = [token_count(data) if token_count else None for data in list_data]
+        missing = [i for i, count in enumerate(counts) if count is None]
+        if missing:
+            missing_counts = count_tokens_batch([key(list_data[i]) for i in missing])
+            for i, count in zip(missing, missing_counts):
+                counts[i] = count
+
     tokens = 0
-    for i, data in enumerate(list_data):
-        tokens += len(encode_string_by_tiktoken(key(data)))
+    for i, count in enumerate(counts):
+        tokens += count
         if tokens > max_token_size:
             return list_data[:i]
     return list_data
@@ -472,41 +1182,263 @@ def xml_to_json(xml_file):
         return None
 
 
-def process_combine_contexts(hl: str, ll: str):
-    header = None
-    list_hl = csv_string_to_list(hl.strip())
-    list_ll = csv_string_to_list(ll.strip())
+class EmbeddingCacheIndex:
+    """In-memory matrix index of the cached prompt embeddings of one (mode, cache_type)
 
-    if list_hl:
-        header = list_hl[0]
-        list_hl = list_hl[1:]
-    if list_ll:
-        header = list_ll[0]
-        list_ll = list_ll[1:]
-    if header is None:
-        return ""
+    Embeddings are dequantized and L2-normalized once when they enter the index,
+    and kept as rows of one contiguous float32 matrix, so finding the most similar
+    cached prompt is a single matrix-vector product instead of a Python loop.
+
+    When `ann_min_entries` is set and the index holds at least that many rows,
+    rows are also clustered into coarse lists (IVF style) and a search only scans
+    the `ann_nprobe` lists whose centroids are closest to the query.
+    """
+
+    def __init__(self, ann_min_entries: int | None = None, ann_nprobe: int = 8):
+        self.ann_min_entries = ann_min_entries
+        self.ann_nprobe = ann_nprobe
+        self._ids: list[str] = []
+        self._id_to_row: dict[str, int] = {}
+        self._matrix: np.ndarray | None = None
+        self._size = 0
+        self._centroids: np.ndarray | None = None
+        self._assignments: np.ndarray | None = None
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, cache_id: str, embedding: np.ndarray) -> None:
+        """Add or replace the embedding of a cache entry"""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+
+        if self._matrix is None:
+            self._matrix = np.empty((16, vector.shape[0]), dtype=np.float32)
+            self._assignments = np.zeros(16, dtype=np.int32)
+
+        row = self._id_to_row.get(cache_id)
+        if row is None:
+            if self._size == self._matrix.shape[0]:
+                # Grow by doubling so appends stay amortized O(1)
+                self._matrix = np.concatenate(
+                    [self._matrix, np.empty_like(self._matrix)]
+                )
+                self._assignments = np.concatenate(
+                    [self._assignments, np.zeros_like(self._assignments)]
+                )
+            row = self._size
+            self._size += 1
+            self._ids.append(cache_id)
+            self._id_to_row[cache_id] = row
+
+        self._matrix[row] = vector
+        if self._centroids is not None:
+            self._assignments[row] = int(np.argmax(self._centroids @ vector))
+
+        if self.ann_min_entries and self._size >= max(
+            self.ann_min_entries, 2 * self._trained_size
+        ):
+            self._train()
+
+    def _train(self, iterations: int = 10) -> None:
+        """Cluster the rows with spherical k-means to build the coarse lists"""
+        matrix = self._matrix[: self._size]
+        n_lists = max(1, int(np.sqrt(self._size)))
+        rng = np.random.default_rng(0)
+        centroids = matrix[rng.choice(self._size, n_lists, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(matrix @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, matrix)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Keep the previous centroid for empty lists
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self._centroids = centroids.astype(np.float32)
+        self._assignments[: self._size] = np.argmax(matrix @ self._centroids.T, axis=1)
+        self._trained_size = self._size
+
+    def search(self, query: np.ndarray, top_k: int = 1) -> list[tuple[str, float]]:
+        """Return up to top_k (cache_id, cosine similarity) pairs, best first"""
+        if self._size == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        if self._centroids is not None:
+            nprobe = min(self.ann_nprobe, self._centroids.shape[0])
+            probe = np.argpartition(self._centroids @ query, -nprobe)[-nprobe:]
+            rows = np.flatnonzero(np.isin(self._assignments[: self._size], probe))
+            scores = self._matrix[rows] @ query
+        else:
+            rows = None
+            scores = self._matrix[: self._size] @ query
+
+        top_k = min(top_k, scores.shape[0])
+        if top_k == 0:
+            return []
+        best = np.argpartition(scores, -top_k)[-top_k:]
+        best = best[np.argsort(scores[best])[::-1]]
+        return [
+            (self._ids[rows[i] if rows is not None else i], float(scores[i]))
+            for i in best
+        ]
 
-    if list_hl:
-        list_hl = [",".join(item[1:]) for item in list_hl if item]
-    if list_ll:
-        list_ll = [",".join(item[1:]) for item in list_ll if item]
 
-    combined_sources = []
-    seen = set()
+def _decode_cached_embedding(cache_data: dict[str, Any]) -> np.ndarray:
+    """Restore the float embedding of a cache entry from its quantized hex form"""
+    cached_quantized = np.frombuffer(
+        bytes.fromhex(cache_data["embedding"]), dtype=np.uint8
+    ).reshape(cache_data["embedding_shape"])
+    return dequantize_embedding(
+        cached_quantized,
+        cache_data["embedding_min"],
+        cache_data["embedding_max"],
+    )
+
+
+# Number of saved entries kept in the shared log other processes update their
+# embedding cache indexes from; a process that falls further behind rebuilds them
+EMBEDDING_CACHE_LOG_SIZE = 1024
+
+
+async def _get_embedding_cache_index_flag(hashing_kv):
+    """Get the update flag telling this process its embedding cache indexes were dropped"""
+    flag = getattr(hashing_kv, "_embedding_cache_index_updated", None)
+    if flag is None:
+        flag = await get_update_flag(f"{hashing_kv.namespace}_embedding_cache_index")
+        hashing_kv._embedding_cache_index_updated = flag
+    return flag
 
-    for item in list_hl + list_ll:
-        if item and item not in seen:
-            combined_sources.append(item)
-            seen.add(item)
 
-    combined_sources_result = [",\t".join(header)]
+async def _get_embedding_cache_log(hashing_kv):
+    """Get the log of the entries saved to the cache, shared by all processes
 
-    for i, item in enumerate(combined_sources, start=1):
-        combined_sources_result.append(f"{i},\t{item}")
+    Entry `seq` of the log is stored under the integer key `seq`, "next_seq" holds
+    the sequence number of the next entry.
+    """
+    log = getattr(hashing_kv, "_embedding_cache_log", None)
+    if log is None:
+        log = await get_namespace_data(f"{hashing_kv.namespace}_embedding_cache_log")
+        hashing_kv._embedding_cache_log = log
+    return log
+
+
+async def _log_embedding_cache_entry(hashing_kv, entry: dict[str, Any]) -> None:
+    """Append a saved cache entry to the log, for the indexes of other processes"""
+    log = await _get_embedding_cache_log(hashing_kv)
+    async with get_storage_lock():
+        seq = log.get("next_seq", 0)
+        log[seq] = entry
+        log["next_seq"] = seq + 1
+        log.pop(seq - EMBEDDING_CACHE_LOG_SIZE, None)
+    # The entry is already in the indexes of this process
+    if getattr(hashing_kv, "_embedding_cache_log_seq", None) == seq:
+        hashing_kv._embedding_cache_log_seq = seq + 1
+
+
+async def _apply_embedding_cache_log(
+    hashing_kv, indexes: dict[tuple[str, str | None], EmbeddingCacheIndex]
+) -> None:
+    """Add the entries saved by other processes since the last call to the indexes
 
-    combined_sources_result = "\n".join(combined_sources_result)
+    The indexes are cleared, to be rebuilt from storage, if entries were already
+    discarded from the log.
+    """
+    log = await _get_embedding_cache_log(hashing_kv)
+    next_seq = log.get("next_seq", 0)
+    for seq in range(hashing_kv._embedding_cache_log_seq, next_seq):
+        entry = log.get(seq)
+        if entry is None:
+            indexes.clear()
+            break
+        targets = [
+            indexes[key]
+            for key in ((entry["mode"], entry["cache_type"]), (entry["mode"], None))
+            if key in indexes
+        ]
+        if targets:
+            embedding = _decode_cached_embedding(entry)
+            for index in targets:
+                index.add(entry["args_hash"], embedding)
+    hashing_kv._embedding_cache_log_seq = next_seq
 
-    return combined_sources_result
+
+async def invalidate_embedding_cache_index(hashing_kv) -> None:
+    """Discard the embedding cache indexes of all processes
+
+    Must be called by LLM response cache storages after records are dropped, so
+    that the next lookup rebuilds the indexes from what is left in storage.
+    """
+    if not is_namespace(hashing_kv.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE):
+        return
+    if not hashing_kv.global_config.get("embedding_cache_config", {}).get("enabled"):
+        return
+    await _get_embedding_cache_index_flag(hashing_kv)
+    await set_all_update_flags(f"{hashing_kv.namespace}_embedding_cache_index")
+
+
+async def get_embedding_cache_index(
+    hashing_kv, mode: str, cache_type: str | None, build: bool = True
+) -> EmbeddingCacheIndex | None:
+    """Get the embedding index of a (mode, cache_type) of the LLM response cache
+
+    The index is built from storage on first use and then kept in memory on the
+    storage instance; save_to_cache appends new entries to it, and entries saved
+    by other processes are added from the shared log on the next call. The
+    indexes are rebuilt once the cache is dropped.
+
+    Args:
+        hashing_kv: The LLM response cache storage
+        mode: Cache mode
+        cache_type: Cache type, None matches every cache type
+        build: Build the index from storage if it does not exist yet
+
+    Returns:
+        The index, or None if it does not exist and build is False
+    """
+    indexes = getattr(hashing_kv, "_embedding_cache_indexes", None)
+    flag = await _get_embedding_cache_index_flag(hashing_kv)
+    if indexes is None or flag.value:
+        flag.value = False
+        indexes = {}
+        hashing_kv._embedding_cache_indexes = indexes
+        # Indexes built from now on read every earlier entry from storage
+        log = await _get_embedding_cache_log(hashing_kv)
+        hashing_kv._embedding_cache_log_seq = log.get("next_seq", 0)
+    else:
+        await _apply_embedding_cache_log(hashing_kv, indexes)
+
+    key = (mode, cache_type)
+    if key in indexes or not build:
+        return indexes.get(key)
+
+    embedding_cache_config = hashing_kv.global_config.get("embedding_cache_config", {})
+    index = EmbeddingCacheIndex(
+        ann_min_entries=embedding_cache_config.get("ann_min_entries"),
+        ann_nprobe=embedding_cache_config.get("ann_nprobe", 8),
+    )
+    if exists_func(hashing_kv, "get_by_mode"):
+        mode_cache = await hashing_kv.get_by_mode(mode)
+    else:
+        mode_cache = await hashing_kv.get_by_id(mode)
+    for cache_id, cache_data in (mode_cache or {}).items():
+        # Skip if cache_type doesn't match
+        if cache_type and cache_data.get("cache_type") != cache_type:
+            continue
+        if cache_data.get("embedding") is None:
+            continue
+        index.add(cache_id, _decode_cached_embedding(cache_data))
+
+    indexes[key] = index
+    logger.debug(
+        f"Built embedding cache index(mode:{mode} type:{cache_type}) with {len(index)} entries"
+    )
+    return index
 
 
 async def get_best_cached_response(
@@ -522,96 +1454,77 @@ async def get_best_cached_response(
     logger.debug(
         f"get_best_cached_response:  mode={mode} cache_type={cache_type} use_llm_check={use_llm_check}"
     )
-    mode_cache = await hashing_kv.get_by_id(mode)
-    if not mode_cache:
+    index = await get_embedding_cache_index(hashing_kv, mode, cache_type)
+    matches = index.search(current_embedding, top_k=1)
+    if not matches:
         return None
 
-    best_similarity = -1
-    best_response = None
-    best_prompt = None
-    best_cache_id = None
-
-    # Only iterate through cache entries for this mode
-    for cache_id, cache_data in mode_cache.items():
-        # Skip if cache_type doesn't match
-        if cache_type and cache_data.get("cache_type") != cache_type:
-            continue
-
-        if cache_data["embedding"] is None:
-            continue
+    best_cache_id, best_similarity = matches[0]
+    if best_similarity <= similarity_threshold:
+        return None
 
-        # Convert cached embedding list to ndarray
-        cached_quantized = np.frombuffer(
-            bytes.fromhex(cache_data["embedding"]), dtype=np.uint8
-        ).reshape(cache_data["embedding_shape"])
-        cached_embedding = dequantize_embedding(
-            cached_quantized,
-            cache_data["embedding_min"],
-            cache_data["embedding_max"],
+    if exists_func(hashing_kv, "get_by_mode_and_id"):
+        best_cache = await hashing_kv.get_by_mode_and_id(mode, best_cache_id) or {}
+    else:
+        best_cache = await hashing_kv.get_by_id(mode) or {}
+    cache_data = best_cache.get(best_cache_id)
+    if cache_data is None:
+        # The entry was dropped from storage after the index was built
+        return None
+    best_response = cache_data["return"]
+    best_prompt = cache_data["original_prompt"]
+
+    # If LLM check is enabled and all required parameters are provided
+    if (
+        use_llm_check
+        and llm_func
+        and original_prompt
+        and best_prompt
+        and best_response is not None
+    ):
+        compare_prompt = PROMPTS["similarity_check"].format(
+            original_prompt=original_prompt, cached_prompt=best_prompt
         )
 
-        similarity = cosine_similarity(current_embedding, cached_embedding)
-        if similarity > best_similarity:
-            best_similarity = similarity
-            best_response = cache_data["return"]
-            best_prompt = cache_data["original_prompt"]
-            best_cache_id = cache_id
-
-    if best_similarity > similarity_threshold:
-        # If LLM check is enabled and all required parameters are provided
-        if (
-            use_llm_check
-            and llm_func
-            and original_prompt
-            and best_prompt
-            and best_response is not None
-        ):
-            compare_prompt = PROMPTS["similarity_check"].format(
-                original_prompt=original_prompt, cached_prompt=best_prompt
-            )
-
-            try:
-                llm_result = await llm_func(compare_prompt)
-                llm_result = llm_result.strip()
-                llm_similarity = float(llm_result)
-
-                # Replace vector similarity with LLM similarity score
-                best_similarity = llm_similarity
-                if best_similarity < similarity_threshold:
-                    log_data = {
-                        "event": "cache_rejected_by_llm",
-                        "type": cache_type,
-                        "mode": mode,
-                        "original_question": original_prompt[:100] + "..."
-                        if len(original_prompt) > 100
-                        else original_prompt,
-                        "cached_question": best_prompt[:100] + "..."
-                        if len(best_prompt) > 100
-                        else best_prompt,
-                        "similarity_score": round(best_similarity, 4),
-                        "threshold": similarity_threshold,
-                    }
-                    logger.debug(json.dumps(log_data, ensure_ascii=False))
-                    logger.info(f"Cache rejected by LLM(mode:{mode} tpye:{cache_type})")
-                    return None
-            except Exception as e:  # Catch all possible exceptions
-                logger.warning(f"LLM similarity check failed: {e}")
-                return None  # Return None directly when LLM check fails
-
-        prompt_display = (
-            best_prompt[:50] + "..." if len(best_prompt) > 50 else best_prompt
-        )
-        log_data = {
-            "event": "cache_hit",
-            "type": cache_type,
-            "mode": mode,
-            "similarity": round(best_similarity, 4),
-            "cache_id": best_cache_id,
-            "original_prompt": prompt_display,
-        }
-        logger.debug(json.dumps(log_data, ensure_ascii=False))
-        return best_response
-    return None
+        try:
+            llm_result = await llm_func(compare_prompt)
+            llm_result = llm_result.strip()
+            llm_similarity = float(llm_result)
+
+            # Replace vector similarity with LLM similarity score
+            best_similarity = llm_similarity
+            if best_similarity < similarity_threshold:
+                log_data = {
+                    "event": "cache_rejected_by_llm",
+                    "type": cache_type,
+                    "mode": mode,
+                    "original_question": original_prompt[:100] + "..."
+                    if len(original_prompt) > 100
+                    else original_prompt,
+                    "cached_question": best_prompt[:100] + "..."
+                    if len(best_prompt) > 100
+                    else best_prompt,
+                    "similarity_score": round(best_similarity, 4),
+                    "threshold": similarity_threshold,
+                }
+                logger.debug(json.dumps(log_data, ensure_ascii=False))
+                logger.info(f"Cache rejected by LLM(mode:{mode} tpye:{cache_type})")
+                return None
+        except Exception as e:  # Catch all possible exceptions
+            logger.warning(f"LLM similarity check failed: {e}")
+            return None  # Return None directly when LLM check fails
+
+    prompt_display = best_prompt[:50] + "..." if len(best_prompt) > 50 else best_prompt
+    log_data = {
+        "event": "cache_hit",
+        "type": cache_type,
+        "mode": mode,
+        "similarity": round(best_similarity, 4),
+        "cache_id": best_cache_id,
+        "original_prompt": prompt_display,
+    }
+    logger.debug(json.dumps(log_data, ensure_ascii=False))
+    return best_response
 
 
 def cosine_similarity(v1, v2):
@@ -724,6 +1637,116 @@ class CacheData:
     cache_type: str = "query"
 
 
+async def cache_streamed_response(
+    stream: AsyncIterator[str], hashing_kv, cache_data: CacheData
+) -> AsyncIterator[str]:
+    """Pass the chunks of a streamed LLM response through while collecting them,
+    and cache the full response once the stream has been read to the end
+
+    A stream closed early, e.g. by a client disconnecting, is not cached.
+    """
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+
+    if hashing_kv is None:
+        return
+    cache_data.content = "".join(chunks)
+    await save_to_cache(hashing_kv, cache_data)
+    # The query already finished, persist the entry like _query_done would have
+    await hashing_kv.index_done_callback()
+
+
+async def stream_cached_response(content: str) -> AsyncIterator[str]:
+    """Replay a cached response as a stream, one line per chunk"""
+    for line in content.splitlines(keepends=True):
+        yield line
+
+
+_query_trace: ContextVar[tuple[float, list[dict[str, Any]]] | None] = ContextVar(
+    "query_trace", default=None
+)
+
+
+@contextmanager
+def query_trace():
+    """Record how long the stages of the queries run in this context take
+
+    Yields the list the spans are appended to, one
+    ``{"stage": str, "start": float, "seconds": float}`` dict per span, with
+    start relative to the beginning of the trace. Stages run concurrently, e.g.
+    the entity and relationship searches of a hybrid query, overlap. The spans
+    of a streamed response are added when the stream is consumed.
+    """
+    spans: list[dict[str, Any]] = []
+    token = _query_trace.set((time.perf_counter(), spans))
+    try:
+        yield spans
+    finally:
+        _query_trace.reset(token)
+
+
+def _add_span(
+    trace: tuple[float, list[dict[str, Any]]], stage: str, start: float
+) -> None:
+    trace_start, spans = trace
+    spans.append(
+        {
+            "stage": stage,
+            "start": start - trace_start,
+            "seconds": time.perf_counter() - start,
+        }
+    )
+
+
+@contextmanager
+def trace_span(stage: str):
+    """Time the block as a span of the current query_trace, if any"""
+    trace = _query_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_span(trace, stage, start)
+
+
+async def trace_llm_call(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Call an LLM function as the "llm" span of the current query_trace
+
+    A streamed response is timed until it is exhausted, and the time to its
+    first chunk is recorded as "llm_first_token".
+    """
+    trace = _query_trace.get()
+    if trace is None:
+        return await func(*args, **kwargs)
+    start = time.perf_counter()
+    response = await func(*args, **kwargs)
+    if not hasattr(response, "__aiter__"):
+        _add_span(trace, "llm", start)
+        return response
+    return _trace_stream(response, trace, start)
+
+
+async def _trace_stream(
+    stream: AsyncIterator[str],
+    trace: tuple[float, list[dict[str, Any]]],
+    start: float,
+) -> AsyncIterator[str]:
+    first_chunk = True
+    try:
+        async for chunk in stream:
+            if first_chunk:
+                _add_span(trace, "llm_first_token", start)
+                first_chunk = False
+            yield chunk
+    finally:
+        _add_span(trace, "llm", start)
+
+
 async def save_to_cache(hashing_kv, cache_data: CacheData):
     """Save data to cache, with improved handling for streaming responses and duplicate content.
 
@@ -776,9 +1799,39 @@ async def save_to_cache(hashing_kv, cache_data: CacheData):
         "original_prompt": cache_data.prompt,
     }
 
-    # Only upsert if there's actual new content
+    # Only upsert if there's actual new content. Storages implementing
+    # get_by_mode_and_id keep one record per entry, so only this entry is written
     await hashing_kv.upsert({cache_data.mode: mode_cache})
 
+    # Keep already built embedding indexes in sync with the new entry
+    if cache_data.quantized is not None:
+        embedding = dequantize_embedding(
+            cache_data.quantized, cache_data.min_val, cache_data.max_val
+        )
+        for cache_type in (cache_data.cache_type, None):
+            index = await get_embedding_cache_index(
+                hashing_kv, cache_data.mode, cache_type, build=False
+            )
+            if index is not None:
+                index.add(cache_data.args_hash, embedding)
+        await _log_embedding_cache_entry(
+            hashing_kv,
+            {
+                "mode": cache_data.mode,
+                "args_hash": cache_data.args_hash,
+                **{
+                    k: mode_cache[cache_data.args_hash][k]
+                    for k in (
+                        "cache_type",
+                        "embedding",
+                        "embedding_shape",
+                        "embedding_min",
+                        "embedding_max",
+                    )
+                },
+            },
+        )
+
 
 def safe_unicode_decode(content):
     # Regular expression to find all Unicode escape sequences of the form \uXXXX
@@ -1191,8 +2244,7 @@ async def aexport_data(
 
     else:
         raise ValueError(
-            f"Unsupported file format: {file_format}. "
-            f"Choose from: csv, excel, md, txt"
+            f"Unsupported file format: {file_format}. Choose from: csv, excel, md, txt"
         )
     if file_format is not None:
         print(f"Data exported to: {output_path} with format: {file_format}")
@@ -1350,22 +2402,22 @@ async def get_content_summary(content: str, max_length: int = 250) -> str:
     """
     # Strip the content first
     content_stripped = content.strip()
-    
+
     try:
         # Import the function to generate summaries with GPT
         from lightrag.llm.openai import gpt_4o_mini_complete
-        
+
         # Prepare a prompt for the model to generate a summary
         prompt = f"Please summarize the following text in {max_length} characters or less. Focus on the main points and key information:\n\n{content}"
-        
+
         # Generate the summary using the GPT model
         summary = await gpt_4o_mini_complete(prompt)
-        
+
         # Ensure the summary doesn't exceed the maximum length
         summary = summary.strip()
         if len(summary) > max_length:
             summary = summary[:max_length] + "..."
-        
+
         return summary
     except Exception as e:
         # Fallback to the original method if there's an error
@@ -1431,6 +2483,23 @@ def clean_text(text: str) -> str:
     return text.strip().replace("\x00", "")
 
 
+def clean_and_hash_texts(texts: list[str], prefix: str = "") -> list[tuple[str, str]]:
+    """Clean texts and compute their MD5 hash IDs
+
+    Args:
+        texts: Input texts
+        prefix: Prefix of the generated IDs
+
+    Returns:
+        List of (id, cleaned text) tuples in input order
+    """
+    results = []
+    for text in texts:
+        cleaned = clean_text(text)
+        results.append((compute_mdhash_id(cleaned, prefix=prefix), cleaned))
+    return results
+
+
 def check_storage_env_vars(storage_name: str) -> None:
     """Check if all required environment variables for storage implementation exist
 
@@ -5,12 +5,28 @@ from typing import Any, cast
 
 from .kg.shared_storage import get_graph_db_lock
 from .prompt import GRAPH_FIELD_SEP
-from .utils import compute_mdhash_id, logger
+from .utils import KeyedLock, UnlimitedSemaphore, compute_mdhash_id, logger
 from .base import StorageNameSpace
 
 
+def _entity_locks(keyed_lock: KeyedLock | None, *entity_names: str):
+    """Hold the locks of the given entities, shared with the graph merges of
+    document processing (see LightRAG._graph_merge_lock)
+
+    Merges hold the locks of both endpoints of every relation they write, so
+    the entity names also cover the relations of these entities.
+    """
+    if keyed_lock is None:
+        return UnlimitedSemaphore()
+    return keyed_lock.lock(*entity_names)
+
+
 async def adelete_by_entity(
-    chunk_entity_relation_graph, entities_vdb, relationships_vdb, entity_name: str
+    chunk_entity_relation_graph,
+    entities_vdb,
+    relationships_vdb,
+    entity_name: str,
+    keyed_lock: KeyedLock | None = None,
 ) -> None:
     """Asynchronously delete an entity and all its relationships.
 
@@ -19,10 +35,12 @@ async def adelete_by_entity(
         entities_vdb: Vector database storage for entities
         relationships_vdb: Vector database storage for relationships
         entity_name: Name of the entity to delete
+        keyed_lock: Entity locks shared with the graph merges of document processing
     """
     graph_db_lock = get_graph_db_lock(enable_logging=False)
+    entity_locks = _entity_locks(keyed_lock, entity_name)
     # Use graph database lock to ensure atomic graph and vector db operations
-    async with graph_db_lock:
+    async with graph_db_lock, entity_locks:
         try:
             await entities_vdb.delete_entity(entity_name)
             await relationships_vdb.delete_entity_relation(entity_name)
@@ -59,6 +77,7 @@ async def adelete_by_relation(
     relationships_vdb,
     source_entity: str,
     target_entity: str,
+    keyed_lock: KeyedLock | None = None,
 ) -> None:
     """Asynchronously delete a relation between two entities.
 
@@ -67,10 +86,12 @@ async def adelete_by_relation(
         relationships_vdb: Vector database storage for relationships
         source_entity: Name of the source entity
         target_entity: Name of the target entity
+        keyed_lock: Entity locks shared with the graph merges of document processing
     """
     graph_db_lock = get_graph_db_lock(enable_logging=False)
+    entity_locks = _entity_locks(keyed_lock, source_entity, target_entity)
     # Use graph database lock to ensure atomic graph and vector db operations
-    async with graph_db_lock:
+    async with graph_db_lock, entity_locks:
         try:
             # Check if the relation exists
             edge_exists = await chunk_entity_relation_graph.has_edge(
@@ -123,6 +144,7 @@ async def aedit_entity(
     entity_name: str,
     updated_data: dict[str, str],
     allow_rename: bool = True,
+    keyed_lock: KeyedLock | None = None,
 ) -> dict[str, Any]:
     """Asynchronously edit entity information.
 
@@ -135,13 +157,17 @@ async def aedit_entity(
         entity_name: Name of the entity to edit
         updated_data: Dictionary containing updated attributes, e.g. {"description": "new description", "entity_type": "new type"}
         allow_rename: Whether to allow entity renaming, defaults to True
+        keyed_lock: Entity locks shared with the graph merges of document processing
 
     Returns:
         Dictionary containing updated entity information
     """
     graph_db_lock = get_graph_db_lock(enable_logging=False)
+    entity_locks = _entity_locks(
+        keyed_lock, entity_name, updated_data.get("entity_name", entity_name)
+    )
     # Use graph database lock to ensure atomic graph and vector db operations
-    async with graph_db_lock:
+    async with graph_db_lock, entity_locks:
         try:
             # 1. Get current entity information
             node_exists = await chunk_entity_relation_graph.has_node(entity_name)
@@ -335,6 +361,7 @@ async def aedit_relation(
     source_entity: str,
     target_entity: str,
     updated_data: dict[str, Any],
+    keyed_lock: KeyedLock | None = None,
 ) -> dict[str, Any]:
     """Asynchronously edit relation information.
 
@@ -347,13 +374,15 @@ async def aedit_relation(
         source_entity: Name of the source entity
         target_entity: Name of the target entity
         updated_data: Dictionary containing updated attributes, e.g. {"description": "new description", "keywords": "new keywords"}
+        keyed_lock: Entity locks shared with the graph merges of document processing
 
     Returns:
         Dictionary containing updated relation information
     """
     graph_db_lock = get_graph_db_lock(enable_logging=False)
+    entity_locks = _entity_locks(keyed_lock, source_entity, target_entity)
     # Use graph database lock to ensure atomic graph and vector db operations
-    async with graph_db_lock:
+    async with graph_db_lock, entity_locks:
         try:
             # 1. Get current relation information
             edge_exists = await chunk_entity_relation_graph.has_edge(
@@ -450,6 +479,7 @@ async def acreate_entity(
     relationships_vdb,
     entity_name: str,
     entity_data: dict[str, Any],
+    keyed_lock: KeyedLock | None = None,
 ) -> dict[str, Any]:
     """Asynchronously create a new entity.
 
@@ -461,13 +491,15 @@ async def acreate_entity(
         relationships_vdb: Vector database storage for relationships
         entity_name: Name of the new entity
         entity_data: Dictionary containing entity attributes, e.g. {"description": "description", "entity_type": "type"}
+        keyed_lock: Entity locks shared with the graph merges of document processing
 
     Returns:
         Dictionary containing created entity information
     """
     graph_db_lock = get_graph_db_lock(enable_logging=False)
+    entity_locks = _entity_locks(keyed_lock, entity_name)
     # Use graph database lock to ensure atomic graph and vector db operations
-    async with graph_db_lock:
+    async with graph_db_lock, entity_locks:
         try:
             # Check if entity already exists
             existing_node = await chunk_entity_relation_graph.has_node(entity_name)
@@ -532,6 +564,7 @@ async def acreate_relation(
     source_entity: str,
     target_entity: str,
     relation_data: dict[str, Any],
+    keyed_lock: KeyedLock | None = None,
 ) -> dict[str, Any]:
     """Asynchronously create a new relation between entities.
 
@@ -544,13 +577,15 @@ async def acreate_relation(
         source_entity: Name of the source entity
         target_entity: Name of the target entity
         relation_data: Dictionary containing relation attributes, e.g. {"description": "description", "keywords": "keywords"}
+        keyed_lock: Entity locks shared with the graph merges of document processing
 
     Returns:
         Dictionary containing created relation information
     """
     graph_db_lock = get_graph_db_lock(enable_logging=False)
+    entity_locks = _entity_locks(keyed_lock, source_entity, target_entity)
     # Use graph database lock to ensure atomic graph and vector db operations
-    async with graph_db_lock:
+    async with graph_db_lock, entity_locks:
         try:
             # Check if both entities exist
             source_exists = await chunk_entity_relation_graph.has_node(source_entity)
@@ -641,6 +676,7 @@ async def amerge_entities(
     target_entity: str,
     merge_strategy: dict[str, str] = None,
     target_entity_data: dict[str, Any] = None,
+    keyed_lock: KeyedLock | None = None,
 ) -> dict[str, Any]:
     """Asynchronously merge multiple entities into one entity.
 
@@ -661,13 +697,15 @@ async def amerge_entities(
             - "join_unique": Join all unique values (for fields separated by delimiter)
         target_entity_data: Dictionary of specific values to set for the target entity,
             overriding any merged values, e.g. {"description": "custom description", "entity_type": "PERSON"}
+        keyed_lock: Entity locks shared with the graph merges of document processing
 
     Returns:
         Dictionary containing the merged entity information
     """
     graph_db_lock = get_graph_db_lock(enable_logging=False)
+    entity_locks = _entity_locks(keyed_lock, *source_entities, target_entity)
     # Use graph database lock to ensure atomic graph and vector db operations
-    async with graph_db_lock:
+    async with graph_db_lock, entity_locks:
         try:
             # Default merge strategy
             default_strategy = {